@@ -0,0 +1,139 @@
+# bench/admission.py
+"""
+Всплеск /predict через core.admission против поддельного пула (задача = sleep на одном из
+workers мест). Пул, как настоящий PipelineExecutor, отбивает submit сверх workers + max_queue
+задач в работе. Лидер возвращает настоящий прогноз (fc), склеенные запросы досчитывают
+его настоящим core.finish в потоке бота.
+
+    python -m bench.admission
+
+Сценарии: 50 пользователей просят один тикер (считается один раз), один пользователь
+шлёт 20 запросов (проходят PER_USER_INFLIGHT), 100 разных тикеров разом (в пул
+попадает не больше воркеров, лишнее сверх очереди отбивается, позиции уменьшаются),
+склеенные запросы при занятом пуле (получают ответ сразу после лидера, а не после
+чужих долгих расчётов).
+Выход с кодом 1, если какой-то сценарий отработал не так, как ожидалось.
+"""
+import asyncio
+import sys
+import time
+
+import numpy as np
+
+from core.admission import Admission, UserBusy
+from core.executor import QueueFull
+
+JOB_SEC = 0.05
+
+
+def _fc(ticker: str) -> dict:
+    x = 100 + 5 * np.sin(np.arange(30) / 3)
+    return {"best_model": "FAKE", "rmse": 1.0, "mape": 1.0, "horizon": 30, "forecast": x,
+            "last_price": 100.0, "plot_png": b"", "bands": None, "profit_q": None, "ticker": ticker}
+
+
+class FakeExecutor:
+    def __init__(self, workers: int = 2, max_queue: int = 32, job_sec: dict = None):
+        self.workers, self.max_queue = workers, max_queue
+        self.job_sec = job_sec or {}
+        self.running = self.peak = self.pending = 0
+        self.heavy = 0
+        self._slots = asyncio.Semaphore(workers)
+
+    def submit(self, **kw):
+        if self.pending >= self.workers + self.max_queue:
+            raise QueueFull("Слишком много запросов, попробуй через минуту")
+        self.pending += 1
+        return asyncio.ensure_future(self._job(kw))
+
+    async def _job(self, kw):
+        try:
+            async with self._slots:
+                self.running += 1
+                self.peak = max(self.peak, self.running)
+                self.heavy += 1
+                await asyncio.sleep(self.job_sec.get(kw["ticker"], JOB_SEC))
+                self.running -= 1
+            return {"amount": kw["amount"], "fc": _fc(kw["ticker"])}
+        finally:
+            self.pending -= 1
+
+
+async def _run(adm, ticker, amount, user_id, positions=None):
+    async def on_queue(pos):
+        if positions is not None:
+            positions.append(pos)
+    try:
+        return await adm.predict(ticker, amount, user_id, on_queue=on_queue)
+    except UserBusy:
+        return "busy"
+    except QueueFull:
+        return "full"
+
+
+async def _same_ticker():
+    ex = FakeExecutor()
+    adm = Admission(ex)
+    res = await asyncio.gather(*[_run(adm, "NVDA", 100 + u, u) for u in range(50)])
+    # первый — лидер (его результат из пула), остальные досчитаны в боте под свою сумму
+    finished = [r for r in res[1:] if isinstance(r, dict) and "log_row" in r]
+    ok = ex.heavy == 1 and len(finished) == 49 and all(
+        r["log_row"]["amount"] == 100 + u for u, r in enumerate(res[1:], 1))
+    return ok, f"тяжёлых расчётов {ex.heavy}, досчётов под сумму {len(finished)}, отбито {res.count('full')}"
+
+
+async def _one_user():
+    ex = FakeExecutor()
+    adm = Admission(ex, per_user=2)
+    res = await asyncio.gather(*[_run(adm, f"T{i}", 100, 1) for i in range(20)])
+    done = sum(isinstance(r, dict) for r in res)
+    return done == 2 and res.count("busy") == 18, f"прошло {done}, отбито {res.count('busy')}"
+
+
+async def _spike():
+    ex = FakeExecutor(workers=2, max_queue=32)
+    adm = Admission(ex)
+    positions = [[] for _ in range(100)]
+    res = await asyncio.gather(*[_run(adm, f"T{i}", 100, i, positions[i]) for i in range(100)])
+    done = sum(isinstance(r, dict) for r in res)
+    # позиции только уменьшаются и заканчиваются стартом расчёта (0)
+    monotonic = all(p == sorted(p, reverse=True) and (not p or p[-1] == 0) for p in positions if p)
+    ok = done == 34 and res.count("full") == 66 and ex.peak <= 2 and monotonic and adm.queued == 0
+    return ok, f"посчитано {done}, отбито {res.count('full')}, пик в пуле {ex.peak}, позиции монотонны: {monotonic}"
+
+
+async def _busy_pool():
+    # лидер AAA короткий; BBB и CCC долгие и после лидера занимают оба воркера
+    ex = FakeExecutor(workers=2, job_sec={"AAA": JOB_SEC, "BBB": 1.0, "CCC": 1.0})
+    adm = Admission(ex)
+    t0 = time.perf_counter()
+    leader = asyncio.ensure_future(_run(adm, "AAA", 100, 0))
+    await asyncio.sleep(0)
+    others = [asyncio.ensure_future(_run(adm, t, 100, i + 1)) for i, t in enumerate(("BBB", "CCC"))]
+    await asyncio.sleep(0)
+
+    async def _timed(u):
+        r = await _run(adm, "AAA", 100 + u, 10 + u)
+        return r, time.perf_counter() - t0
+    waiters = await asyncio.gather(*[_timed(u) for u in range(20)])
+    await asyncio.gather(leader, *others)
+    slowest = max(sec for _, sec in waiters)
+    ok = all(isinstance(r, dict) and "log_row" in r for r, _ in waiters) and slowest < 0.5 and ex.heavy == 3
+    return ok, f"20 склеенных готовы за {slowest * 1e3:.0f} мс (чужие расчёты — 1000 мс)"
+
+
+def main():
+    failed = False
+    for title, scenario in [("50 пользователей, один тикер", _same_ticker),
+                            ("один пользователь, 20 запросов", _one_user),
+                            ("100 тикеров разом, 2 воркера", _spike),
+                            ("склейка при занятом пуле", _busy_pool)]:
+        ok, info = asyncio.run(scenario())
+        failed |= not ok
+        print(f"{'OK ' if ok else 'FAIL'} {title:32s} {info}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
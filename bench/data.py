@@ -0,0 +1,36 @@
+# bench/data.py
+"""Офлайн-источник котировок для бенчмарков: синтетика (GBM) или записанный CSV."""
+import numpy as np
+import pandas as pd
+
+BDAYS_PER_YEAR = 261
+
+
+def synthetic_series(years: float = 2, seed: int = 0) -> pd.Series:
+    """Геометрическое броуновское движение по B-дням, как после load_close_series."""
+    n = int(years * BDAYS_PER_YEAR)
+    rng = np.random.default_rng(seed)
+    idx = pd.bdate_range("2005-01-03", periods=n)
+    return pd.Series(100 * np.exp(np.cumsum(rng.normal(0, 0.015, n))), index=idx, name="Close")
+
+
+def synthetic_raw(years: float = 2, seed: int = 0) -> pd.DataFrame:
+    """Сырой ответ «как от Yahoo»: tz-aware индекс, пропуски дней — вход для _clean_close."""
+    s = synthetic_series(years, seed)
+    keep = np.random.default_rng(seed + 1).random(len(s)) > 0.03
+    s = s[keep]
+    idx = s.index.tz_localize("America/New_York")
+    return pd.DataFrame({"Open": s.values, "High": s.values, "Low": s.values, "Close": s.values}, index=idx)
+
+
+def recorded_series(path: str) -> pd.Series:
+    """CSV с колонками Date,Close (например, выгрузка Stooq)."""
+    df = pd.read_csv(path, parse_dates=["Date"], index_col="Date")
+    return df["Close"].sort_index().asfreq("B").ffill().bfill().rename("Close")
+
+
+def stub_loader(series: pd.Series):
+    """Подмена load_close_series: любой тикер получает один и тот же ряд."""
+    def _load(ticker: str, period: str = "2y") -> pd.Series:
+        return series
+    return _load
@@ -0,0 +1,137 @@
+# bench/fetch.py
+"""
+Хеджированная загрузка котировок против локального стенда вместо Stooq и Yahoo.
+Стенд отдаёт те же форматы (CSV Stooq и JSON chart API Yahoo) и умеет тормозить
+и падать по сценарию. Запуск: python -m bench.fetch
+Выход с кодом 1, если какой-то сценарий отработал не так, как ожидалось.
+"""
+import json
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import pandas as pd
+
+from bench.data import synthetic_series
+
+# поведение источников в текущем сценарии: задержка, сек, и код ответа
+BEHAVIOUR = {"stooq": {"delay": 0.0, "status": 200}, "yahoo": {"delay": 0.0, "status": 200}}
+HITS = {"stooq": 0, "yahoo": 0}
+
+# шесть лет — чтобы запросы за 2 и 5 лет отличались
+_SERIES = synthetic_series(6).loc[lambda s: s.index.dayofweek < 5]
+
+
+def _stooq_body() -> bytes:
+    df = pd.DataFrame({"Open": _SERIES, "High": _SERIES, "Low": _SERIES, "Close": _SERIES, "Volume": 1000})
+    return df.rename_axis("Date").to_csv(date_format="%Y-%m-%d").encode()
+
+
+def _yahoo_body() -> bytes:
+    ts = [int(pd.Timestamp(d).timestamp()) + 14 * 3600 for d in _SERIES.index]
+    return json.dumps({"chart": {"result": [{
+        "meta": {"gmtoffset": -14400},
+        "timestamp": ts,
+        "indicators": {"quote": [{"close": _SERIES.tolist()}], "adjclose": [{"adjclose": _SERIES.tolist()}]},
+    }], "error": None}}).encode()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, как у настоящих источников
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        name = "stooq" if path.startswith("/q/d/l") else "yahoo" if path.startswith("/v8/finance/chart") else None
+        if name is None:
+            self.send_error(404)
+            return
+        HITS[name] += 1
+        b = BEHAVIOUR[name]
+        time.sleep(b["delay"])
+        body = (_stooq_body() if name == "stooq" else _yahoo_body()) if b["status"] == 200 else b"error"
+        try:
+            self.send_response(b["status"])
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # клиент уже отменил запрос — так и задумано
+
+    def log_message(self, *args):
+        pass
+
+
+# (название, stooq, yahoo, кэш есть?, ожидаемый источник или "stale"/None, предел времени, сек)
+SCENARIOS = [
+    ("оба быстрые", (0.0, 200), (0.0, 200), False, "stooq", 0.5),
+    ("Stooq тормозит -> хедж в Yahoo", (5.0, 200), (0.0, 200), False, "yahoo", 0.9),
+    ("Stooq отдаёт 500 -> Yahoo", (0.0, 500), (0.0, 200), False, "yahoo", 0.9),
+    ("Stooq отдаёт 403 -> Yahoo до хеджа", (0.0, 403), (0.0, 200), False, "yahoo", 0.25),
+    ("Yahoo лежит, Stooq медленный", (1.0, 200), (0.0, 503), False, "stooq", 1.5),
+    ("оба не успевают, кэша нет", (5.0, 200), (5.0, 200), False, None, 2.5),
+    ("оба не успевают, есть кэш", (5.0, 200), (5.0, 200), True, "stale", 2.5),
+]
+
+
+def main():
+    from core import data_loader, fetch, price_cache
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    fetch.STOOQ_URL = fetch.YAHOO_URL = base
+    fetch.HEDGE_DELAY, fetch.DEADLINE, fetch.BACKOFF = 0.3, 2.0, 0.1
+    fetch.PREFER_SOURCE = "auto"
+
+    tmp = tempfile.mkdtemp()
+    price_cache.CACHE_DIR = tmp
+    price_cache.is_fresh = lambda meta, now=None: False  # кэш всегда «вчерашний»
+    stale = _SERIES.iloc[-520:-5].asfreq("B")
+    failed = False
+    for i, (title, st, ya, with_cache, expect, limit) in enumerate(SCENARIOS):
+        BEHAVIOUR["stooq"].update(delay=st[0], status=st[1])
+        BEHAVIOUR["yahoo"].update(delay=ya[0], status=ya[1])
+        ticker = f"T{i}"
+        if with_cache:
+            price_cache.write(ticker, stale, "stooq")
+        t0 = time.perf_counter()
+        if with_cache:
+            try:
+                s = data_loader.load_close_series(ticker)
+                got = "stale" if s is not None and len(s) == len(stale) else "fresh"
+            except Exception:
+                got = None
+        else:
+            s, got = fetch.fetch_close_sync(ticker)
+            got = got or None
+        dt = time.perf_counter() - t0
+        ok = got == expect and dt <= limit
+        failed |= not ok
+        print(f"{'OK ' if ok else 'FAIL'} {title:34s} -> {str(got):6s} {dt * 1e3:7.0f} ms (предел {limit * 1e3:.0f})")
+
+    # период: в кэше два года, просят пять — ряд качается заново; потом два года — срез из кэша
+    BEHAVIOUR["stooq"].update(delay=0.0, status=200)
+    BEHAVIOUR["yahoo"].update(delay=0.0, status=200)
+    price_cache.is_fresh = lambda meta, now=None: True
+    spans = []
+    for period in ("2y", "5y", "2y"):
+        s = data_loader.load_close_series("PERIOD", period)
+        spans.append((s.index[-1] - s.index[0]).days)
+    ok = spans[0] <= 730 < 5 * 365 - 7 <= spans[1] and spans[2] == spans[0]
+    failed |= not ok
+    print(f"{'OK ' if ok else 'FAIL'} {'period: 2y -> 5y -> 2y':34s} -> дней истории {spans}")
+
+    server.shutdown()
+    shutil.rmtree(tmp, ignore_errors=True)
+    print(f"запросов к стенду: stooq {HITS['stooq']}, yahoo {HITS['yahoo']}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
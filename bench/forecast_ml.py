@@ -0,0 +1,80 @@
+# bench/forecast_ml.py
+"""
+Сравнение рекурсивного прогноза Ridge: старый путь через pandas и кольцевой буфер.
+Запуск: python -m bench.forecast_ml [--years 2] [--repeat 5] [--batch 1000]
+Выход с кодом 1, если прогноз изменил переданную историю (буфер не должен её касаться).
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from bench.data import synthetic_series
+from core.data_loader import train_test_split_by_time
+from core.features import make_lag_features
+from models.models_ml import fit_eval_ml, forecast_ml
+from models.recursive_ml import RecursiveRidge
+
+
+def forecast_ml_pandas(series: pd.Series, model, horizon: int = 30) -> np.ndarray:
+    # прежняя реализация: пересборка лагов и pd.concat на каждом шаге.
+    # Признаки строим для следующей даты (заглушка y=0), иначе последняя строка
+    # make_lag_features описывает уже известный бар, а не завтрашний.
+    y_pred = []
+    cur = series.copy()
+    for _ in range(horizon):
+        next_idx = [cur.index[-1] + pd.tseries.offsets.BDay(1)]
+        X_step, _ = make_lag_features(pd.concat([cur, pd.Series([0.0], index=next_idx)]))
+        y_next = float(model.predict(X_step.values[-1:])[0])
+        y_pred.append(y_next)
+        cur = pd.concat([cur, pd.Series([y_next], index=next_idx)])
+    return np.array(y_pred)
+
+
+def _best_time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--years", type=float, default=2)
+    ap.add_argument("--horizon", type=int, default=30)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--batch", type=int, default=1000)
+    args = ap.parse_args()
+
+    s = synthetic_series(args.years)
+    train, test = train_test_split_by_time(s)
+    model, _, _ = fit_eval_ml(train, test)
+
+    before = s.values.copy()
+    old = forecast_ml_pandas(s, model, args.horizon)
+    new = forecast_ml(s, model, args.horizon)
+    print(f"max |old - new| = {np.max(np.abs(old - new)):.3e}")
+    # одна строка истории, уже float64 и непрерывная — кольцевой буфер не должен оказаться её видом
+    intact = np.array_equal(s.values, before)
+    print(f"{'OK ' if intact else 'FAIL'} история после прогноза не изменилась")
+
+    t_old = _best_time(lambda: forecast_ml_pandas(s, model, args.horizon), args.repeat)
+    t_new = _best_time(lambda: forecast_ml(s, model, args.horizon), args.repeat)
+    print(f"pandas:      {t_old * 1e3:9.2f} ms")
+    print(f"ring buffer: {t_new * 1e3:9.2f} ms  (x{t_old / t_new:.0f})")
+
+    engine = RecursiveRidge(model)
+    paths = np.repeat(s.values[None, -engine.size:], args.batch, axis=0)
+    noise = np.random.default_rng(1).normal(0, s.diff().std(), (args.batch, args.horizon))
+    t_batch = _best_time(lambda: engine.forecast(paths, args.horizon, noise=noise), args.repeat)
+    print(f"batch {args.batch}:  {t_batch * 1e3:9.2f} ms  ({t_batch / args.batch * 1e6:.1f} us/path)")
+    if not intact:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# bench/jobqueue.py
+"""
+Раздельный режим на одной машине: бот-сторона (QueueExecutor) ставит задачи в
+core.jobqueue, считают процессы `python -m core.worker`.
+
+    python -m bench.jobqueue --workers 1,2,4 --jobs 40 --job-sec 0.2
+    python -m bench.jobqueue --pipeline 6      # настоящие run_pipeline на синтетике
+
+Замеряется пропускная способность от постановки до получения результата при разном
+числе воркеров (задача по умолчанию — sleep, как будто считает другой узел; --cpu —
+занять ядро) и сценарий падения: воркер умирает посреди задачи, её досчитывает
+другой после истечения аренды. Выход с кодом 1, если задача потерялась.
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def sleep_job(sec: float, cpu: bool = False) -> int:
+    end = time.perf_counter() + sec
+    if cpu:
+        while time.perf_counter() < end:
+            pass
+    else:
+        time.sleep(sec)
+    return os.getpid()
+
+
+def crash_once(marker: str) -> str:
+    """Первая попытка роняет процесс воркера целиком."""
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+    return "ok"
+
+
+def pipeline_job(seed: int) -> dict:
+    from bench.data import synthetic_series
+    from core.selection import forecast_series
+    fc = forecast_series(f"SYN{seed}", synthetic_series(2, seed), plot=False, save=False)
+    return {"best_model": fc["best_model"], "rmse": fc["rmse"]}
+
+
+def _start_workers(db: str, n: int, warm: bool, env: dict):
+    cmd = [sys.executable, "-m", "core.worker", "--procs", str(n), "--db", db]
+    if not warm:
+        cmd.append("--no-warmup")
+    return subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL)
+
+
+def _stop(proc):
+    proc.terminate()
+    proc.wait(30)
+
+
+async def _roundtrip(db: str, calls):
+    from core.jobqueue import QueueExecutor
+    ex = QueueExecutor(db)
+    await ex.start()
+    try:
+        t0 = time.perf_counter()
+        res = await asyncio.gather(*[ex.run(fn, *args) for fn, args in calls])
+        return res, time.perf_counter() - t0
+    finally:
+        await ex.shutdown()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", default="1,2,4")
+    ap.add_argument("--jobs", type=int, default=40)
+    ap.add_argument("--job-sec", type=float, default=0.2)
+    ap.add_argument("--cpu", action="store_true", help="задача занимает ядро, а не спит")
+    ap.add_argument("--pipeline", type=int, default=0, help="вместо sleep — столько run_pipeline на синтетике")
+    args = ap.parse_args()
+    # под `python -m` у функций модуль __main__ — воркерам нужно импортируемое имя
+    from bench import jobqueue as jobs
+
+    tmp = tempfile.mkdtemp(prefix="bench-jobqueue-")
+    env = {**os.environ, "JOB_LEASE_SEC": "2", "PYTHONPATH": os.getcwd() + os.pathsep + os.environ.get("PYTHONPATH", "")}
+    os.environ["JOB_LEASE_SEC"] = "2"
+    failed = False
+    try:
+        print(f"{'воркеров':>8s} {'задач':>6s} {'сек':>7s} {'задач/с':>8s} {'процессов':>10s}")
+        for n in [int(x) for x in args.workers.split(",")]:
+            db = os.path.join(tmp, f"jobs{n}.db")
+            if args.pipeline:
+                calls = [(jobs.pipeline_job, (i,)) for i in range(args.pipeline)]
+            else:
+                calls = [(jobs.sleep_job, (args.job_sec, args.cpu)) for _ in range(args.jobs)]
+            proc = _start_workers(db, n, warm=bool(args.pipeline), env=env)
+            try:
+                # старт и прогрев воркеров не в счёт: ждём, пока каждый возьмёт по пустой задаче
+                asyncio.run(_roundtrip(db, [(jobs.sleep_job, (0.5,))] * n))
+                res, sec = asyncio.run(_roundtrip(db, calls))
+            finally:
+                _stop(proc)
+            pids = len(set(res)) if not args.pipeline else n
+            print(f"{n:8d} {len(calls):6d} {sec:7.2f} {len(calls) / sec:8.2f} {pids:10d}")
+
+        db = os.path.join(tmp, "crash.db")
+        marker = os.path.join(tmp, "crashed")
+        proc = _start_workers(db, 1, warm=False, env=env)
+        try:
+            t0 = time.perf_counter()
+            res, _ = asyncio.run(asyncio.wait_for(_roundtrip(db, [(jobs.crash_once, (marker,))]), 60))
+            ok = res == ["ok"] and os.path.exists(marker)
+        except Exception as e:
+            ok, res = False, [repr(e)]
+        finally:
+            _stop(proc)
+        failed |= not ok
+        print(f"{'OK ' if ok else 'FAIL'} падение воркера посреди задачи: результат {res[0]!r} "
+              f"через {time.perf_counter() - t0:.1f} с (аренда 2 с, воркер перезапущен)")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
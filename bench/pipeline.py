@@ -0,0 +1,170 @@
+# bench/pipeline.py
+"""
+Офлайн-бенчмарк всех стадий /predict на синтетических (или записанных) котировках.
+
+    python -m bench.pipeline --out bench.json
+    python -m bench.pipeline --out new.json --baseline bench.json --threshold 0.25
+
+Каждая стадия меряется отдельно для рядов длиной --years (по умолчанию 1..20 лет),
+берётся лучшее из --repeat запусков. С --baseline сравниваем с прошлым прогоном
+и выходим с кодом 1, если какая-то стадия замедлилась больше чем на threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from bench.data import synthetic_series, synthetic_raw, recorded_series, stub_loader
+
+DEFAULT_YEARS = (1, 2, 5, 10, 20)
+# быстрее этого сравнение — шум таймера, а не регрессия
+NOISE_FLOOR_SEC = 0.005
+
+
+def _best(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def bench_series(s, raw, repeat: int) -> dict:
+    import core.selection as sel
+    from core import forecast_cache, forecast_store
+    from models import artifacts
+    from core.data_loader import _clean_close, train_test_split_by_time
+    from core.features import make_lag_features
+    from models.models_ml import fit_eval_ml, forecast_ml, simulate_ml
+    from models.models_nn import fit_eval_nn, forecast_nn
+    from models.models_stats import fit_eval_ets, forecast_ets, fit_eval_arima, forecast_arima
+    from viz.plotting import build_plot
+    from viz.recommender import make_signals_and_profit, signals_outcome
+
+    train, test = train_test_split_by_time(s, test_days=60)
+    ml, _, _ = fit_eval_ml(train, test)
+    ets, _, _ = fit_eval_ets(train, test)
+    arima, _, _ = fit_eval_arima(train, test)
+    nn, _, _, _ = fit_eval_nn(train, test)
+    pred = forecast_ml(s, ml, 30)
+
+    res = {}
+    if raw is not None:
+        res["clean_close"] = _best(lambda: _clean_close(raw.copy()), repeat)
+    res["make_lag_features"] = _best(lambda: make_lag_features(s), repeat)
+    res["fit_eval_ml"] = _best(lambda: fit_eval_ml(train, test), repeat)
+    res["fit_eval_ets"] = _best(lambda: fit_eval_ets(train, test), repeat)
+    res["fit_eval_arima"] = _best(lambda: fit_eval_arima(train, test), repeat)
+    res["fit_eval_nn"] = _best(lambda: fit_eval_nn(train, test), repeat)
+    res["forecast_nn"] = _best(lambda: forecast_nn(s, nn, 30), repeat)
+    res["forecast_ml"] = _best(lambda: forecast_ml(s, ml, 30), repeat)
+    res["forecast_ets"] = _best(lambda: forecast_ets(s, ets, 30), repeat)
+    res["forecast_arima"] = _best(lambda: forecast_arima(s, arima, 30), repeat)
+    res["build_plot"] = _best(lambda: build_plot(s.iloc[-180:], pred), repeat)
+    res["make_signals_and_profit"] = _best(lambda: make_signals_and_profit(pred, 1000.0, float(s.iloc[-1])), repeat)
+    paths = simulate_ml(s, ml, 30, 1000)
+    res["simulate_ml_1000"] = _best(lambda: simulate_ml(s, ml, 30, 1000), repeat)
+    res["signals_outcome_1000"] = _best(lambda: signals_outcome(paths, pred, 1000.0, float(s.iloc[-1])), repeat)
+
+    # end-to-end: данные из заглушки, кэш и хранилище прогнозов сбрасываем перед каждым прогоном
+    sel.load_close_series = stub_loader(s)
+
+    def _e2e():
+        forecast_cache.CACHE.clear()
+        shutil.rmtree(forecast_store.STORE_DIR, ignore_errors=True)  # живой прогноз теперь пишется и туда
+        sel.run_pipeline("BENCH", 1000.0, 0)
+
+    # холодный прогон — полный поиск; тёплый — от параметров, сохранённых предыдущим прогоном
+    artifacts.WARM_START = False
+    res["run_pipeline"] = _best(_e2e, repeat)
+    artifacts.WARM_START = True
+    _e2e()
+    res["run_pipeline_warm"] = _best(_e2e, repeat)
+    return res
+
+
+def run(years=DEFAULT_YEARS, repeat: int = 3, recorded: str = None) -> dict:
+    results = {}
+    # логи, PNG и кэш пишем во временную папку, рабочее дерево не трогаем
+    from core import request_log
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        request_log.LOG.path = os.path.join(tmp, "logs.db")
+        try:
+            if recorded:
+                s = recorded_series(os.path.join(cwd, recorded))
+                results["recorded"] = bench_series(s, None, repeat)
+            else:
+                for y in years:
+                    results[f"{y}y"] = bench_series(synthetic_series(y), synthetic_raw(y), repeat)
+        finally:
+            # фоновый писатель журнала должен успеть до удаления папки
+            request_log.LOG.flush()
+            os.chdir(cwd)
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """Список регрессий: (длина, стадия, было, стало)."""
+    bad = []
+    for length, stages in current["results"].items():
+        base = baseline.get("results", {}).get(length, {})
+        for stage, sec in stages.items():
+            old = base.get(stage)
+            if old is None or max(sec, old) < NOISE_FLOOR_SEC:
+                continue
+            if sec > old * (1 + threshold):
+                bad.append((length, stage, old, sec))
+    return bad
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Бенчмарк стадий пайплайна без сети")
+    ap.add_argument("--out", default="bench.json")
+    ap.add_argument("--years", type=float, nargs="+", default=list(DEFAULT_YEARS))
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--recorded", help="CSV Date,Close вместо синтетики")
+    ap.add_argument("--baseline", help="прошлый JSON для сравнения")
+    ap.add_argument("--threshold", type=float, default=0.25, help="допустимое замедление, доля")
+    args = ap.parse_args(argv)
+
+    years = [int(y) if float(y).is_integer() else y for y in args.years]
+    report = run(years, args.repeat, args.recorded)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    for length, stages in report["results"].items():
+        print(f"[{length}]")
+        for stage, sec in stages.items():
+            print(f"  {stage:24s} {sec * 1e3:10.2f} ms")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        bad = compare(report, baseline, args.threshold)
+        for length, stage, old, new in bad:
+            print(f"РЕГРЕССИЯ [{length}] {stage}: {old * 1e3:.2f} -> {new * 1e3:.2f} ms")
+        if bad:
+            sys.exit(1)
+        print("Регрессий нет")
+
+
+if __name__ == "__main__":
+    main()
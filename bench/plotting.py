@@ -0,0 +1,87 @@
+# bench/plotting.py
+"""
+Рендер графика: прежний pyplot-путь против шаблона на Figure/Agg, время и размер PNG.
+Вызовы из нескольких потоков идут через общий шаблон по очереди — строка «потоки» показывает,
+что блокировка ничего не стоит.
+Запуск: python -m bench.plotting [--charts 40] [--threads 4] [--dpi 150]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import pandas as pd
+
+from bench.data import synthetic_series
+from viz.plotting import build_plot
+
+
+def build_plot_pyplot(history: pd.Series, forecast, dpi: int = 150, save_path: str = None) -> BytesIO:
+    # прежняя реализация: новая фигура pyplot на каждый вызов, PNG кодируется дважды
+    fig, ax = plt.subplots(figsize=(9, 4))
+    ax.plot(history.index, history.values, label="История")
+    future_idx = pd.date_range(start=history.index[-1], periods=len(forecast) + 1, freq="B")[1:]
+    ax.plot(future_idx, forecast, linestyle="--", label="Прогноз 30д")
+    ax.axvline(history.index[-1], color="gray", alpha=0.6)
+    ax.set_title("Цена акции: история и прогноз")
+    ax.set_xlabel("Дата"); ax.set_ylabel("Цена")
+    ax.legend()
+    fig.tight_layout()
+    if save_path:
+        fig.savefig(save_path, format="png", dpi=dpi)
+    buf = BytesIO()
+    fig.savefig(buf, format="png", dpi=dpi)
+    plt.close(fig)
+    buf.seek(0)
+    return buf
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--charts", type=int, default=40)
+    ap.add_argument("--threads", type=int, default=4)
+    ap.add_argument("--dpi", type=int, default=150)
+    args = ap.parse_args()
+
+    # как в пайплайне: график и в чат, и в файл
+    tmp = tempfile.mkdtemp()
+    png = os.path.join(tmp, "chart.png")
+
+    jobs = []
+    for i in range(args.charts):
+        s = synthetic_series(1, seed=i)
+        jobs.append((s.iloc[-180:], s.values[-30:] * 1.01))
+
+    t0 = time.perf_counter()
+    for h, f in jobs:
+        build_plot_pyplot(h, f, args.dpi, save_path=png)
+    t_old = (time.perf_counter() - t0) / args.charts
+
+    build_plot(*jobs[0], dpi=args.dpi)  # прогрев шаблона
+    t0 = time.perf_counter()
+    for h, f in jobs:
+        build_plot(h, f, save_path=png, dpi=args.dpi)
+    t_new = (time.perf_counter() - t0) / args.charts
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        list(pool.map(lambda j: build_plot(*j, dpi=args.dpi), jobs))
+    t_thr = (time.perf_counter() - t0) / args.charts
+    shutil.rmtree(tmp, ignore_errors=True)
+
+    print(f"pyplot, новая фигура:  {t_old * 1e3:8.1f} ms/график")
+    print(f"шаблон Figure/Agg:     {t_new * 1e3:8.1f} ms/график  (x{t_old / t_new:.1f})")
+    print(f"шаблон, {args.threads} потока:      {t_thr * 1e3:8.1f} ms/график (по стене)")
+    old_kib = len(build_plot_pyplot(*jobs[0], args.dpi).getvalue()) / 1024
+    new_kib = len(build_plot(*jobs[0], dpi=args.dpi).getvalue()) / 1024
+    print(f"PNG при dpi={args.dpi}: pyplot {old_kib:.0f} KiB, шаблон {new_kib:.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
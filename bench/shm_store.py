@@ -0,0 +1,135 @@
+# bench/shm_store.py
+"""
+Память воркера в зависимости от числа тикеров: ряды из core.shm_store против .npz.
+
+    python -m bench.shm_store --sizes 100,1000,3000 --workers 2 --publish 1000
+
+Кэш котировок заполняется синтетикой во временном каталоге (.npz). Публикация в
+хранилище после перезагрузки — --publish рядов по одному (put на ряд) и пачкой
+(price_cache.batch_publish, как в load_close_many). Затем каждый воркер
+(отдельный процесс, как в пуле) читает все ряды через price_cache.read и держит их,
+как load_close_many. Меряется прирост приватной (анонимной) памяти процесса —
+RssAnon из /proc — и время чтения одного ряда. Выход с кодом 1, если с хранилищем
+прирост на самом большом наборе больше четверти прироста с .npz, пачка
+публикуется не быстрее, чем по одному, или длинная история (с 1985 и с 1890 —
+раньше оси хранилища) читается обратно не целиком.
+"""
+import argparse
+import multiprocessing as mp
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+
+def _anon_kb() -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("RssAnon:"):
+                return int(line.split()[1])
+    return 0
+
+
+def _worker(tickers, q):
+    from core import price_cache
+    price_cache.read(tickers[0])  # импорт и первое отображение — не в счёт
+    base = _anon_kb()
+    t0 = time.perf_counter()
+    held = {t: price_cache.read(t)[0] for t in tickers}
+    sec = time.perf_counter() - t0
+    total = sum(float(s.iloc[-1]) for s in held.values())  # ряды действительно читаются
+    q.put((_anon_kb() - base, sec / len(tickers), total))
+
+
+def _populate(tickers):
+    from bench.data import synthetic_series
+    from core import price_cache
+    os.environ["SHM_STORE"] = "0"  # только .npz, как после перезагрузки машины
+    for i, t in enumerate(tickers):
+        price_cache.write(t, synthetic_series(2, i), "bench")
+    os.environ["SHM_STORE"] = "1"
+
+
+def _publish(tickers, batch: bool) -> float:
+    """Пустое хранилище, все ряды читаются с .npz и публикуются; секунды."""
+    from contextlib import nullcontext
+    from core import price_cache, shm_store
+    shutil.rmtree(shm_store.store_dir(), ignore_errors=True)
+    t0 = time.perf_counter()
+    with price_cache.batch_publish() if batch else nullcontext():
+        for t in tickers:
+            price_cache.read(t)
+    return time.perf_counter() - t0
+
+
+def _long_history() -> bool:
+    """Ряды с начала торгов (load_close_series(t, "max")): запись и чтение без потерь."""
+    import numpy as np
+    import pandas as pd
+    from core import price_cache
+    ok = True
+    for first in ("1985-01-02", "1890-01-02"):
+        idx = pd.bdate_range(first, "2024-12-31")
+        s = pd.Series(np.linspace(1.0, 100.0, len(idx)), index=idx, name="Close")
+        t = "LONG" + first[:4]
+        price_cache.write(t, s, "bench", days=None)
+        got = price_cache.read(t)
+        same = got is not None and got[0].index.equals(s.index) and np.array_equal(got[0].values, s.values)
+        print(f"{'OK ' if same else 'FAIL'} история с {first}: {len(s)} баров")
+        ok &= same
+    return ok
+
+
+def _measure(tickers, workers: int, store: bool):
+    os.environ["SHM_STORE"] = "1" if store else "0"
+    ctx = mp.get_context("spawn")
+    q = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(tickers, q)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    res = [q.get() for _ in procs]
+    for p in procs:
+        p.join()
+    return max(r[0] for r in res), sum(r[1] for r in res) / len(res)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="100,1000,3000")
+    ap.add_argument("--workers", type=int, default=2)
+    ap.add_argument("--publish", type=int, default=1000, help="сколько рядов публиковать по одному")
+    args = ap.parse_args()
+    if not os.path.exists("/proc/self/status"):
+        sys.exit("нужен Linux (/proc)")
+
+    tmp = tempfile.mkdtemp(prefix="bench-shm-")
+    os.environ["PRICE_CACHE_DIR"] = os.path.join(tmp, "prices")
+    os.environ["SHM_STORE_DIR"] = os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tmp,
+                                               os.path.basename(tmp) + "-store")
+    sizes = [int(x) for x in args.sizes.split(",")]
+    tickers = [f"T{i:05d}" for i in range(max(sizes))]
+    try:
+        t0 = time.perf_counter()
+        _populate(tickers)
+        print(f"заполнено {len(tickers)} рядов за {time.perf_counter() - t0:.1f} с")
+        long_ok = _long_history()
+        n_pub = min(args.publish, len(tickers))
+        one = _publish(tickers[:n_pub], batch=False)
+        many = _publish(tickers[:n_pub], batch=True)
+        print(f"публикация {n_pub} рядов: по одному {one:.2f} с, пачкой {many:.2f} с (x{one / many:.0f})")
+        print(f"публикация всех {len(tickers)} пачкой: {_publish(tickers, batch=True):.2f} с")
+        print(f"{'тикеров':>8s} {'npz, МБ':>9s} {'shm, МБ':>9s} {'npz, мс/ряд':>12s} {'shm, мс/ряд':>12s}")
+        for n in sizes:
+            npz_kb, npz_sec = _measure(tickers[:n], args.workers, store=False)
+            shm_kb, shm_sec = _measure(tickers[:n], args.workers, store=True)
+            print(f"{n:8d} {npz_kb / 1024:9.1f} {shm_kb / 1024:9.1f} {npz_sec * 1e3:12.3f} {shm_sec * 1e3:12.3f}")
+    finally:
+        shutil.rmtree(os.environ["SHM_STORE_DIR"], ignore_errors=True)
+        shutil.rmtree(tmp, ignore_errors=True)
+    if shm_kb > npz_kb / 4 or many >= one or not long_ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# bench/startup.py
+"""
+Время старта бота и прогрева воркера, каждый замер — в чистом интерпретаторе.
+
+    python -m bench.startup [--budget 1.0] [--repeat 5]
+
+bot_import — import bot.main: до первого прогноза бот не должен тянуть научный стек
+(pandas, statsmodels, sklearn, matplotlib, scipy, yfinance). worker_import и
+worker_warmup — что воркер делает в фоне после старта. Выход с кодом 1, если
+импорт бота дольше --budget секунд или подтянул что-то из тяжёлых модулей.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+HEAVY = ("pandas", "numpy", "statsmodels", "sklearn", "matplotlib", "scipy",
+         "yfinance", "pandas_datareader", "tensorflow", "core.selection")
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+t1 = time.perf_counter()
+{after}
+t2 = time.perf_counter()
+print(json.dumps({{"import": t1 - t0, "after": t2 - t1,
+                  "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def _probe(module: str, after: str = "pass") -> dict:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = _PROBE.format(module=module, after=after, heavy=HEAVY)
+    out = subprocess.run([sys.executable, "-c", code], cwd=root, check=True,
+                         capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def run(repeat: int = 5) -> dict:
+    bot = [_probe("bot.main") for _ in range(repeat)]
+    worker = _probe("core.selection", "core.selection.warmup()")
+    return {
+        "bot_import": min(r["import"] for r in bot),
+        "bot_heavy": bot[0]["heavy"],
+        "worker_import": worker["import"],
+        "worker_warmup": worker["after"],
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Время старта бота")
+    ap.add_argument("--budget", type=float, default=1.0, help="допустимое время import bot.main, сек")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args(argv)
+
+    res = run(args.repeat)
+    print(f"import bot.main:        {res['bot_import'] * 1e3:8.0f} ms")
+    print(f"воркер: import стека    {res['worker_import'] * 1e3:8.0f} ms")
+    print(f"воркер: warmup()        {res['worker_warmup'] * 1e3:8.0f} ms")
+
+    bad = False
+    if res["bot_heavy"]:
+        print("ТЯЖЁЛЫЕ МОДУЛИ при старте бота: " + ", ".join(res["bot_heavy"]))
+        bad = True
+    if res["bot_import"] > args.budget:
+        print(f"СТАРТ ДОЛЬШЕ БЮДЖЕТА: {res['bot_import']:.2f} > {args.budget:.2f} s")
+        bad = True
+    if bad:
+        sys.exit(1)
+    print("Старт в бюджете")
+
+
+if __name__ == "__main__":
+    main()
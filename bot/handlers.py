@@ -1,16 +1,19 @@
 # bot/handlers.py
+import asyncio
 import os
-import shutil
-import tempfile
-from datetime import datetime
 from io import BytesIO
 
 from telegram import Update
 from telegram.ext import ContextTypes
 from telegram.constants import ChatAction
 
+from bot.source_archive import SourceArchive
 from bot.utils import validate_ticker, validate_amount
-from core.selection import run_pipeline, append_error_log
+from core import metrics, prefetch
+from core.admission import UserBusy
+from core.executor import QueueFull
+from core import request_log
+from core.request_log import append_error_log
 
 # состояния диалога 
 T_TICKER, T_AMOUNT = range(2)
@@ -22,7 +25,8 @@ async def start_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "Привет! Я учебный бот прогноза акций.\n"
         "Команда: /predict — запускает процесс.\n"
         "Пример: /predict AAPL 1000\n"
-        "Ещё: /about, /source"
+        "Несколько тикеров: /compare AAPL MSFT 1000\n"
+        "Ещё: /history, /about, /source"
     )
 
 
@@ -82,6 +86,32 @@ async def predict_enter_amount(update: Update, context: ContextTypes.DEFAULT_TYP
     return T_AMOUNT
 
 
+def _summary_text(ticker: str, amount: float, result: dict) -> str:
+    """Текст итога по одному тикеру из результата run_pipeline."""
+    summary = (
+        f"Тикер: {ticker}\n"
+        f"Лучшая модель: {result['best_model']}\n"
+        f"RMSE: {result['rmse']:.2f}, MAPE: {result['mape']:.2f}%\n"
+        f"Ожидаемое изменение цены за 30 дн: {result['change_pct']:+.2f}%\n"
+        f"Ориентировочная прибыль на сумму {amount:.2f}: {result['est_profit']:.2f}"
+    )
+    if result.get("skipped"):
+        summary += "\nНе участвовали: " + ", ".join(
+            f"{name} ({'не успела' if reason in ('таймаут', 'дедлайн') else 'ошибка'})"
+            for name, reason in result["skipped"]
+        )
+    if result.get("price_range"):
+        lo, hi = result["price_range"]
+        summary += f"\nЦена через 30 дн в 90% сценариев: {lo:.2f} – {hi:.2f}"
+    if result.get("profit_range"):
+        lo, hi = result["profit_range"]
+        summary += (
+            f"\nЕсли цена пойдёт не по прогнозу: прибыль по этим сигналам в 90% сценариев "
+            f"{lo:.2f} – {hi:.2f}, в плюсе {result['profit_prob'] * 100:.0f}% сценариев"
+        )
+    return summary
+
+
 async def predict_run(update: Update, context: ContextTypes.DEFAULT_TYPE):
     amount_text = update.message.text.strip()
     amount = validate_amount(amount_text)
@@ -93,38 +123,30 @@ async def predict_run(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.message.from_user.id
 
     status_msg = await update.message.reply_text("Загружаю данные…")
+
+    async def _on_queue(pos: int):
+        if pos:
+            await status_msg.edit_text(f"Ты в очереди: {pos}-й. Начну, как освободится место…")
+        else:
+            await status_msg.edit_text("Обучаю модели…")
+
     try:
-        await status_msg.edit_text("Обучаю 3 модели…")
-        result = run_pipeline(ticker=ticker, amount=amount, user_id=user_id)
+        # допуск (очередь, лимит на пользователя, склейка одинаковых запросов) и расчёт в пуле процессов
+        result = await context.bot_data["admission"].predict(ticker, amount, user_id, on_queue=_on_queue)
+        metrics.REGISTRY.merge(result.get("timings"), result.get("counters"))
+        # журнал ведёт бот: пул или удалённый воркер только возвращает строку
+        request_log.LOG.log(result["log_row"])
 
         await status_msg.edit_text("Рисую прогноз…")
         plot_bytes: BytesIO = result["plot_bytes"]
         plot_bytes.seek(0)
-        await update.message.reply_photo(plot_bytes, caption="История и прогноз на 30 дней")
-
-        change_pct = result["change_pct"]
-        best_model = result["best_model"]
-        rmse = result["rmse"]
-        mape = result["mape"]
-        est_profit = result["est_profit"]
-
-        summary = (
-            f"Тикер: {ticker}\n"
-            f"Лучшая модель: {best_model}\n"
-            f"RMSE: {rmse:.2f}, MAPE: {mape:.2f}%\n"
-            f"Ожидаемое изменение цены за 30 дн: {change_pct:+.2f}%\n"
-            f"Ориентировочная прибыль на сумму {amount:.2f}: {est_profit:.2f}"
-        )
-        await update.message.reply_text(summary)
+        with metrics.span("tg_send_photo"):
+            await update.message.reply_photo(plot_bytes, caption="История и прогноз на 30 дней (заливка — 50% и 90% сценариев)")
 
-        pairs_head = result.get("pairs_head", [])
-        if pairs_head:
-            lines = ["Пары сделок:"]
-            for b_d, b_p, s_d, s_p in pairs_head:
-                lines.append(f"BUY {b_d} @ {b_p:.2f}  →  SELL {s_d} @ {s_p:.2f}")
-            await update.message.reply_text("\n".join(lines))
+        summary = _summary_text(ticker, amount, result)
+        with metrics.span("tg_send_text"):
+            await update.message.reply_text(summary)
 
-        # пары сделок, если посчитали
         pairs_head = result.get("pairs_head", [])
         if pairs_head:
             lines = ["Пары сделок:"]
@@ -135,7 +157,17 @@ async def predict_run(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await status_msg.delete()
         return -1
 
+    except UserBusy as e:
+        await status_msg.edit_text(str(e))
+        return -1
+
+    except QueueFull as e:
+        metrics.incr("queue_full")
+        await status_msg.edit_text(f"Сервер занят: {e}")
+        return -1
+
     except Exception as e:
+        metrics.incr("predict_error")
         append_error_log(user_id=user_id, ticker=ticker, amount=amount, msg=str(e))
         await status_msg.edit_text(
             "Ошибка при построении прогноза. Попробуй другой тикер или чуть позже.\n"
@@ -144,6 +176,133 @@ async def predict_run(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return -1
 
 
+MAX_COMPARE = int(os.getenv("MAX_COMPARE", "6"))
+
+
+async def compare_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    /compare T1 T2 … AMOUNT — прогнозы по нескольким тикерам параллельно. Котировки
+    качаются одной пакетной загрузкой, итог по каждому тикеру уходит, как только он
+    готов, в конце — общий рейтинг.
+    """
+    args = context.args or []
+    amount = validate_amount(args[-1]) if len(args) >= 3 else None
+    tickers = list(dict.fromkeys(t.strip().upper() for t in args[:-1]))
+    if amount is None or not all(validate_ticker(t) for t in tickers) or len(tickers) < 2:
+        return await update.message.reply_text("Формат: /compare <TICKER1> <TICKER2> … <AMOUNT>\nНапр.: /compare AAPL MSFT NVDA 1000")
+    if len(tickers) > MAX_COMPARE:
+        return await update.message.reply_text(f"Не больше {MAX_COMPARE} тикеров за раз.")
+
+    user_id = update.message.from_user.id
+    admission = context.bot_data["admission"]
+    status_msg = await update.message.reply_text(f"Загружаю котировки: {', '.join(tickers)}…")
+    results, failed = {}, {}
+    try:
+        # одно место пользователя на всё сравнение, тикеры идут через общую очередь
+        with admission.user_slot(user_id):
+            # пакетная загрузка в price_cache: дальше каждый прогноз берёт ряд из кэша
+            try:
+                loaded = await context.bot_data["executor"].run(prefetch.prefetch, tickers)
+            except Exception:
+                metrics.incr("prefetch_error")  # не страшно: каждый тикер докачает сам
+            else:
+                # load_close_many уже пробовал и по одному — второй раз дедлайн источников не ждём
+                for t in loaded["failed"]:
+                    failed[t] = ValueError(f"Не удалось получить котировки для тикера {t}")
+                    await update.message.reply_text(f"{t}: нет котировок, пропускаю")
+                tickers = [t for t in tickers if t not in failed]
+            skipped = len(failed)
+
+            await status_msg.edit_text(f"Считаю {len(tickers)} тикера(ов) параллельно… готово 0 из {len(tickers)}")
+
+            async def _one(t):
+                try:
+                    return t, await admission.predict(t, amount, user_id, hold_user=False), None
+                except Exception as e:
+                    return t, None, e
+
+            tasks = [asyncio.create_task(_one(t)) for t in tickers]
+            try:
+                for fut in asyncio.as_completed(tasks):
+                    t, result, err = await fut
+                    if err is not None:
+                        failed[t] = err
+                        if not isinstance(err, QueueFull):
+                            metrics.incr("predict_error")
+                            append_error_log(user_id=user_id, ticker=t, amount=amount, msg=str(err))
+                        await update.message.reply_text(f"{t}: не удалось построить прогноз ({err})")
+                    else:
+                        results[t] = result
+                        metrics.REGISTRY.merge(result.get("timings"), result.get("counters"))
+                        request_log.LOG.log(result["log_row"])
+                        plot_bytes: BytesIO = result["plot_bytes"]
+                        plot_bytes.seek(0)
+                        with metrics.span("tg_send_photo"):
+                            await update.message.reply_photo(plot_bytes, caption=_summary_text(t, amount, result)[:1024])
+                    try:
+                        await status_msg.edit_text(
+                            f"Считаю {len(tickers)} тикера(ов) параллельно… "
+                            f"готово {len(results) + len(failed) - skipped} из {len(tickers)}"
+                        )
+                    except Exception:
+                        pass
+            finally:
+                for task in tasks:
+                    task.cancel()
+    except UserBusy as e:
+        return await status_msg.edit_text(str(e))
+
+    if not results:
+        return await status_msg.edit_text("Ни по одному тикеру прогноз не построился.")
+    ranking = sorted(results.items(), key=lambda kv: (kv[1]["change_pct"], kv[1]["est_profit"]), reverse=True)
+    lines = [f"Рейтинг по ожидаемому изменению за 30 дн (сумма {amount:.2f}):"]
+    for i, (t, r) in enumerate(ranking, 1):
+        lines.append(f"{i}. {t}: {r['change_pct']:+.2f}%, прибыль {r['est_profit']:.2f} ({r['best_model']})")
+    if failed:
+        lines.append("Без прогноза: " + ", ".join(failed))
+    await update.message.reply_text("\n".join(lines))
+    await status_msg.delete()
+
+
+def _admin_ids() -> set:
+    raw = os.getenv("ADMIN_IDS", "")
+    return {int(x) for x in raw.replace(";", ",").split(",") if x.strip().isdigit()}
+
+
+async def stats_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Латентности стадий и счётчики — только для ADMIN_IDS."""
+    if update.message.from_user.id not in _admin_ids():
+        return await update.message.reply_text("Команда доступна только администратору.")
+    await update.message.reply_text(metrics.REGISTRY.render_text())
+
+
+async def history_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/history — мои последние запросы; /history top — популярные тикеры и ошибки (админ)."""
+    user_id = update.message.from_user.id
+    if context.args and context.args[0].lower() == "top":
+        if user_id not in _admin_ids():
+            return await update.message.reply_text("Команда доступна только администратору.")
+        top = await asyncio.to_thread(request_log.LOG.ticker_popularity)
+        errors = await asyncio.to_thread(request_log.LOG.error_rates)
+        lines = ["Популярные тикеры за 30 дней:"]
+        lines += [f"{r['ticker']}: {r['requests']} запр., {r['users']} польз." for r in top] or ["—"]
+        lines += ["", "Ошибки за 7 дней:"]
+        lines += [f"{r['ticker']}: {r['errors']} из {r['requests']} ({r['error_pct']}%)" for r in errors] or ["—"]
+        return await update.message.reply_text("\n".join(lines))
+
+    rows = await asyncio.to_thread(request_log.LOG.user_history, user_id)
+    if not rows:
+        return await update.message.reply_text("Запросов пока не было. Попробуй /predict AAPL 1000")
+    lines = ["Последние запросы:"]
+    for r in rows:
+        when = r["timestamp"].replace("T", " ")[:16]
+        if r["status"] == "ok":
+            lines.append(f"{when} {r['ticker']} {r['amount']:g}$ → {r['best_model']}, прибыль {r['est_profit']:.2f}$")
+        else:
+            lines.append(f"{when} {r['ticker']} — ошибка: {(r['error_msg'] or '')[:60]}")
+    await update.message.reply_text("\n".join(lines))
+
+
 async def cancel_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("Ок, отменил.")
     return -1
@@ -152,38 +311,19 @@ async def cancel_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # zip с исходниками
 async def source_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
-    Пакуем проект в zip и отправляем. Игнорируем .venv и __pycache__.
+    Отправляем zip с исходниками (bot/source_archive.py): собирается в памяти один раз
+    на версию файлов, повторно уходит уже загруженный в Telegram документ.
     """
     await update.message.chat.send_action(ChatAction.UPLOAD_DOCUMENT)
 
-    root = os.getcwd()
-    tmpdir = tempfile.mkdtemp()
-    copy_root = os.path.join(tmpdir, "project")
-    os.makedirs(copy_root, exist_ok=True)
-
-    def _skip(path: str) -> bool:
-        rel = os.path.relpath(path, root)
-        parts = rel.split(os.sep)
-        return (".venv" in parts) or ("__pycache__" in parts)
-
-    # чистая версия 
-    for dirpath, dirnames, filenames in os.walk(root):
-        if _skip(dirpath):
-            continue
-        rel = os.path.relpath(dirpath, root)
-        dst_dir = os.path.join(copy_root, "" if rel == "." else rel)
-        os.makedirs(dst_dir, exist_ok=True)
-        for fn in filenames:
-            src = os.path.join(dirpath, fn)
-            if not _skip(src):
-                shutil.copy2(src, os.path.join(dst_dir, fn))
-
-    zip_base = os.path.join(tmpdir, f"tg_bot_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
-    zip_path = shutil.make_archive(zip_base, "zip", copy_root)
-
-    with open(zip_path, "rb") as f:
-        await update.message.reply_document(
-            f, filename=os.path.basename(zip_path), caption="Исходники проекта"
-        )
-
-    shutil.rmtree(tmpdir, ignore_errors=True)
+    archive = context.bot_data.get("source_archive")
+    if archive is None:
+        archive = context.bot_data["source_archive"] = SourceArchive()
+    data, name, file_id = await archive.get()
+
+    if file_id is not None:
+        metrics.incr("source_cached")
+        await update.message.reply_document(file_id, caption="Исходники проекта")
+        return
+    msg = await update.message.reply_document(BytesIO(data), filename=name, caption="Исходники проекта")
+    archive.remember_upload(name, msg.document.file_id)
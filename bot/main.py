@@ -6,6 +6,38 @@ from telegram.ext import (
     ConversationHandler, filters
 )
 from bot import handlers as h
+from core import metrics, prefetch
+from core.admission import Admission
+from core.executor import PipelineExecutor
+from core.jobqueue import QueueExecutor
+
+# local — пул процессов внутри бота; queue — бот только ставит задачи, считают `python -m core.worker`
+EXECUTOR = os.getenv("EXECUTOR", "local")
+# polling | webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+
+
+async def _post_init(app):
+    # пул поднимается сразу, научный стек грузится в воркерах в фоне — polling не ждёт прогрева
+    executor = QueueExecutor() if EXECUTOR == "queue" else PipelineExecutor()
+    await executor.start()
+    app.bot_data["executor"] = executor
+    app.bot_data["admission"] = Admission(executor)
+    # после закрытия биржи греем price_cache популярными тикерами
+    prefetch.schedule(app.job_queue)
+
+    port = int(os.getenv("METRICS_PORT", "0"))
+    if port:
+        app.bot_data["metrics_server"] = metrics.start_http_server(port, os.getenv("METRICS_HOST", "127.0.0.1"))
+
+
+async def _post_shutdown(app):
+    server = app.bot_data.pop("metrics_server", None)
+    if server is not None:
+        server.shutdown()
+    executor = app.bot_data.pop("executor", None)
+    if executor is not None:
+        await executor.shutdown()
 
 
 def main():
@@ -14,19 +46,30 @@ def main():
     if not token:
         raise RuntimeError("BOT_TOKEN not found. Create .env based on .env.example")
 
-    app = ApplicationBuilder().token(token).build()
+    app = (
+        ApplicationBuilder()
+        .token(token)
+        .post_init(_post_init)
+        .post_shutdown(_post_shutdown)
+        .build()
+    )
 
     # команды
     app.add_handler(CommandHandler("start", h.start_cmd))
     app.add_handler(CommandHandler("help", h.help_cmd))
     app.add_handler(CommandHandler("about", h.about_cmd))
     app.add_handler(CommandHandler("source", h.source_cmd))
+    app.add_handler(CommandHandler("stats", h.stats_cmd))
+    app.add_handler(CommandHandler("history", h.history_cmd))
+    # сравнение нескольких тикеров идёт долго — не держим остальные апдейты
+    app.add_handler(CommandHandler("compare", h.compare_cmd, block=False))
 
     # быстрый режим: /predict <TICKER> <AMOUNT>.
     app.add_handler(
         MessageHandler(
             filters.Regex(r"^/predict(\s+\S+){2}\s*$"),
             h.predict_short_cmd,
+            block=False,  # прогноз идёт в фоне, /start и /help отвечают сразу
         )
     )
 
@@ -35,7 +78,9 @@ def main():
         entry_points=[CommandHandler("predict", h.predict_enter_ticker)],
         states={
             h.T_TICKER: [MessageHandler(filters.TEXT & ~filters.COMMAND, h.predict_enter_amount)],
-            h.T_AMOUNT: [MessageHandler(filters.TEXT & ~filters.COMMAND, h.predict_run)],
+            h.T_AMOUNT: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, h.predict_run, block=False)
+            ],
         },
         fallbacks=[CommandHandler("cancel", h.cancel_cmd)],
         name="predict_dialog",
@@ -43,8 +88,21 @@ def main():
     )
     app.add_handler(conv)
 
-    print("Bot is running... Press Ctrl+C to stop.")
-    app.run_polling()
+    print(f"Bot is running ({BOT_MODE}, executor={EXECUTOR})... Press Ctrl+C to stop.")
+    if BOT_MODE == "webhook":
+        url = os.getenv("WEBHOOK_URL")
+        if not url:
+            raise RuntimeError("WEBHOOK_URL not set (BOT_MODE=webhook)")
+        path = os.getenv("WEBHOOK_PATH", "telegram")
+        app.run_webhook(
+            listen=os.getenv("WEBHOOK_LISTEN", "0.0.0.0"),
+            port=int(os.getenv("WEBHOOK_PORT", "8443")),
+            url_path=path,
+            webhook_url=f"{url.rstrip('/')}/{path}",
+            secret_token=os.getenv("WEBHOOK_SECRET") or None,
+        )
+    else:
+        app.run_polling()
 
 
 if __name__ == "__main__":
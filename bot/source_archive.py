@@ -0,0 +1,91 @@
+# bot/source_archive.py
+"""
+Zip с исходниками для /source, собранный в памяти и закэшированный.
+
+Какие файлы входят — SOURCE_INCLUDE / SOURCE_EXCLUDE (glob по пути от корня проекта,
+через запятую). Отпечаток — пути, размеры и mtime подходящих файлов: пока он не
+изменился, отдаётся готовый архив (и file_id уже загруженного в Telegram документа),
+без обхода содержимого и без повторной упаковки.
+"""
+import asyncio
+import hashlib
+import io
+import os
+import zipfile
+from fnmatch import fnmatch
+
+SOURCE_INCLUDE = os.getenv(
+    "SOURCE_INCLUDE", "*.py,*.md,requirements.txt,.env.example,.gitignore,scr/*"
+)
+# .env с токеном бота в архив не попадает никогда — см. _NEVER
+SOURCE_EXCLUDE = os.getenv(
+    "SOURCE_EXCLUDE", ".venv/*,venv/*,*/__pycache__/*,.cache/*,examples/*,logs.*,bench.json,requests.jsonl"
+)
+_NEVER = (".env", "*/.env")
+_PRUNE = {".git", ".venv", "venv", "__pycache__", ".cache", ".pytest_cache", "node_modules"}
+
+
+def _patterns(raw: str) -> list:
+    return [p.strip() for p in raw.split(",") if p.strip()]
+
+
+class SourceArchive:
+    def __init__(self, root: str = None, include: str = None, exclude: str = None):
+        self.root = root or os.getcwd()
+        self.include = _patterns(SOURCE_INCLUDE if include is None else include)
+        self.exclude = _patterns(SOURCE_EXCLUDE if exclude is None else exclude) + list(_NEVER)
+        self._lock = asyncio.Lock()
+        self._fingerprint = None
+        self._data = None
+        self._name = None
+        self.file_id = None  # id документа в Telegram для текущего архива
+
+    def _wanted(self, rel: str) -> bool:
+        if any(fnmatch(rel, p) for p in self.exclude):
+            return False
+        # "*.py" должно ловить и файлы в подпапках
+        return any(fnmatch(rel, p) or fnmatch(os.path.basename(rel), p) for p in self.include)
+
+    def files(self) -> list:
+        """[(путь от корня, size, mtime_ns)] подходящих файлов, по порядку."""
+        out = []
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = sorted(d for d in dirnames if d not in _PRUNE)
+            for fn in sorted(filenames):
+                path = os.path.join(dirpath, fn)
+                rel = os.path.relpath(path, self.root).replace(os.sep, "/")
+                if self._wanted(rel):
+                    st = os.stat(path)
+                    out.append((rel, st.st_size, st.st_mtime_ns))
+        return out
+
+    def _build(self, files: list):
+        buf = io.BytesIO()
+        digest = hashlib.sha1()
+        with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+            for rel, _, _ in files:
+                with open(os.path.join(self.root, rel), "rb") as f:
+                    data = f.read()
+                digest.update(rel.encode())
+                digest.update(data)
+                zf.writestr(f"project/{rel}", data)
+        return buf.getvalue(), f"tg_bot_{digest.hexdigest()[:10]}.zip"
+
+    def _get_sync(self):
+        files = self.files()
+        fingerprint = hashlib.sha1(repr(files).encode()).hexdigest()
+        if fingerprint != self._fingerprint:
+            self._data, self._name = self._build(files)
+            self._fingerprint = fingerprint
+            self.file_id = None
+        return self._data, self._name, self.file_id
+
+    async def get(self):
+        """(байты zip, имя файла, file_id или None). Обход и упаковка — в потоке, не в event loop."""
+        async with self._lock:
+            return await asyncio.to_thread(self._get_sync)
+
+    def remember_upload(self, name: str, file_id: str):
+        # архив могли пересобрать, пока документ грузился — тогда file_id уже не наш
+        if name == self._name:
+            self.file_id = file_id
@@ -0,0 +1,192 @@
+# core/admission.py
+"""
+Допуск /predict к пулу воркеров.
+
+* Глобальный лимит: одновременно считается не больше max_running прогнозов, остальные
+  ждут в очереди FIFO длиной max_queue (сверх неё — QueueFull). Ожидающие — это только
+  asyncio-футуры в боте: пулу не отдаётся больше задач, чем он может взять, поэтому
+  всплеск запросов растит ожидание, а не память.
+* Лимит на пользователя: не больше PER_USER_INFLIGHT прогнозов одного пользователя разом.
+* Склейка: одинаковые (тикер, дата данных) в полёте считаются один раз; остальные ждут
+  лидера и получают его прогноз, досчитывая только часть, зависящую от суммы, — в потоке
+  бота (core.finish), а не в пуле: очередь за чужими тяжёлыми расчётами им не нужна.
+
+Позиция в очереди сообщается колбэком on_queue(pos): pos > 0 — место в очереди,
+0 — расчёт начался.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from core import metrics
+from core.executor import QueueFull
+
+PER_USER_INFLIGHT = int(os.getenv("PER_USER_INFLIGHT", "2"))
+MARKET_TZ = ZoneInfo("America/New_York")  # как в core.price_cache
+
+
+class UserBusy(QueueFull):
+    """У пользователя уже считается предельное число прогнозов."""
+
+
+def session_date(now: datetime = None) -> str:
+    """Дата последней закрытой сессии (будни после 16:00 по Нью-Йорку) — по ней склеиваем запросы."""
+    local = (now or datetime.now(MARKET_TZ)).astimezone(MARKET_TZ)
+    day = local.date() if local.hour >= 16 else local.date() - timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day.isoformat()
+
+
+async def _finish_local(ticker: str, amount: float, user_id: int, fc: dict) -> dict:
+    # импорт при первом склеенном запросе: старт бота не тянет numpy/pandas
+    from core.finish import finish_job
+    return await asyncio.to_thread(finish_job, ticker, amount, user_id, fc)
+
+
+class _Waiter:
+    __slots__ = ("granted", "wake")
+
+    def __init__(self):
+        self.granted = False
+        self.wake = asyncio.Event()
+
+
+class Admission:
+    def __init__(self, executor, max_running: int = None, max_queue: int = None, per_user: int = None,
+                 finish=None):
+        """finish(ticker, amount, user_id, fc) — async-досчёт для склеенных запросов."""
+        self.executor = executor
+        self.finish = finish or _finish_local
+        self.max_running = max_running or executor.workers
+        self.max_queue = executor.max_queue if max_queue is None else max_queue
+        self.per_user = per_user or PER_USER_INFLIGHT
+        self._running = 0
+        self._waiting = deque()
+        self._users = {}
+        self._inflight = {}  # (тикер, дата данных) -> футура с результатом лидера
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiting)
+
+    @contextmanager
+    def user_slot(self, user_id: int):
+        """Одно место из PER_USER_INFLIGHT; /compare берёт одно на все свои тикеры."""
+        if self._users.get(user_id, 0) >= self.per_user:
+            metrics.incr("user_limit")
+            raise UserBusy(f"У тебя уже считается {self.per_user} прогноз(а), дождись результата")
+        self._users[user_id] = self._users.get(user_id, 0) + 1
+        try:
+            yield
+        finally:
+            self._users[user_id] -= 1
+            if not self._users[user_id]:
+                del self._users[user_id]
+
+    async def predict(self, ticker: str, amount: float, user_id: int, on_queue=None,
+                      hold_user: bool = True) -> dict:
+        """hold_user=False — место пользователя уже занято вызывающим (user_slot)."""
+        if not hold_user:
+            return await self._predict(ticker, amount, user_id, on_queue)
+        with self.user_slot(user_id):
+            return await self._predict(ticker, amount, user_id, on_queue)
+
+    async def _predict(self, ticker: str, amount: float, user_id: int, on_queue) -> dict:
+        key = (ticker.upper(), session_date())
+        leader = self._inflight.get(key)
+        if leader is not None:
+            metrics.incr("coalesced")
+            await _notify(on_queue, 0)
+            try:
+                shared = await asyncio.shield(leader)
+            except asyncio.CancelledError:
+                # отменили лидера, а не нас — считаем сами
+                if leader.cancelled():
+                    return await self._predict(ticker, amount, user_id, on_queue)
+                raise
+            # выбор модели уже сделан лидером — досчитываем только сигналы и прибыль под свою сумму.
+            # Это миллисекунды на numpy: считаем у себя, мимо пула, — ни QueueFull при всплеске по
+            # одному тикеру, ни ожидания свободного воркера за чужими расчётами
+            return await self.finish(ticker, amount, user_id, shared["fc"])
+
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            await self._acquire(on_queue)
+            try:
+                await _notify(on_queue, 0)
+                result = await self.executor.submit(ticker=ticker, amount=amount, user_id=user_id, share=True)
+            finally:
+                self._release()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()  # ждущих может не быть — не ругаемся на непрочитанную ошибку
+            raise
+        else:
+            fut.set_result(result)
+            return result
+        finally:
+            if self._inflight.get(key) is fut:
+                del self._inflight[key]
+
+    async def _acquire(self, on_queue):
+        if self._running < self.max_running and not self._waiting:
+            self._running += 1
+            return
+        if len(self._waiting) >= self.max_queue:
+            raise QueueFull("Слишком много запросов, попробуй через минуту")
+
+        w = _Waiter()
+        self._waiting.append(w)
+        metrics.incr("admission_queued")
+        t0 = time.perf_counter()
+        last = None
+        try:
+            while True:
+                w.wake.clear()
+                if w.granted:
+                    break
+                pos = self._waiting.index(w) + 1
+                if pos != last:
+                    last = pos
+                    await _notify(on_queue, pos)
+                await w.wake.wait()
+        except BaseException:
+            if w.granted:
+                self._release()
+            else:
+                self._waiting.remove(w)
+                self._shift()
+            raise
+        metrics.observe("admission_wait", time.perf_counter() - t0)
+
+    def _release(self):
+        self._running -= 1
+        if self._waiting and self._running < self.max_running:
+            w = self._waiting.popleft()
+            w.granted = True
+            self._running += 1
+            w.wake.set()
+            self._shift()
+
+    def _shift(self):
+        # очередь сдвинулась — пусть ожидающие обновят свою позицию
+        for w in self._waiting:
+            w.wake.set()
+
+
+async def _notify(on_queue, pos: int):
+    if on_queue is None:
+        return
+    try:
+        await on_queue(pos)
+    except Exception:
+        pass  # например, Telegram не дал отредактировать сообщение — на расчёт не влияет
@@ -0,0 +1,99 @@
+# core/backtest.py
+"""
+Walk-forward бэктест для выбора модели: точка отсечения сдвигается шагами,
+на каждом фолде считаем ошибку прогноза каждого кандидата.
+Полный подбор делается один раз, дальше кандидат только обновляется
+своим хуком update из реестра: ARIMA — append() к состоянию фильтра,
+ETS — те же параметры без оптимизации, ML — Ridge с уже выбранной alpha,
+NN — дообучение весов несколько эпох.
+"""
+import pandas as pd
+
+from models import registry
+
+
+def fold_origins(n: int, folds: int, horizon: int, step: int) -> list:
+    """Индексы точек отсечения; последний фолд заканчивается на конце ряда."""
+    return [n - horizon - (folds - 1 - k) * step for k in range(folds)]
+
+
+def walk_forward(s: pd.Series, folds: int = 5, horizon: int = 20, step: int = None,
+                 key=None, candidates=None) -> dict:
+    """
+    key — тикер (по нему NN берёт ранее обученные веса), candidates — кандидаты реестра.
+    Возвращает {"rmse": DataFrame, "mape": DataFrame, "models": {имя: модель},
+    "kinds": {имя: кандидат}, "skipped": [(кандидат, причина)]}.
+    Строки матриц — фолды (дата отсечения), колонки — кандидаты.
+    Модели в "models" уже доведены до конца ряда и готовы к прогнозу.
+    """
+    step = step or horizon
+    cands = registry.enabled() if candidates is None else candidates
+    origins = fold_origins(len(s), folds, horizon, step)
+    if origins[0] < 100:
+        raise ValueError("Слишком короткий ряд для walk-forward")
+
+    rmse, mape = {}, {}
+
+    # фолд 0: полный подбор всех кандидатов
+    o = origins[0]
+    train, test = s.iloc[:o], s.iloc[o:o + horizon]
+    fitted, skipped = [], []
+    rmse[s.index[o]], mape[s.index[o]] = {}, {}
+    for c in cands:
+        try:
+            model, r, m = c.fit(train, test, key)
+        except Exception as e:
+            # например, ARIMA не сошлась — кандидат выбывает
+            skipped.append((c.name, f"{type(e).__name__}: {e}"))
+            continue
+        c.keep(key, model)
+        name = c.label(model)
+        fitted.append([name, c, model])
+        rmse[s.index[o]][name], mape[s.index[o]][name] = r, m
+
+    def _drop(item, e):
+        # упал на обновлении или оценке — выбывает целиком, как при ошибке подбора
+        fitted.remove(item)
+        skipped.append((item[1].name, f"{type(e).__name__}: {e}"))
+
+    # следующие фолды: только обновление состояния
+    prev = o
+    for o in origins[1:]:
+        test = s.iloc[o:o + horizon]
+        rmse[s.index[o]], mape[s.index[o]] = {}, {}
+        for item in list(fitted):
+            name, c, model = item
+            try:
+                item[2] = model = c.update(model, s.iloc[:o], s.iloc[prev:o])
+                r, m = c.evaluate(model, s.iloc[:o], test)
+            except Exception as e:
+                _drop(item, e)
+                continue
+            rmse[s.index[o]][name], mape[s.index[o]][name] = r, m
+        prev = o
+
+    # доводим модели до конца ряда, чтобы прогнозировать от последнего бара
+    models, kinds = {}, {}
+    for item in list(fitted):
+        name, c, model = item
+        try:
+            models[name] = c.update(model, s, s.iloc[prev:])
+        except Exception as e:
+            _drop(item, e)
+            continue
+        kinds[name] = c.name
+    if not fitted:
+        raise RuntimeError("Ни одна модель не обучилась: " + "; ".join(f"{n}: {r}" for n, r in skipped))
+    names = [name for name, _, _ in fitted]
+
+    def _frame(d):
+        return pd.DataFrame.from_dict(d, orient="index").reindex(columns=names).rename_axis("origin")
+
+    return {"rmse": _frame(rmse), "mape": _frame(mape), "models": models, "kinds": kinds, "skipped": skipped}
+
+
+def pick_best(bt: dict):
+    """Лучший кандидат по средней RMSE по фолдам: (имя, rmse, mape, модель, кандидат)."""
+    mean_rmse = bt["rmse"].mean()
+    name = mean_rmse.idxmin()
+    return name, float(mean_rmse[name]), float(bt["mape"][name].mean()), bt["models"][name], bt["kinds"][name]
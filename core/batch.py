@@ -0,0 +1,160 @@
+# core/batch.py
+"""
+Пакетный прогноз по списку тикеров без бота.
+
+    python -m core.batch tickers.txt --out forecasts.parquet --jobs 8 --amount 1000
+
+tickers.txt — тикеры через пробел, запятую или по одному в строке (# — комментарий).
+Результат — один файл: .parquet (нужен pyarrow) или .csv; прогноз и сигналы лежат
+в колонках-списках (в CSV — JSON-строкой). Ошибки по тикеру не прерывают прогон
+и пишутся в журнал запросов (logs.db) так же, как ошибки бота.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from bot.utils import validate_ticker
+
+BATCH_USER_ID = 0  # в журнале пакетные строки отличаем по user_id
+
+
+def read_tickers(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        text = "\n".join(line.split("#", 1)[0] for line in f)
+    tickers = [t.upper() for t in re.split(r"[\s,;]+", text) if t]
+    return [t for t in dict.fromkeys(tickers) if validate_ticker(t)]
+
+
+def _init_worker():
+    # ни ARIMA, ни турнир моделей не должны плодить свои процессы поверх пула батча
+    import core.tournament as tournament
+    import models.models_stats as ms
+    ms.ARIMA_JOBS = 1
+    tournament.PROCS = False
+
+
+def _run_one(ticker: str, s, amount: float) -> dict:
+    from core.selection import forecast_series
+    from viz.recommender import make_signals_and_profit
+
+    t0 = time.perf_counter()
+    fc = forecast_series(ticker, s, plot=False)
+    t1 = time.perf_counter()
+    signals_df, est_profit, pairs = make_signals_and_profit(fc["forecast"], amount, fc["last_price"])
+    t2 = time.perf_counter()
+    bands = fc.get("bands")
+
+    return {
+        "ticker": ticker,
+        "status": "ok",
+        "error_msg": "",
+        "last_date": s.index[-1].strftime("%Y-%m-%d"),
+        "last_price": fc["last_price"],
+        "best_model": fc["best_model"],
+        "rmse": fc["rmse"],
+        "mape": fc["mape"],
+        "change_pct": float((fc["forecast"][-1] - fc["last_price"]) / fc["last_price"] * 100.0),
+        "est_profit": float(est_profit),
+        # 90% сценариев: цена на конце горизонта; доля сценариев, где сигналы в плюсе
+        "price_p5": float(bands[0][-1]) if bands is not None else None,
+        "price_p95": float(bands[-1][-1]) if bands is not None else None,
+        "profit_prob": fc.get("profit_prob"),
+        "forecast": [float(x) for x in fc["forecast"]],
+        "signals": [f"{r.signal} {r.date} {r.price:.4f}" for r in signals_df.itertuples()],
+        "_stages": {"model": t1 - t0, "signals": t2 - t1},
+    }
+
+
+def _error_row(ticker: str, msg: str) -> dict:
+    return {"ticker": ticker, "status": "error", "error_msg": msg[:500], "forecast": [], "signals": []}
+
+
+def write_results(rows: list, path: str) -> str:
+    import pandas as pd
+
+    df = pd.DataFrame(rows)
+    if path.endswith(".parquet"):
+        try:
+            df.to_parquet(path, index=False)
+            return path
+        except ImportError:
+            path = path[: -len(".parquet")] + ".csv"
+            print(f"pyarrow не установлен, пишу CSV: {path}", file=sys.stderr)
+    for col in ("forecast", "signals"):
+        df[col] = df[col].map(json.dumps)
+    df.to_csv(path, index=False)
+    return path
+
+
+def run_batch(tickers: list, out: str, jobs: int = None, amount: float = 1000.0) -> dict:
+    from core.data_loader import load_close_many
+    from core.request_log import append_error_log
+
+    jobs = jobs or os.cpu_count() or 1
+    stages = {"load": 0.0, "model": 0.0, "signals": 0.0}
+    rows = []
+    t_start = time.perf_counter()
+
+    t0 = time.perf_counter()
+    series = load_close_many(tickers)
+    stages["load"] = time.perf_counter() - t0
+
+    for t in tickers:
+        if t not in series:
+            msg = f"Не удалось получить котировки для тикера {t}"
+            append_error_log(user_id=BATCH_USER_ID, ticker=t, amount=amount, msg=msg)
+            rows.append(_error_row(t, msg))
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker) as pool:
+        futures = {pool.submit(_run_one, t, s, amount): t for t, s in series.items()}
+        for fut in as_completed(futures):
+            t = futures[fut]
+            try:
+                row = fut.result()
+            except Exception as e:
+                append_error_log(user_id=BATCH_USER_ID, ticker=t, amount=amount, msg=str(e))
+                rows.append(_error_row(t, str(e)))
+                continue
+            for k, v in row.pop("_stages").items():
+                stages[k] += v
+            rows.append(row)
+
+    order = {t: i for i, t in enumerate(tickers)}
+    rows.sort(key=lambda r: order.get(r["ticker"], len(order)))
+    path = write_results(rows, out)
+    wall = time.perf_counter() - t_start
+    ok = sum(r["status"] == "ok" for r in rows)
+    return {"path": path, "tickers": len(tickers), "ok": ok, "wall": wall, "stages": stages}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Пакетный прогноз по списку тикеров")
+    ap.add_argument("tickers_file")
+    ap.add_argument("--out", default="batch_forecasts.parquet")
+    ap.add_argument("--jobs", type=int, default=0, help="процессов (0 — по числу ядер)")
+    ap.add_argument("--amount", type=float, default=1000.0)
+    args = ap.parse_args(argv)
+
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    tickers = read_tickers(args.tickers_file)
+    if not tickers:
+        ap.error("в файле нет ни одного тикера")
+
+    rep = run_batch(tickers, args.out, jobs=args.jobs or None, amount=args.amount)
+    wall = rep["wall"]
+    print(f"Готово: {rep['ok']}/{rep['tickers']} тикеров за {wall:.1f} с "
+          f"({rep['tickers'] / wall:.2f} тикеров/с) -> {rep['path']}")
+    # load — стена в главном процессе, остальное — сумма времени воркеров
+    total = sum(rep["stages"].values()) or 1.0
+    for name, sec in rep["stages"].items():
+        print(f"  {name:8s} {sec:8.2f} с  {sec / total * 100:5.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,8 @@
-from typing import Tuple
-import os, time
+from typing import Optional, Tuple
 import pandas as pd
 import yfinance as yf
 
-PREFER_SOURCE = os.getenv("DATA_SOURCE", "auto").lower()  # auto|yahoo|stooq
+from core import fetch, metrics, price_cache
 
 def _clean_close(df: pd.DataFrame) -> pd.Series:
     df = df.sort_index()
@@ -12,86 +11,101 @@ def _clean_close(df: pd.DataFrame) -> pd.Series:
     s = s.resample("B").ffill().bfill()
     return s
 
-def _try_yahoo(ticker: str, period: str = "2y"):
-    # A) period=2y
-    for attempt in range(3):
-        try:
-            data = yf.download(
-                ticker, period=period, interval="1d",
-                auto_adjust=True, progress=False, threads=False
-            )
-            if data is not None and not data.empty and "Close" in data.columns:
-                return _clean_close(data)
-        except Exception:
-            pass
-        time.sleep(1.2 * (attempt + 1))
-
-    try:
-        end = pd.Timestamp.today().normalize()
-        start = end - pd.Timedelta(days=730)
-        data = yf.download(
-            ticker, start=start, end=end, interval="1d",
-            auto_adjust=True, progress=False, threads=False
-        )
-        if data is not None and not data.empty and "Close" in data.columns:
-            return _clean_close(data)
-    except Exception:
-        pass
-
-    try:
-        t = yf.Ticker(ticker)
-        hist = t.history(period=period, interval="1d", auto_adjust=True)
-        if hist is not None and not hist.empty and "Close" in hist.columns:
-            return _clean_close(hist)
-    except Exception:
-        pass
-    return None
-
-def _try_stooq(ticker: str):
-    try:
-        from pandas_datareader import data as pdr
-    except Exception:
-        return None
-        
-    for sym in (ticker, f"{ticker}.US"):
-        try:
-            st = pdr.DataReader(sym, "stooq")
-            if st is None or st.empty or "Close" not in st.columns:
-                continue
-            st = st.sort_index()
-            s = st["Close"].copy()
-            cutoff = s.index.max() - pd.Timedelta(days=730)
-            s = s.loc[s.index >= cutoff]
-            s = s.asfreq("B").ffill().bfill()
-            if len(s) > 50:
-                return s
-        except Exception:
-            continue
-    return None
+def _fetch(ticker: str, period: str = "2y", start: Optional[pd.Timestamp] = None):
+    """Stooq и Yahoo наперегонки с хеджированием (core.fetch). Возвращает (ряд, источник) или (None, "")."""
+    return fetch.fetch_close_sync(ticker, start, period=period)
 
 def load_close_series(ticker: str, period: str = "2y") -> pd.Series:
     """
-    Надёжная загрузка: сначала Stooq, затем Yahoo.
-    Можно переопределить через .env: DATA_SOURCE=stooq|yahoo|auto
+    Надёжная загрузка: Stooq и Yahoo наперегонки, кто первым отдаст валидный ряд.
+    Порядок (и отключение Yahoo) через .env: DATA_SOURCE=stooq|yahoo|auto
+    Ряд кэшируется на диске (core.price_cache): до следующего закрытия биржи
+    отдаём его из файла, после — докачиваем только новые бары.
+    period — как в yfinance ("2y", "5y", "max"); если в кэше история короче, качаем заново.
     """
-    if PREFER_SOURCE in ("stooq", "auto"):
-        s = _try_stooq(ticker)
-        if s is not None:
-            return s
-        if PREFER_SOURCE == "stooq":
+    days = fetch.period_days(period)
+    cached = price_cache.read(ticker)
+    if cached is not None and price_cache.covers(cached[1], days):
+        s, meta = cached
+        if price_cache.is_fresh(meta):
+            metrics.incr("price_cache_hit")
+            return price_cache.trim(s, days)
+        metrics.incr("price_cache_stale")
+        # неделя перекрытия, чтобы сверить стык по закрытым барам
+        new, source = _fetch(ticker, period, start=s.index[-1] - pd.Timedelta(days=7))
+        if new is None:
+            # источники не уложились в дедлайн — второй раз их не ждём, отдаём вчерашний ряд
+            metrics.incr("price_cache_stale_served")
+            return price_cache.trim(s, days)
+        # в кэше могло быть больше истории, чем просят сейчас, — не укорачиваем его
+        keep = meta.get("history_days", price_cache.HISTORY_DAYS)
+        merged = price_cache.merge(s, new, keep)
+        if merged is not None:
+            price_cache.write(ticker, merged, source, keep)
+            return price_cache.trim(merged, days)
+        # стык не сошёлся (сплит, дивиденды) — ниже качаем ряд целиком
+    elif cached is not None:
+        metrics.incr("price_cache_short")
+    else:
+        metrics.incr("price_cache_miss")
+
+    s, source = _fetch(ticker, period)
+    if s is None:
+        if cached is not None:
+            # источники недоступны — лучше вчерашний (или более короткий) ряд, чем ошибка
+            return price_cache.trim(cached[0], days)
+        if fetch.PREFER_SOURCE == "stooq":
             raise ValueError(f"Stooq не вернул данные для {ticker}")
+        raise ValueError(f"Не удалось получить котировки для тикера {ticker}")
+    price_cache.write(ticker, s, source, days)
+    return s
 
-    s = _try_yahoo(ticker, period)
-    if s is not None:
-        return s
+def load_close_many(tickers, period: str = "2y", chunk: int = 50) -> dict:
+    """
+    Пакетная загрузка: свежие ряды берём из кэша, остальные качаем из Yahoo
+    одним multi-ticker запросом на chunk тикеров. Кто не скачался — добираем по одному.
+    Возвращает {тикер: ряд}; тикеры без данных в словарь не попадают.
+    """
+    days = fetch.period_days(period)
+    out, missing = {}, []
+    # ряды с диска и скачанные публикуются в shm_store одной пачкой, а не по тикеру
+    with price_cache.batch_publish():
+        for t in dict.fromkeys(x.upper() for x in tickers):
+            cached = price_cache.read(t)
+            if cached is not None and price_cache.is_fresh(cached[1]) and price_cache.covers(cached[1], days):
+                metrics.incr("price_cache_hit")
+                out[t] = price_cache.trim(cached[0], days)
+            else:
+                missing.append(t)
 
-    # если auto, но Stooq не пробовали попробуем в конце
-    if PREFER_SOURCE == "yahoo":
-        s = _try_stooq(ticker)
-        if s is not None:
-            return s
+        for i in range(0, len(missing), chunk):
+            part = missing[i:i + chunk]
+            try:
+                with metrics.span("bulk_download"):
+                    data = yf.download(
+                        part, period=period, interval="1d", group_by="ticker",
+                        auto_adjust=True, progress=False, threads=True
+                    )
+            except Exception:
+                data = None
+            for t in part:
+                try:
+                    df = data[t] if isinstance(data.columns, pd.MultiIndex) else data
+                    df = df.dropna(subset=["Close"])
+                    if len(df) > 50:
+                        s = _clean_close(df)
+                        price_cache.write(t, s, "yahoo", days)
+                        out[t] = s
+                except Exception:
+                    continue
 
-    raise ValueError(f"Не удалось получить котировки для тикера {ticker}")
+    for t in missing:
+        if t not in out:
+            try:
+                out[t] = load_close_series(t, period)
+            except Exception:
+                continue
+    return out
 
 def train_test_split_by_time(s: pd.Series, test_days: int = 60) -> Tuple[pd.Series, pd.Series]:
     if len(s) < test_days + 50:
@@ -0,0 +1,124 @@
+# core/executor.py
+"""
+Пул процессов для run_pipeline: обучение моделей не должно морозить event loop бота.
+Очередь ограничена, воркеры прогреваются в фоне сразу после старта, задачи — awaitable-хэндлы.
+"""
+import asyncio
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from core import metrics
+
+
+class QueueFull(RuntimeError):
+    """Очередь задач заполнена — новый прогноз сейчас не принять."""
+
+
+def _warm_worker(workers: int = None):
+    # турнир в каждом воркере делит ядра с остальными воркерами, а не берёт все
+    if workers:
+        from core import tournament
+        tournament.limit_fanout(workers)
+    # тяжёлый стек и первые вызовы горячих путей — один раз на процесс, а не на первом запросе
+    from core.selection import warmup
+    warmup()
+
+
+def _ping():
+    return os.getpid()
+
+
+def _run_job(kwargs: dict) -> dict:
+    from core.selection import run_pipeline
+    return run_pipeline(**kwargs)
+
+
+class JobHandle:
+    """Хэндл задачи в пуле: можно await-ить, проверять и отменять (пока не стартовала)."""
+
+    def __init__(self, job_id: int, future: asyncio.Future):
+        self.id = job_id
+        self._future = future
+
+    def __await__(self):
+        return self._future.__await__()
+
+    def done(self) -> bool:
+        return self._future.done()
+
+    def cancel(self) -> bool:
+        return self._future.cancel()
+
+
+class PipelineExecutor:
+    """
+    Обёртка над ProcessPoolExecutor.
+    WORKERS — число процессов (по умолчанию по числу ядер),
+    JOB_QUEUE_SIZE — сколько задач может ждать сверх занятых воркеров.
+    """
+
+    def __init__(self, workers: int = None, max_queue: int = None):
+        self.workers = workers or int(os.getenv("WORKERS", "0")) or os.cpu_count() or 1
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv("JOB_QUEUE_SIZE", "32"))
+        self._pool = None
+        self._warm = None
+        self._pending = 0
+        self._ids = itertools.count(1)
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def start(self):
+        """Не ждёт прогрева: бот начинает принимать апдейты сразу, воркеры греются параллельно."""
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker,
+                                         initargs=(self.workers,))
+        # поднимаем все процессы сразу: каждый ping заставляет пул создать воркер;
+        # задачи, пришедшие раньше конца прогрева, просто подождут его в очереди пула
+        loop = asyncio.get_running_loop()
+        t0 = time.perf_counter()
+        pings = [loop.run_in_executor(self._pool, _ping) for _ in range(self.workers)]
+        self._warm = asyncio.gather(*pings)
+        self._warm.add_done_callback(lambda fut: self._warm_done(fut, t0))
+
+    def _warm_done(self, fut, t0: float):
+        if fut.cancelled() or fut.exception() is not None:
+            metrics.incr("worker_warmup_error")
+            return
+        metrics.observe("worker_warmup", time.perf_counter() - t0)
+
+    @property
+    def ready(self) -> bool:
+        return self._warm is not None and self._warm.done()
+
+    async def wait_ready(self):
+        if self._warm is not None:
+            await asyncio.shield(self._warm)
+
+    def submit(self, **kwargs) -> JobHandle:
+        if self._pool is None:
+            raise RuntimeError("PipelineExecutor не запущен")
+        if self._pending >= self.workers + self.max_queue:
+            raise QueueFull("Слишком много запросов, попробуй через минуту")
+
+        loop = asyncio.get_running_loop()
+        fut = loop.run_in_executor(self._pool, _run_job, kwargs)
+        self._pending += 1
+        fut.add_done_callback(self._job_done)
+        return JobHandle(next(self._ids), fut)
+
+    def run(self, fn, *args) -> asyncio.Future:
+        """Служебная задача (префетч и т.п.) в том же пуле, мимо лимита очереди прогнозов."""
+        if self._pool is None:
+            raise RuntimeError("PipelineExecutor не запущен")
+        return asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+
+    def _job_done(self, _fut):
+        self._pending -= 1
+
+    async def shutdown(self):
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            await asyncio.to_thread(pool.shutdown, wait=True, cancel_futures=True)
@@ -1,21 +1,66 @@
 import pandas as pd
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+MAX_LAG = 30
+ROLL_WINDOWS = (7, 14)
+
+
+def feature_names(max_lag: int = MAX_LAG, windows=ROLL_WINDOWS) -> list:
+    names = [f"lag_{l}" for l in range(1, max_lag + 1)]
+    for win in windows:
+        names += [f"roll_mean_{win}", f"roll_std_{win}"]
+    return names
+
+
+def build_feature_matrix(values, max_lag: int = MAX_LAG, windows=ROLL_WINDOWS):
+    """
+    Матрица признаков одним проходом по скользящим окнам (без копий исходного ряда).
+    Строка i — признаки для y[i] = values[start + i], start = max(max_lag, max(windows)).
+    Порядок колонок как в make_lag_features: L1..Lmax, затем mean/std по каждому окну.
+    """
+    a = np.ascontiguousarray(values, dtype=float)
+    start = max(max_lag, max(windows))
+    n = len(a) - start
+    n_feat = max_lag + 2 * len(windows)
+    if n <= 0:
+        return np.empty((0, n_feat)), np.empty(0)
+
+    past = a[:-1]
+    X = np.empty((n, n_feat))
+    # окна идут от старого к новому, а L1 — самый свежий лаг
+    X[:, :max_lag] = sliding_window_view(past, max_lag)[start - max_lag:, ::-1]
+    for k, win in enumerate(windows):
+        w = sliding_window_view(past, win)[start - win:]
+        X[:, max_lag + 2 * k] = w.mean(axis=1)
+        X[:, max_lag + 2 * k + 1] = w.std(axis=1, ddof=1)
+    return X, a[start:]
+
+
+def split_feature_matrix(s: pd.Series, n_test: int, max_lag: int = MAX_LAG, windows=ROLL_WINDOWS):
+    """Матрица строится один раз на весь ряд; train/test — срезы-представления по строкам."""
+    X, y = build_feature_matrix(s.values, max_lag, windows)
+    cut = len(y) - n_test
+    return X[:cut], y[:cut], X[cut:], y[cut:]
+
 
 def make_lag_features(s: pd.Series, max_lag: int = 30) -> pd.DataFrame:
     """
     Лаги L1..L30 + скользящие средние/стд (7, 14).
     """
-    df = pd.DataFrame({"y": s})
-    for l in range(1, max_lag + 1):
-        df[f"lag_{l}"] = s.shift(l)
-    for win in (7, 14):
-        df[f"roll_mean_{win}"] = s.shift(1).rolling(win).mean()
-        df[f"roll_std_{win}"] = s.shift(1).rolling(win).std()
-    df = df.dropna().copy()
-    X = df.drop(columns=["y"])
-    y = df["y"].copy()
+    X, y = build_feature_matrix(s.values, max_lag)
+    idx = s.index[len(s) - len(y):]
+    X = pd.DataFrame(X, index=idx, columns=feature_names(max_lag))
+    y = pd.Series(y, index=idx, name="y")
     return X, y
 
+
+def lag_windows(values, win: int = 30):
+    """Окна для NN: X[i] = values[i:i+win] (старые → новые), y[i] = values[i+win]."""
+    a = np.ascontiguousarray(values, dtype=float)
+    return sliding_window_view(a, win)[:-1], a[win:]
+
+
 def last_window_for_recursive(s: pd.Series, max_lag: int = 30) -> pd.Series:
     """Берем последние значения для стартового окна рекурсивного прогноза ML."""
-    return s.iloc[-(max_lag + 14 + 1):].copy()
\ No newline at end of file
+    return s.iloc[-(max_lag + 14 + 1):].copy()
@@ -0,0 +1,249 @@
+# core/fetch.py
+"""
+Асинхронная загрузка котировок: Stooq (CSV) и Yahoo (chart API) через общий
+пул HTTP-соединений. Источники идут наперегонки с хеджированием: основной
+стартует сразу, резервный — через HEDGE_DELAY или сразу после отказа основного
+(4xx, битый ответ; сеть и 5xx основной сначала повторяет).
+Берём первый валидный ряд, остальные запросы отменяем. Повторы — с неблокирующей
+паузой, весь опрос ограничен FETCH_DEADLINE.
+
+Синхронный код (воркеры пайплайна) зовёт fetch_close_sync: корутина выполняется
+в фоновом event loop процесса, где и живёт пул соединений.
+"""
+import asyncio
+import concurrent.futures
+import contextvars
+import io
+import os
+import threading
+import time
+import weakref
+from typing import Optional
+
+import httpx
+import pandas as pd
+
+from core import metrics
+
+PREFER_SOURCE = os.getenv("DATA_SOURCE", "auto").lower()  # auto|yahoo|stooq
+STOOQ_URL = os.getenv("STOOQ_URL", "https://stooq.com")
+YAHOO_URL = os.getenv("YAHOO_URL", "https://query1.finance.yahoo.com")
+HEDGE_DELAY = float(os.getenv("FETCH_HEDGE_DELAY", "1.5"))  # сек до запуска резервного источника
+DEADLINE = float(os.getenv("FETCH_DEADLINE", "8"))  # сек на весь опрос
+ATTEMPTS = 3
+BACKOFF = 0.5  # 0.5, 1, 2 с между попытками
+REQUEST_TIMEOUT = 5.0
+HISTORY_DAYS = 730
+MIN_BARS = 50
+_PERIOD_UNITS = {"d": 1, "wk": 7, "mo": 30, "y": 365}
+
+_HEADERS = {"User-Agent": "Mozilla/5.0 (compatible; peroalxbot)"}
+
+_clients = weakref.WeakKeyDictionary()  # event loop -> AsyncClient
+_bg = {"pid": None, "loop": None}
+_bg_lock = threading.Lock()
+
+
+def period_days(period: str) -> Optional[int]:
+    """Период в формате yfinance ("2y", "6mo", "ytd", "max") -> дни истории; None — вся история."""
+    p = (period or "2y").lower()
+    if p == "max":
+        return None
+    if p == "ytd":
+        now = pd.Timestamp.now()
+        return (now - now.replace(month=1, day=1)).days + 1
+    for unit, days in _PERIOD_UNITS.items():
+        if p.endswith(unit) and p[:-len(unit)].isdigit():
+            return int(p[:-len(unit)]) * days
+    raise ValueError(f"Неизвестный период {period!r}")
+
+
+def _client() -> httpx.AsyncClient:
+    """Один клиент (и пул keep-alive соединений) на event loop."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = httpx.AsyncClient(
+            headers=_HEADERS,
+            timeout=REQUEST_TIMEOUT,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            follow_redirects=True,
+        )
+    return client
+
+
+def _to_business_days(s: pd.Series, start: Optional[pd.Timestamp],
+                       days: Optional[int] = HISTORY_DAYS) -> Optional[pd.Series]:
+    s = s.dropna().sort_index()
+    s = s[~s.index.duplicated(keep="last")]
+    if start is None and days is not None:
+        s = s.loc[s.index >= s.index.max() - pd.Timedelta(days=days)]
+    if s.empty or (start is None and len(s) <= MIN_BARS):
+        return None
+    s = s.asfreq("B").ffill().bfill()
+    s.name = "Close"
+    return s
+
+
+def parse_stooq(text: str, start: Optional[pd.Timestamp] = None,
+                days: Optional[int] = HISTORY_DAYS) -> Optional[pd.Series]:
+    # на неизвестный тикер Stooq отвечает 200 и текстом "No data"
+    if not text.startswith("Date,"):
+        return None
+    df = pd.read_csv(io.StringIO(text), usecols=["Date", "Close"], parse_dates=["Date"])
+    return _to_business_days(df.set_index("Date")["Close"].astype(float), start, days)
+
+
+def parse_yahoo(payload: dict, start: Optional[pd.Timestamp] = None,
+                days: Optional[int] = HISTORY_DAYS) -> Optional[pd.Series]:
+    result = (payload.get("chart") or {}).get("result") or []
+    if not result or not result[0].get("timestamp"):
+        return None
+    r = result[0]
+    ind = r["indicators"]
+    # adjclose — то же, что auto_adjust=True в yfinance
+    close = (ind.get("adjclose") or [{}])[0].get("adjclose") or ind["quote"][0]["close"]
+    offset = int(r.get("meta", {}).get("gmtoffset", 0))
+    idx = pd.to_datetime([t + offset for t in r["timestamp"]], unit="s").normalize()
+    return _to_business_days(pd.Series(close, index=idx, dtype=float), start, days)
+
+
+async def _stooq(client: httpx.AsyncClient, ticker: str, start, period: str) -> Optional[pd.Series]:
+    params = {"i": "d"}
+    if start is not None:
+        params["d1"] = start.strftime("%Y%m%d")
+    for sym in (ticker, f"{ticker}.US"):
+        r = await client.get(f"{STOOQ_URL}/q/d/l/", params={"s": sym.lower(), **params})
+        r.raise_for_status()
+        # Stooq отдаёт всю историю — период отрезаем сами
+        s = parse_stooq(r.text, start, period_days(period))
+        if s is not None:
+            return s
+    return None
+
+
+async def _yahoo(client: httpx.AsyncClient, ticker: str, start, period: str) -> Optional[pd.Series]:
+    params = {"interval": "1d", "events": "div,splits"}
+    if start is None:
+        params["range"] = period  # chart API понимает те же периоды, что yfinance
+    else:
+        params["period1"] = int(pd.Timestamp(start).timestamp())
+        params["period2"] = int(time.time())
+    r = await client.get(f"{YAHOO_URL}/v8/finance/chart/{ticker}", params=params)
+    if r.status_code == 404:
+        return None  # тикера нет — повторять нечего
+    r.raise_for_status()
+    return parse_yahoo(r.json(), start, period_days(period))
+
+
+_SOURCES = {"stooq": _stooq, "yahoo": _yahoo}
+
+
+def _retryable(e: Exception) -> bool:
+    # сеть, таймаут, 5xx и 429 могут пройти со второй попытки; 4xx и битый ответ — нет
+    if isinstance(e, httpx.HTTPStatusError):
+        code = e.response.status_code
+        return code >= 500 or code in (408, 429)
+    return isinstance(e, httpx.TransportError)
+
+
+async def _with_retries(name: str, ticker: str, start, period: str):
+    """
+    (источник, ряд или None). None без исключения — источник ответил, что данных нет.
+    Неповторяемая ошибка сразу даёт None — _race тут же запускает следующий источник.
+    """
+    client = _client()
+    with metrics.span(f"source_{name}"):
+        for attempt in range(ATTEMPTS):
+            try:
+                return name, await _SOURCES[name](client, ticker, start, period)
+            except (httpx.HTTPError, ValueError, KeyError, IndexError, TypeError) as e:
+                if attempt == ATTEMPTS - 1 or not _retryable(e):
+                    break
+                metrics.incr(f"{name}_retry")
+                await asyncio.sleep(BACKOFF * 2 ** attempt)
+    return name, None
+
+
+def _order() -> list:
+    if PREFER_SOURCE == "stooq":
+        return ["stooq"]
+    if PREFER_SOURCE == "yahoo":
+        return ["yahoo", "stooq"]
+    return ["stooq", "yahoo"]
+
+
+async def _race(ticker: str, start, period: str):
+    queue = _order()
+    pending, launched = set(), []
+
+    def launch():
+        t = asyncio.create_task(_with_retries(queue.pop(0), ticker, start, period))
+        launched.append(t)
+        pending.add(t)
+
+    launch()
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, timeout=HEDGE_DELAY if queue else None, return_when=asyncio.FIRST_COMPLETED
+            )
+            for t in done:
+                name, s = t.result()
+                if s is not None:
+                    return s, name
+            # основной тормозит (хедж) или уже отказал (фолбэк) — запускаем следующий
+            if queue:
+                metrics.incr("source_hedge" if not done else "source_fallback")
+                launch()
+        return None, ""
+    finally:
+        for t in launched:
+            t.cancel()
+
+
+async def fetch_close(ticker: str, start: Optional[pd.Timestamp] = None, deadline: float = None,
+                      period: str = "2y"):
+    """
+    Ряд Close (B-дни, за period или с даты start) и имя источника; (None, "") если
+    никто не ответил валидными данными до дедлайна.
+    """
+    period_days(period)  # неизвестный период — ValueError сразу, а не после дедлайна
+    try:
+        return await asyncio.wait_for(_race(ticker.upper(), start, period), deadline or DEADLINE)
+    except asyncio.TimeoutError:
+        metrics.incr("source_deadline")
+        return None, ""
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    # после fork поток с loop не наследуется — в каждом процессе свой
+    if _bg["pid"] != os.getpid():
+        with _bg_lock:
+            if _bg["pid"] != os.getpid():
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="fetch-loop", daemon=True).start()
+                _bg["loop"], _bg["pid"] = loop, os.getpid()
+    return _bg["loop"]
+
+
+def fetch_close_sync(ticker: str, start: Optional[pd.Timestamp] = None, deadline: float = None,
+                     period: str = "2y"):
+    """fetch_close для синхронного кода: замеры попадают в сборщик вызывающего (metrics.collect)."""
+    loop = _background_loop()
+    fut = concurrent.futures.Future()
+    ctx = contextvars.copy_context()
+
+    def _done(task):
+        if task.cancelled():
+            fut.cancel()
+        elif task.exception() is not None:
+            fut.set_exception(task.exception())
+        else:
+            fut.set_result(task.result())
+
+    def _start():
+        loop.create_task(fetch_close(ticker, start, deadline, period)).add_done_callback(_done)
+
+    loop.call_soon_threadsafe(_start, context=ctx)
+    return fut.result(timeout=(deadline or DEADLINE) + 5.0)
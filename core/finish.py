@@ -0,0 +1,92 @@
+# core/finish.py
+"""
+Дешёвая часть прогноза, зависящая от суммы: сигналы, прибыль, строка журнала.
+Только numpy/pandas поверх готового прогноза (fc из core.selection), без моделей
+и графиков, поэтому её можно считать и в процессе бота: так core.admission отдаёт
+склеенным запросам прогноз лидера, не дожидаясь свободного воркера.
+"""
+import json
+import time
+from datetime import datetime
+from io import BytesIO
+
+import numpy as np
+
+from core import metrics
+from viz.recommender import make_signals_and_profit
+
+
+def finish_job(ticker: str, amount: float, user_id: int, fc: dict) -> dict:
+    """finish_pipeline с замерами в result["timings"]/["counters"], как у run_pipeline."""
+    with metrics.collect() as timings:
+        result = finish_pipeline(ticker, amount, user_id, fc, timings=timings, t0=time.perf_counter())
+    result["timings"] = dict(timings.stages)
+    result["counters"] = dict(timings.counters)
+    return result
+
+
+def finish_pipeline(ticker: str, amount: float, user_id: int, fc: dict,
+                    timings: metrics.Collector = None, t0: float = None) -> dict:
+    """
+    Дешёвая часть, зависящая от суммы: сигналы, прибыль и строка журнала.
+    Строку (result["log_row"]) пишет бот: воркер может считать на другой машине.
+    """
+    y_pred = fc["forecast"]
+    best_name = fc["best_model"]
+    best_rmse, best_mape = fc["rmse"], fc["mape"]
+    horizon = fc["horizon"]
+
+    # изменение цены относительно текущей
+    last_price = fc["last_price"]
+    change_pct = (y_pred[-1] - last_price) / last_price * 100.0
+
+    # рекомендации и условная прибыль
+    with metrics.span("signals"):
+        signals_df, est_profit, pairs = make_signals_and_profit(y_pred, amount, last_price)
+    signals_head = signals_df.head(8).copy()
+    pairs_head = pairs[:4]
+    # прибыль по тем же сигналам на сценариях: квантили посчитаны на одну акцию
+    profit_range, price_range = None, None
+    if fc.get("bands") is not None:
+        price_range = (float(fc["bands"][0][-1]), float(fc["bands"][-1][-1]))
+    if fc.get("profit_q") is not None:
+        p5, _, p95 = np.asarray(fc["profit_q"]) * (amount / last_price)
+        profit_range = (float(p5), float(p95))
+
+    # строка журнала запросов; в logs.db её кладёт бот (core.request_log)
+    log_row = {
+        "user_id": user_id,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "ticker": ticker,
+        "amount": amount,
+        "best_model": best_name,
+        "rmse": round(best_rmse, 6),
+        "mape": round(best_mape, 6),
+        "horizon": horizon,
+        "est_profit": round(float(est_profit), 6),
+        "status": "ok",
+        "error_msg": "",
+        "stage_ms": "",
+    }
+    if timings is not None:
+        if t0 is not None:
+            timings.stages["pipeline"] = time.perf_counter() - t0
+        log_row["stage_ms"] = json.dumps(timings.stage_ms())
+
+    return {
+        "plot_bytes": BytesIO(fc["plot_png"]),
+        "change_pct": float(change_pct),
+        "pairs_head": pairs_head,
+        "best_model": best_name,
+        "rmse": float(best_rmse),
+        "mape": float(best_mape),
+        "est_profit": float(est_profit),
+        "signals_head": signals_head,
+        "price_range": price_range,
+        "profit_range": profit_range,
+        "profit_prob": fc.get("profit_prob"),
+        "skipped": fc.get("skipped", []),
+        "arima_screened": fc.get("arima_screened", 0),
+        "arima_fitted": fc.get("arima_fitted", 0),
+        "log_row": log_row,
+    }
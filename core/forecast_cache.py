@@ -0,0 +1,59 @@
+# core/forecast_cache.py
+"""
+Мемоизация тяжёлой части run_pipeline: выбор модели, метрики, прогноз и PNG.
+Ключ — (тикер, дата последнего бара, конфиг пайплайна), вытеснение по размеру (LRU) и возрасту.
+Кэш живёт в памяти процесса-воркера — это первый уровень; общий для воркеров —
+core.forecast_store, туда core.selection кладёт каждый прогноз, посчитанный вживую.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+MAX_ENTRIES = int(os.getenv("FORECAST_CACHE_SIZE", "256"))
+TTL_SEC = float(os.getenv("FORECAST_CACHE_TTL", str(12 * 3600)))
+
+
+def make_key(ticker: str, last_bar, config: dict) -> tuple:
+    return (ticker.upper(), str(last_bar)[:10], tuple(sorted(config.items())))
+
+
+class ForecastCache:
+    def __init__(self, max_entries: int = MAX_ENTRIES, ttl_sec: float = TTL_SEC):
+        self.max_entries = max_entries
+        self.ttl_sec = ttl_sec
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[dict]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                stored_at, value = item
+                if time.monotonic() - stored_at <= self.ttl_sec:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: dict):
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+CACHE = ForecastCache()
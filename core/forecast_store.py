@@ -0,0 +1,66 @@
+# core/forecast_store.py
+"""
+Дисковое хранилище готовых прогнозов: ночной предрасчёт (core.precompute) и всё,
+что воркеры посчитали вживую, — общее для всех процессов пула и узлов.
+Один .npz на тикер: массивы (прогноз, веер, квантили прибыли, PNG графика) +
+meta (лучшая модель, метрики, последний бар, конфиг пайплайна).
+
+Запись годится, только пока совпадают последний бар ряда и PIPELINE_CONFIG:
+с новым баром или другим конфигом get() вернёт None и прогноз посчитается вживую.
+"""
+import json
+import os
+from datetime import datetime, timezone
+from typing import Optional
+
+import numpy as np
+
+STORE_DIR = os.getenv("FORECAST_STORE_DIR", os.path.join(".cache", "forecasts"))
+
+# поля прогноза (dict из forecast_series), которые лежат массивами; остальные — в meta
+_ARRAYS = ("forecast", "bands", "profit_q")
+_META = ("best_model", "rmse", "mape", "horizon", "last_price", "skipped", "profit_prob",
+         "arima_screened", "arima_fitted")
+
+
+def _path(ticker: str) -> str:
+    return os.path.join(STORE_DIR, f"{ticker.upper()}.npz")
+
+
+def put(ticker: str, last_bar, config: dict, fc: dict):
+    os.makedirs(STORE_DIR, exist_ok=True)
+    meta = {k: fc.get(k) for k in _META}
+    meta.update({
+        "ticker": ticker.upper(),
+        "last_bar": str(last_bar)[:10],
+        "config": config,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        # None в npz не положить — помечаем, каких массивов нет
+        "absent": [k for k in _ARRAYS if fc.get(k) is None],
+    })
+    arrays = {k: np.asarray(fc[k], dtype=np.float64) for k in _ARRAYS if fc.get(k) is not None}
+    png = fc.get("plot_png") or b""
+    path = _path(ticker)
+    tmp = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(tmp, plot_png=np.frombuffer(png, dtype=np.uint8), meta=np.array(json.dumps(meta)), **arrays)
+    os.replace(tmp, path)
+
+
+def get(ticker: str, last_bar, config: dict) -> Optional[dict]:
+    """Прогноз в том же виде, что у forecast_series, или None, если записи нет или она устарела."""
+    path = _path(ticker)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as z:
+            meta = json.loads(str(z["meta"]))
+            if meta["last_bar"] != str(last_bar)[:10] or meta["config"] != config:
+                return None
+            fc = {k: (None if k in meta["absent"] else z[k]) for k in _ARRAYS}
+            fc["plot_png"] = z["plot_png"].tobytes() or None
+    except Exception:
+        return None
+    fc.update({k: meta.get(k) for k in _META})
+    fc["skipped"] = [tuple(x) for x in fc["skipped"] or []]
+    return fc
+
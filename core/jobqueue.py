@@ -0,0 +1,303 @@
+# core/jobqueue.py
+"""
+Долговечная очередь задач в SQLite (WAL) для раздельного режима: бот только принимает
+апдейты и ставит задачи, считают воркеры `python -m core.worker` — сколько угодно
+процессов на этой машине или на других, если файл очереди (JOB_QUEUE_DB) у них общий.
+
+Задача — имя функции "модуль:функция" и pickle аргументов. Воркер берёт задачу в аренду
+на JOB_LEASE_SEC и продлевает её, пока считает; если воркер упал, аренда истекает и
+задачу берёт другой (до JOB_MAX_ATTEMPTS попыток). Ошибка самой задачи (нет такого
+тикера и т.п.) не повторяется — она уходит боту как исключение. Результат лежит в той
+же таблице, бот забирает его опросом и удаляет строку.
+
+QueueExecutor — то же, что core.executor.PipelineExecutor (submit/run/пул задач),
+поэтому Admission и хэндлеры не знают, где идёт расчёт. Другой брокер подключается
+классом с методами JobQueue.
+"""
+import asyncio
+import itertools
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from core import metrics
+from core.executor import JobHandle, QueueFull
+
+QUEUE_DB = os.getenv("JOB_QUEUE_DB", os.path.join(".cache", "jobs.db"))
+LEASE_SEC = float(os.getenv("JOB_LEASE_SEC", "30"))
+MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+POLL_SEC = float(os.getenv("JOB_POLL_SEC", "0.05"))
+RESULT_TTL = 3600  # результаты, которые никто не забрал (бот перезапускался), живут час
+
+PIPELINE = "core.selection:run_pipeline"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id           INTEGER PRIMARY KEY,
+    fn           TEXT NOT NULL,
+    payload      BLOB NOT NULL,
+    status       TEXT NOT NULL DEFAULT 'queued',
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    worker       TEXT,
+    lease_until  REAL,
+    result       BLOB,
+    error        TEXT,
+    created      REAL NOT NULL,
+    started      REAL,
+    finished     REAL
+);
+CREATE INDEX IF NOT EXISTS ix_jobs_status ON jobs (status, id);
+"""
+
+
+class JobQueue:
+    """status: queued → running → done | failed; cancelled — отменена до старта."""
+
+    def __init__(self, path: str = None):
+        self.path = path or QUEUE_DB
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def put(self, fn: str, args: tuple = (), kwargs: dict = None) -> int:
+        payload = pickle.dumps((args, kwargs or {}), protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            cur = self._conn.execute("INSERT INTO jobs (fn, payload, created) VALUES (?, ?, ?)",
+                                     (fn, payload, time.time()))
+        return cur.lastrowid
+
+    def claim(self, worker: str, lease: float = None):
+        """(id, fn, args, kwargs, attempts) следующей задачи или None. Просроченная аренда — снова в работу."""
+        now = time.time()
+        lease = lease or LEASE_SEC
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # кто уже уронил воркер MAX_ATTEMPTS раз, больше не пробуем
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'failed', finished = ?, error = ? "
+                    "WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+                    (now, f"воркер не досчитал задачу за {MAX_ATTEMPTS} попыток", now, MAX_ATTEMPTS),
+                )
+                row = self._conn.execute(
+                    "SELECT id, fn, payload, attempts FROM jobs "
+                    "WHERE status = 'queued' OR (status = 'running' AND lease_until < ?) ORDER BY id LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, "
+                        "lease_until = ?, started = ? WHERE id = ?",
+                        (worker, now + lease, now, row[0]),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        args, kwargs = pickle.loads(row[2])
+        return row[0], row[1], args, kwargs, row[3] + 1
+
+    def heartbeat(self, job_id: int, worker: str, lease: float = None) -> bool:
+        """Продлить аренду. False — задачу уже забрал другой воркер."""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time() + (lease or LEASE_SEC), job_id, worker),
+            )
+        return cur.rowcount == 1
+
+    def finish(self, job_id: int, worker: str, result) -> bool:
+        return self._close(job_id, worker, "done", pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL), None)
+
+    def fail(self, job_id: int, worker: str, exc: BaseException) -> bool:
+        try:
+            blob = pickle.dumps(exc, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            blob = None
+        return self._close(job_id, worker, "failed", blob, f"{type(exc).__name__}: {exc}")
+
+    def _close(self, job_id, worker, status, blob, error) -> bool:
+        # аренду могли перехватить — тогда результат запишет новый владелец
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished = ?, lease_until = NULL "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (status, blob, error, time.time(), job_id, worker),
+            )
+        return cur.rowcount == 1
+
+    def cancel(self, job_id: int) -> bool:
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id),
+            )
+        return cur.rowcount == 1
+
+    def collect(self, ids) -> list:
+        """Забрать готовые задачи из ids: [(id, status, result_blob, error, created, started, finished)]."""
+        ids = list(ids)
+        out = []
+        with self._lock:
+            for i in range(0, len(ids), 500):  # лимит параметров SQLite
+                part = ids[i:i + 500]
+                marks = ", ".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT id, status, result, error, created, started, finished FROM jobs "
+                    f"WHERE id IN ({marks}) AND status IN ('done', 'failed', 'cancelled')",
+                    part,
+                ).fetchall()
+                if rows:
+                    self._conn.execute(f"DELETE FROM jobs WHERE id IN ({', '.join('?' * len(rows))})",
+                                       [r[0] for r in rows])
+                out.extend(rows)
+        return out
+
+    def purge(self, ttl: float = RESULT_TTL) -> int:
+        with self._lock:
+            cur = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed', 'cancelled') AND finished < ?",
+                (time.time() - ttl,),
+            )
+        return cur.rowcount
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+
+def _error(blob, error: str) -> BaseException:
+    if blob is not None:
+        try:
+            return pickle.loads(blob)
+        except Exception:
+            pass
+    return RuntimeError(error or "задача не выполнена")
+
+
+class QueueExecutor:
+    """
+    Исполнитель поверх JobQueue с интерфейсом PipelineExecutor.
+    WORKERS — сколько прогнозов бот держит в работе у всех воркеров разом,
+    JOB_QUEUE_SIZE — сколько может ждать сверх этого.
+    """
+
+    def __init__(self, path: str = None, workers: int = None, max_queue: int = None):
+        self.path = path or QUEUE_DB
+        self.workers = workers or int(os.getenv("WORKERS", "0")) or os.cpu_count() or 1
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv("JOB_QUEUE_SIZE", "32"))
+        self.queue = None
+        self._waiting = {}  # id в очереди -> футура
+        self._pending = 0
+        self._ids = itertools.count(1)
+        self._poller = None
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    @property
+    def ready(self) -> bool:
+        return self.queue is not None  # воркеры греются сами, у себя
+
+    async def wait_ready(self):
+        pass
+
+    async def start(self):
+        self.queue = await asyncio.to_thread(JobQueue, self.path)
+        await asyncio.to_thread(self.queue.purge)
+        self._poller = asyncio.create_task(self._poll())
+
+    def submit(self, **kwargs) -> JobHandle:
+        if self.queue is None:
+            raise RuntimeError("QueueExecutor не запущен")
+        if self._pending >= self.workers + self.max_queue:
+            raise QueueFull("Слишком много запросов, попробуй через минуту")
+        fut = self._enqueue(PIPELINE, (), kwargs)
+        self._pending += 1
+        fut.add_done_callback(self._job_done)
+        return JobHandle(next(self._ids), fut)
+
+    def run(self, fn, *args) -> asyncio.Future:
+        """Служебная задача (префетч и т.п.) — тоже воркерам, мимо лимита очереди прогнозов."""
+        if self.queue is None:
+            raise RuntimeError("QueueExecutor не запущен")
+        return self._enqueue(f"{fn.__module__}:{fn.__qualname__}", args, {})
+
+    def _enqueue(self, fn: str, args: tuple, kwargs: dict) -> asyncio.Future:
+        fut = asyncio.get_running_loop().create_future()
+
+        async def put():
+            try:
+                job_id = await asyncio.to_thread(self.queue.put, fn, args, kwargs)
+            except Exception as e:
+                if not fut.done():
+                    fut.set_exception(e)
+                return
+            if fut.cancelled():
+                await asyncio.to_thread(self.queue.cancel, job_id)
+                return
+            self._waiting[job_id] = fut
+            fut.add_done_callback(lambda f: self._cancelled(job_id, f))
+
+        asyncio.get_running_loop().create_task(put())
+        return fut
+
+    def _cancelled(self, job_id: int, fut):
+        # как и в пуле процессов, отменить можно только ещё не взятую задачу
+        if fut.cancelled() and self._waiting.pop(job_id, None) is not None and self.queue is not None:
+            asyncio.get_running_loop().create_task(asyncio.to_thread(self.queue.cancel, job_id))
+
+    def _job_done(self, _fut):
+        self._pending -= 1
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(POLL_SEC)
+            if not self._waiting:
+                continue
+            try:
+                rows = await asyncio.to_thread(self.queue.collect, list(self._waiting))
+            except sqlite3.Error:
+                metrics.incr("job_queue_error")
+                continue
+            for job_id, status, blob, error, created, started, finished in rows:
+                fut = self._waiting.pop(job_id, None)
+                if fut is None or fut.done():
+                    continue
+                if started is not None:
+                    metrics.observe("job_queue_wait", max(0.0, started - created))
+                if status == "done":
+                    try:
+                        fut.set_result(pickle.loads(blob))
+                    except Exception as e:  # воркер другой версии и т.п.
+                        fut.set_exception(e)
+                elif status == "cancelled":
+                    fut.cancel()
+                else:
+                    metrics.incr("job_failed")
+                    fut.set_exception(_error(blob, error))
+
+    async def shutdown(self):
+        if self._poller is not None:
+            self._poller.cancel()
+            self._poller = None
+        for fut in self._waiting.values():
+            fut.cancel()
+        self._waiting.clear()
+        if self.queue is not None:
+            queue, self.queue = self.queue, None
+            await asyncio.to_thread(queue.close)
@@ -0,0 +1,173 @@
+# core/metrics.py
+"""
+Лёгкие тайминги стадий и счётчики событий.
+
+span("стадия") меряет блок кода. Внутри collect() замеры копятся в сборщике запроса
+(он уезжает из воркера вместе с результатом), иначе сразу идут в REGISTRY процесса.
+REGISTRY держит последние замеры каждой стадии для p50/p95/p99 и отдаёт их
+текстом для /stats и в формате Prometheus.
+"""
+import contextvars
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_current = contextvars.ContextVar("metrics_collector", default=None)
+
+WINDOW = int(os.getenv("METRICS_WINDOW", "2048"))  # сколько последних замеров держим на стадию
+
+
+class Collector:
+    """Замеры одного запроса: суммарные секунды по стадиям и счётчики."""
+
+    def __init__(self):
+        self.stages = defaultdict(float)
+        self.counters = defaultdict(int)
+
+    def stage_ms(self) -> dict:
+        return {k: round(v * 1000.0, 1) for k, v in self.stages.items()}
+
+
+@contextmanager
+def collect():
+    parent = _current.get()
+    c = Collector()
+    token = _current.set(c)
+    try:
+        yield c
+    finally:
+        _current.reset(token)
+        # вложенный сбор не теряется: отдаём его внешнему сборщику
+        if parent is not None:
+            for k, v in c.stages.items():
+                parent.stages[k] += v
+            for k, v in c.counters.items():
+                parent.counters[k] += v
+
+
+def observe(stage: str, seconds: float):
+    c = _current.get()
+    if c is not None:
+        c.stages[stage] += seconds
+    else:
+        REGISTRY.observe(stage, seconds)
+
+
+def incr(event: str, n: int = 1):
+    c = _current.get()
+    if c is not None:
+        c.counters[event] += n
+    else:
+        REGISTRY.incr(event, n)
+
+
+@contextmanager
+def span(stage: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - t0)
+
+
+def _quantile(sorted_vals, q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    i = min(len(sorted_vals) - 1, max(0, int(round(q * (len(sorted_vals) - 1)))))
+    return sorted_vals[i]
+
+
+class Registry:
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self, window: int = WINDOW):
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._count = defaultdict(int)
+        self._sum = defaultdict(float)
+        self._counters = defaultdict(int)
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            self._samples[stage].append(seconds)
+            self._count[stage] += 1
+            self._sum[stage] += seconds
+
+    def incr(self, event: str, n: int = 1):
+        with self._lock:
+            self._counters[event] += n
+
+    def merge(self, stages: dict, counters: dict = None):
+        """Замеры, приехавшие из воркера вместе с результатом."""
+        for k, v in (stages or {}).items():
+            self.observe(k, v)
+        for k, v in (counters or {}).items():
+            self.incr(k, v)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stages = {}
+            for name, vals in self._samples.items():
+                vals = sorted(vals)
+                stages[name] = {
+                    "count": self._count[name],
+                    "sum": self._sum[name],
+                    **{f"p{int(q * 100)}": _quantile(vals, q) for q in self.QUANTILES},
+                }
+            return {"stages": stages, "counters": dict(self._counters)}
+
+    def render_text(self) -> str:
+        snap = self.snapshot()
+        lines = ["Стадия: p50 / p95 / p99, мс (n)"]
+        for name, st in sorted(snap["stages"].items()):
+            lines.append(
+                f"{name}: {st['p50'] * 1e3:.0f} / {st['p95'] * 1e3:.0f} / {st['p99'] * 1e3:.0f} ({st['count']})"
+            )
+        if snap["counters"]:
+            lines.append("")
+            lines.append("Счётчики:")
+            for name, n in sorted(snap["counters"].items()):
+                lines.append(f"{name}: {n}")
+        return "\n".join(lines)
+
+    def render_prometheus(self) -> str:
+        snap = self.snapshot()
+        out = ["# TYPE bot_stage_seconds summary"]
+        for name, st in sorted(snap["stages"].items()):
+            for q in self.QUANTILES:
+                out.append(f'bot_stage_seconds{{stage="{name}",quantile="{q}"}} {st[f"p{int(q * 100)}"]:.6f}')
+            out.append(f'bot_stage_seconds_sum{{stage="{name}"}} {st["sum"]:.6f}')
+            out.append(f'bot_stage_seconds_count{{stage="{name}"}} {st["count"]}')
+        out.append("# TYPE bot_events_total counter")
+        for name, n in sorted(snap["counters"].items()):
+            out.append(f'bot_events_total{{event="{name}"}} {n}')
+        return "\n".join(out) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_http_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """GET /metrics в формате Prometheus, в фоновом потоке."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
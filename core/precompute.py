@@ -0,0 +1,133 @@
+# core/precompute.py
+"""
+Ночной предрасчёт прогнозов для горячих тикеров.
+
+    python -m core.precompute [TICKER ...] [--top 10] [--budget 1800] [--jobs 0] [--json]
+
+Без списка берёт PRECOMPUTE_TOP самых запрашиваемых тикеров (core.prefetch.popular_tickers).
+Для каждого — выбор модели, прогноз, веер, график; результат ложится в core.forecast_store,
+и /predict по этому тикеру до следующего бара отвечает из хранилища без обучения.
+Тикеры считаются параллельно на всех ядрах, самые популярные — первыми. По истечении
+--budget секунд недосчитанные снимаются (пул процессов убивается), готовое остаётся.
+При EXECUTOR=queue бот не запускает этот модуль у себя, а ставит в очередь задачи
+precompute_ticker — по одной на тикер, их разбирают воркеры core.worker.
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import queue
+import sys
+import time
+
+from dotenv import load_dotenv
+
+# константы ниже читаются при импорте — и в `python -m core.precompute`, и в боте, куда модуль
+# попадает через core.prefetch раньше load_dotenv() в bot.main; уже заданные переменные .env не трогает
+load_dotenv()
+
+PRECOMPUTE_TOP = int(os.getenv("PRECOMPUTE_TOP", "10"))  # 0 — предрасчёт выключен
+PRECOMPUTE_BUDGET = float(os.getenv("PRECOMPUTE_BUDGET", "1800"))  # сек на весь прогон
+
+
+def _precompute_one(ticker: str, s) -> float:
+    from core import forecast_store
+    from core.selection import PIPELINE_CONFIG, forecast_series
+
+    t0 = time.perf_counter()
+    fc = forecast_series(ticker, s, save=False)
+    forecast_store.put(ticker, s.index[-1], PIPELINE_CONFIG, fc)
+    return time.perf_counter() - t0
+
+
+def precompute_ticker(ticker: str) -> dict:
+    """Задача очереди: один тикер на воркере; {"status": "stored" | "fresh", "sec": ...}."""
+    from core import forecast_store
+    from core.data_loader import load_close_series
+    from core.selection import PIPELINE_CONFIG
+
+    s = load_close_series(ticker)
+    if forecast_store.get(ticker, s.index[-1], PIPELINE_CONFIG) is not None:
+        return {"status": "fresh", "sec": 0.0}
+    return {"status": "stored", "sec": _precompute_one(ticker, s)}
+
+
+def run_precompute(tickers: list, budget: float = None, jobs: int = None) -> dict:
+    from core import forecast_store
+    from core.batch import _init_worker
+    from core.data_loader import load_close_many
+    from core.selection import PIPELINE_CONFIG
+
+    t_start = time.perf_counter()
+    deadline = t_start + (PRECOMPUTE_BUDGET if budget is None else budget)
+    jobs = jobs or os.cpu_count() or 1
+
+    series = load_close_many(tickers)
+    rep = {"tickers": len(tickers), "stored": [], "fresh": [], "failed": {}, "timed_out": [],
+           "model_sec": 0.0}
+    todo = []
+    for t in dict.fromkeys(x.upper() for x in tickers):
+        if t not in series:
+            rep["failed"][t] = "нет котировок"
+        elif forecast_store.get(t, series[t].index[-1], PIPELINE_CONFIG) is not None:
+            rep["fresh"].append(t)  # уже посчитан по этому бару
+        else:
+            todo.append(t)
+
+    if todo:
+        done = queue.Queue()
+        # Pool, а не ProcessPoolExecutor: по бюджету его можно честно убить (terminate)
+        pool = mp.get_context().Pool(min(jobs, len(todo)), initializer=_init_worker)
+        try:
+            for t in todo:
+                pool.apply_async(_precompute_one, (t, series[t]),
+                                 callback=lambda sec, t=t: done.put((t, sec, None)),
+                                 error_callback=lambda e, t=t: done.put((t, None, e)))
+            left = set(todo)
+            while left:
+                try:
+                    t, sec, err = done.get(timeout=max(0.0, deadline - time.perf_counter()))
+                except queue.Empty:
+                    break
+                left.discard(t)
+                if err is None:
+                    rep["stored"].append(t)
+                    rep["model_sec"] += sec
+                else:
+                    rep["failed"][t] = f"{type(err).__name__}: {err}"
+            rep["timed_out"] = [t for t in todo if t in left]
+        finally:
+            pool.terminate()
+            pool.join()
+
+    rep["wall"] = time.perf_counter() - t_start
+    return rep
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Ночной предрасчёт прогнозов")
+    ap.add_argument("tickers", nargs="*", help="тикеры; по умолчанию — самые запрашиваемые")
+    ap.add_argument("--top", type=int, default=PRECOMPUTE_TOP)
+    ap.add_argument("--budget", type=float, default=PRECOMPUTE_BUDGET, help="сек на весь прогон")
+    ap.add_argument("--jobs", type=int, default=0, help="процессов (0 — по числу ядер)")
+    ap.add_argument("--json", action="store_true", help="отчёт одной JSON-строкой")
+    args = ap.parse_args(argv)
+
+    from core.prefetch import popular_tickers
+    tickers = [t.upper() for t in args.tickers] or popular_tickers(top=args.top)
+    if not tickers:
+        print("нет тикеров для предрасчёта", file=sys.stderr)
+        return
+
+    rep = run_precompute(tickers, budget=args.budget, jobs=args.jobs or None)
+    if args.json:
+        print(json.dumps(rep, ensure_ascii=False))
+        return
+    print(f"Готово за {rep['wall']:.1f} с: посчитано {len(rep['stored'])}, уже свежие {len(rep['fresh'])}, "
+          f"не успели {len(rep['timed_out'])}, ошибки {len(rep['failed'])}")
+    for t, msg in rep["failed"].items():
+        print(f"  {t}: {msg}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# core/prefetch.py
+"""
+Ночной префетч котировок. После закрытия биржи берём самые запрашиваемые тикеры
+из журнала (core.request_log) плюс WATCHLIST и качаем их пакетами через
+load_close_many — несколько multi-ticker запросов вместо N одиночных. Первый
+/predict следующего дня по этим тикерам попадает в тёплый price_cache.
+
+Следом запускается ночной предрасчёт прогнозов (core.precompute) под бюджетом
+PRECOMPUTE_BUDGET: в локальном режиме — отдельным процессом на всех ядрах машины бота,
+при EXECUTOR=queue — задачами в очереди, по одной на тикер, на воркерах.
+
+Модуль лёгкий: бот импортирует его при старте, сама загрузка идёт в воркере пула.
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from datetime import time as dtime
+from zoneinfo import ZoneInfo
+
+from core import metrics, precompute, request_log
+from core.jobqueue import QueueExecutor
+
+PREFETCH_TOP = int(os.getenv("PREFETCH_TOP", "20"))  # 0 — только WATCHLIST
+PREFETCH_DAYS = int(os.getenv("PREFETCH_DAYS", "30"))  # за сколько дней считать популярность
+PREFETCH_AT = os.getenv("PREFETCH_AT", "17:00")  # время биржи; после закрытия + PRICE_CLOSE_DELAY_MIN
+PREFETCH_CHUNK = int(os.getenv("PREFETCH_CHUNK", "50"))  # тикеров в одном запросе
+MARKET_TZ = "America/New_York"  # как в core.price_cache
+WATCHLIST = [t.strip().upper() for t in os.getenv("WATCHLIST", "").split(",") if t.strip()]
+
+log = logging.getLogger(__name__)
+
+
+def popular_tickers(top: int = None, days: int = None) -> list:
+    """Топ тикеров из журнала запросов и WATCHLIST, без повторов, популярные первыми."""
+    top = PREFETCH_TOP if top is None else top
+    rows = request_log.LOG.ticker_popularity(days=PREFETCH_DAYS if days is None else days, limit=top) if top else []
+    return list(dict.fromkeys([r["ticker"].upper() for r in rows] + WATCHLIST))
+
+
+def prefetch(tickers: list, chunk: int = None) -> dict:
+    """Выполняется в воркере: пакетная загрузка в price_cache, сводка для метрик."""
+    from core.data_loader import load_close_many
+    t0 = time.perf_counter()
+    with metrics.collect() as timings:
+        with metrics.span("prefetch"):
+            loaded = load_close_many(tickers, chunk=chunk or PREFETCH_CHUNK)
+    return {
+        "tickers": len(tickers),
+        "loaded": len(loaded),
+        "failed": [t for t in tickers if t.upper() not in loaded],
+        "seconds": time.perf_counter() - t0,
+        "timings": dict(timings.stages),
+        "counters": dict(timings.counters),
+    }
+
+
+async def prefetch_job(context):
+    """Колбэк JobQueue: список тикеров — в потоке (SQLite), загрузка — в пуле воркеров."""
+    executor = context.bot_data.get("executor")
+    if executor is None:
+        return
+    tickers = await asyncio.to_thread(popular_tickers)
+    if not tickers:
+        return
+    try:
+        res = await executor.run(prefetch, tickers)
+    except Exception:
+        metrics.incr("prefetch_error")
+        log.exception("префетч котировок не удался")
+        return
+    metrics.REGISTRY.merge(res["timings"], {**res["counters"], "prefetch_tickers": res["loaded"],
+                                            "prefetch_failed": len(res["failed"])})
+    log.info("префетч: %d из %d тикеров за %.1f с, без данных: %s",
+             res["loaded"], res["tickers"], res["seconds"], ", ".join(res["failed"]) or "-")
+    if precompute.PRECOMPUTE_TOP > 0:
+        await precompute_job(executor)
+
+
+async def _precompute_queued(executor: QueueExecutor) -> dict:
+    """По задаче на тикер в очередь; не взятые воркерами к концу бюджета снимаются."""
+    t0 = time.perf_counter()
+    tickers = await asyncio.to_thread(popular_tickers, precompute.PRECOMPUTE_TOP)
+    rep = {"tickers": len(tickers), "stored": [], "fresh": [], "failed": {}, "timed_out": [], "model_sec": 0.0}
+    futs = {executor.run(precompute.precompute_ticker, t): t for t in tickers}
+    done, left = await asyncio.wait(futs, timeout=precompute.PRECOMPUTE_BUDGET) if futs else (set(), set())
+    for fut in left:
+        fut.cancel()  # уже взятую воркер досчитает и положит в хранилище, её просто не ждём
+    for fut in done:
+        t = futs[fut]
+        if fut.exception() is not None:
+            rep["failed"][t] = f"{type(fut.exception()).__name__}: {fut.exception()}"
+        else:
+            res = fut.result()
+            rep[res["status"]].append(t)
+            rep["model_sec"] += res["sec"]
+    rep["timed_out"] = [futs[f] for f in left]
+    rep["wall"] = time.perf_counter() - t0
+    return rep
+
+
+async def _precompute_local() -> dict:
+    """Предрасчёт в чистом интерпретаторе: свой пул на все ядра, который можно убить по бюджету."""
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "core.precompute", "--json",
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL,
+    )
+    try:
+        # запас сверх бюджета — на загрузку котировок и запись отчёта
+        out, _ = await asyncio.wait_for(proc.communicate(), precompute.PRECOMPUTE_BUDGET + 120)
+        return json.loads(out.decode().strip().splitlines()[-1])
+    except BaseException:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+
+
+async def precompute_job(executor=None):
+    """Локально — подпроцесс на машине бота; при EXECUTOR=queue — задачи воркерам."""
+    try:
+        if isinstance(executor, QueueExecutor):
+            rep = await _precompute_queued(executor)
+        else:
+            rep = await _precompute_local()
+    except Exception:
+        metrics.incr("precompute_error")
+        log.exception("предрасчёт прогнозов не удался")
+        return
+    metrics.observe("precompute", rep["wall"])
+    metrics.incr("precompute_stored", len(rep["stored"]))
+    if rep["timed_out"]:
+        metrics.incr("precompute_timed_out", len(rep["timed_out"]))
+    log.info("предрасчёт: %d посчитано, %d уже свежие, %d не успели, %d ошибок за %.0f с",
+             len(rep["stored"]), len(rep["fresh"]), len(rep["timed_out"]), len(rep["failed"]), rep["wall"])
+
+
+def schedule(job_queue):
+    """Каждый будний день в PREFETCH_AT по времени биржи. Без JobQueue (нет APScheduler) — пропускаем."""
+    if job_queue is None:
+        log.warning("JobQueue недоступна (pip install 'python-telegram-bot[job-queue]'), префетч выключен")
+        return None
+    hh, mm = (int(x) for x in PREFETCH_AT.split(":"))
+    # в PTB дни недели считаются с воскресенья: 1..5 — пн..пт
+    return job_queue.run_daily(prefetch_job, time=dtime(hh, mm, tzinfo=ZoneInfo(MARKET_TZ)),
+                               days=(1, 2, 3, 4, 5), name="prefetch")
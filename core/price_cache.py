@@ -0,0 +1,161 @@
+# core/price_cache.py
+"""
+Дисковый кэш очищенных рядов Close (B-дни), один .npz на тикер:
+колонки dates/close + meta (последний бар, когда проверяли, источник).
+Прочитанные и записанные ряды публикуются в core.shm_store — дальше все процессы
+читают их оттуда без копии, а .npz остаётся источником после перезагрузки машины.
+"""
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime, time as dtime, timezone
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from core import shm_store
+
+CACHE_DIR = os.getenv("PRICE_CACHE_DIR", os.path.join(".cache", "prices"))
+MARKET_TZ = "America/New_York"
+MARKET_CLOSE = dtime(16, 0)
+# биржевые данные появляются у источников не сразу после закрытия
+CLOSE_DELAY_MIN = int(os.getenv("PRICE_CLOSE_DELAY_MIN", "30"))
+HISTORY_DAYS = 730
+
+_batch = threading.local()
+
+
+def _path(ticker: str) -> str:
+    return os.path.join(CACHE_DIR, f"{ticker.upper()}.npz")
+
+
+def last_session_close(now: Optional[pd.Timestamp] = None) -> pd.Timestamp:
+    """Момент (UTC) последнего закрытия торговой сессии, после которого данные уже доступны."""
+    now = pd.Timestamp.now(tz="UTC") if now is None else pd.Timestamp(now).tz_convert("UTC")
+    local = now.tz_convert(MARKET_TZ)
+    day = local.normalize()
+    while True:
+        close = day + pd.Timedelta(hours=MARKET_CLOSE.hour, minutes=MARKET_CLOSE.minute + CLOSE_DELAY_MIN)
+        if day.weekday() < 5 and close <= local:
+            return close.tz_convert("UTC")
+        day -= pd.Timedelta(days=1)
+
+
+def read(ticker: str) -> Optional[Tuple[pd.Series, dict]]:
+    """(ряд, meta) или None. Ряд может быть представлением общей памяти — только для чтения."""
+    shared = shm_store.get(ticker)
+    if shared is not None:
+        return shared
+    path = _path(ticker)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as z:
+            dates = z["dates"]
+            close = z["close"]
+            meta = json.loads(str(z["meta"]))
+    except Exception:
+        return None
+    if len(dates) == 0:
+        return None
+    idx = pd.DatetimeIndex(dates.astype("datetime64[ns]"), freq="B")
+    s = pd.Series(close, index=idx, name="Close")
+    _publish(ticker, s, meta)
+    return s, meta
+
+
+def write(ticker: str, s: pd.Series, source: str = "", days: Optional[int] = HISTORY_DAYS):
+    """days — за сколько дней запрашивали историю (None — вся): по нему судим, хватит ли кэша."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    meta = {
+        "ticker": ticker.upper(),
+        "last_bar": s.index[-1].strftime("%Y-%m-%d"),
+        "checked_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "source": source,
+        "history_days": days,
+    }
+    path = _path(ticker)
+    tmp = path + ".tmp.npz"
+    np.savez(
+        tmp,
+        dates=s.index.values.astype("datetime64[ns]").astype(np.int64),
+        close=s.values.astype(np.float64),
+        meta=np.array(json.dumps(meta)),
+    )
+    os.replace(tmp, path)
+    _publish(ticker, s, meta)
+
+
+def _publish(ticker: str, s: pd.Series, meta: dict):
+    pending = getattr(_batch, "pending", None)
+    if pending is not None:
+        pending[ticker.upper()] = (ticker, s, meta)
+        return
+    try:
+        shm_store.put(ticker, s, meta)
+    except OSError:
+        pass  # нет места в /dev/shm и т.п. — остаёмся на .npz
+
+
+@contextmanager
+def batch_publish():
+    """
+    Публикации в shm_store внутри блока (read с диска, write) уходят одной пачкой
+    на выходе: индекс общего хранилища переписывается один раз, а не на каждый тикер.
+    """
+    if getattr(_batch, "pending", None) is not None:
+        yield  # вложенный блок — публикует внешний
+        return
+    _batch.pending = {}
+    try:
+        yield
+    finally:
+        pending, _batch.pending = _batch.pending, None
+        try:
+            shm_store.put_many(pending.values())
+        except OSError:
+            pass
+
+
+def is_fresh(meta: dict, now: Optional[pd.Timestamp] = None) -> bool:
+    """Свежий, если проверяли уже после последнего закрытия (в том числе в праздник)."""
+    try:
+        checked = pd.Timestamp(meta["checked_at"])
+    except Exception:
+        return False
+    return checked >= last_session_close(now)
+
+
+def covers(meta: dict, days: Optional[int]) -> bool:
+    """Хватит ли закэшированной истории на запрос за days дней (None — вся история)."""
+    have = meta.get("history_days", HISTORY_DAYS)
+    if have is None:
+        return True
+    return days is not None and have >= days
+
+
+def trim(s: pd.Series, days: Optional[int]) -> pd.Series:
+    """Последние days дней ряда — срез без копии."""
+    if days is None:
+        return s
+    return s.loc[s.index >= s.index.max() - pd.Timedelta(days=days)]
+
+
+def merge(cached: pd.Series, new: pd.Series, days: Optional[int] = HISTORY_DAYS) -> Optional[pd.Series]:
+    """
+    Доклеиваем новые бары к кэшу. Новые значения перекрывают старые на общих датах
+    (последний бар мог быть внутридневным). Если на стыке цены не сходятся —
+    был сплит/дивиденд и adjusted-история пересчитана, тогда вернём None: нужна полная загрузка.
+    """
+    new = new.sort_index()
+    overlap = cached.index.intersection(new.index)
+    if len(overlap):
+        first = overlap[0]
+        if abs(new[first] - cached[first]) > 1e-3 * abs(cached[first]):
+            return None
+    elif new.index[0] - cached.index[-1] > pd.Timedelta(days=7):
+        return None
+    s = new.combine_first(cached).asfreq("B").ffill()
+    return trim(s, days).rename("Close")
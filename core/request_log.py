@@ -0,0 +1,246 @@
+# core/request_log.py
+"""
+Журнал запросов в SQLite (WAL) с фоновой записью.
+
+log() только кладёт строку в очередь и никогда не ждёт диск: отдельный поток
+пишет пачками (каждые FLUSH_ROWS строк или FLUSH_SEC секунд). Успешные прогнозы
+и ошибки живут в одной таблице с одной схемой, включая тайминги стадий (stage_ms, JSON).
+Старый logs.csv импортируется один раз, при первом обращении к пустой базе —
+чтении или записи. Чтения идут через одно соединение на поток.
+"""
+import csv
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from multiprocessing import util as mp_util
+
+from core import metrics
+
+DB_PATH = os.getenv("REQUEST_LOG_DB", "logs.db")
+LEGACY_CSV = "logs.csv"
+FLUSH_ROWS = 100
+FLUSH_SEC = 1.0
+QUEUE_MAX = 10000
+
+FIELDS = [
+    "user_id", "timestamp", "ticker", "amount", "best_model", "rmse", "mape",
+    "horizon", "est_profit", "status", "error_msg", "stage_ms",
+]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS requests (
+    id          INTEGER PRIMARY KEY,
+    user_id     INTEGER,
+    timestamp   TEXT NOT NULL,
+    ticker      TEXT,
+    amount      REAL,
+    best_model  TEXT,
+    rmse        REAL,
+    mape        REAL,
+    horizon     INTEGER,
+    est_profit  REAL,
+    status      TEXT NOT NULL,
+    error_msg   TEXT,
+    stage_ms    TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_requests_user ON requests (user_id, timestamp);
+CREATE INDEX IF NOT EXISTS ix_requests_ticker ON requests (ticker, timestamp);
+CREATE INDEX IF NOT EXISTS ix_requests_time ON requests (timestamp);
+"""
+
+_INSERT = "INSERT INTO requests ({}) VALUES ({})".format(", ".join(FIELDS), ", ".join("?" * len(FIELDS)))
+
+
+def _num(v):
+    if v in ("", None):
+        return None
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_record(row: dict) -> tuple:
+    stage_ms = row.get("stage_ms") or None
+    if isinstance(stage_ms, dict):
+        stage_ms = json.dumps(stage_ms)
+    return (
+        int(_num(row.get("user_id")) or 0),
+        row.get("timestamp") or datetime.now().isoformat(timespec="seconds"),
+        row.get("ticker") or "",
+        _num(row.get("amount")),
+        row.get("best_model") or None,
+        _num(row.get("rmse")),
+        _num(row.get("mape")),
+        _num(row.get("horizon")),
+        _num(row.get("est_profit")),
+        row.get("status") or "ok",
+        (row.get("error_msg") or "")[:500] or None,
+        stage_ms,
+    )
+
+
+def connect(path: str = None) -> sqlite3.Connection:
+    conn = sqlite3.connect(path or DB_PATH, timeout=10.0)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _import_legacy_csv(conn: sqlite3.Connection, csv_path: str):
+    if not os.path.exists(csv_path):
+        return
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        rows = [_to_record(r) for r in csv.DictReader(f) if r.get("timestamp")]
+    # проверка и вставка под одной блокировкой: база общая у бота и воркеров
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if not conn.execute("SELECT 1 FROM requests LIMIT 1").fetchone():
+            conn.executemany(_INSERT, rows)
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+class RequestLog:
+    def __init__(self, path: str = None):
+        self.path = path
+        self._pid = None
+        self._db_key = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _ensure_db(self):
+        # схема и импорт logs.csv — раз на процесс, до первого чтения или записи
+        key = (os.getpid(), self.path or DB_PATH)
+        if self._db_key == key:
+            return
+        with self._lock:
+            if self._db_key == key:
+                return
+            conn = connect(key[1])
+            try:
+                _import_legacy_csv(conn, LEGACY_CSV)
+            finally:
+                conn.close()
+            self._db_key = key
+
+    def _ensure_writer(self):
+        # после fork поток писателя не наследуется — поднимаем свой в каждом процессе
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=QUEUE_MAX)
+            self._thread = threading.Thread(target=self._run, name="request-log", daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+            # срабатывает и при обычном выходе, и в дочерних процессах multiprocessing
+            mp_util.Finalize(self, self.flush, exitpriority=10)
+
+    def log(self, row: dict):
+        """Не блокирует: при переполненной очереди строка теряется (и считается в метриках)."""
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(_to_record(row))
+        except queue.Full:
+            metrics.incr("request_log_dropped")
+
+    def flush(self, timeout: float = 5.0):
+        """Дождаться записи всего, что уже в очереди (для выхода и тестов)."""
+        if self._pid != os.getpid():
+            return
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return
+        done.wait(timeout)
+
+    def _run(self):
+        self._ensure_db()
+        conn = connect(self.path)
+        while True:
+            batch, events = [], []
+            item = self._queue.get()
+            deadline = time.monotonic() + FLUSH_SEC
+            while True:
+                if isinstance(item, threading.Event):
+                    # flush: всё, что пришло раньше, уже в пачке — пишем сразу
+                    events.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= FLUSH_ROWS:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    with conn:
+                        conn.executemany(_INSERT, batch)
+                except sqlite3.Error:
+                    metrics.incr("request_log_write_error")
+            for ev in events:
+                ev.set()
+
+    # запросы
+
+    def _read(self, sql: str, args=()) -> list:
+        self._ensure_db()
+        local = self._local
+        key = (os.getpid(), self.path or DB_PATH)
+        if getattr(local, "key", None) != key:
+            # соединение живёт, пока жив поток (пул to_thread), после fork открываем своё
+            local.conn = sqlite3.connect(key[1], timeout=10.0)
+            local.conn.row_factory = sqlite3.Row
+            local.key = key
+        return [dict(r) for r in local.conn.execute(sql, args).fetchall()]
+
+    def user_history(self, user_id: int, limit: int = 10) -> list:
+        return self._read(
+            "SELECT timestamp, ticker, amount, best_model, rmse, est_profit, status, error_msg "
+            "FROM requests WHERE user_id = ? ORDER BY timestamp DESC LIMIT ?",
+            (user_id, limit),
+        )
+
+    def ticker_popularity(self, days: int = 30, limit: int = 10) -> list:
+        since = (datetime.now() - timedelta(days=days)).isoformat(timespec="seconds")
+        return self._read(
+            "SELECT ticker, COUNT(*) AS requests, COUNT(DISTINCT user_id) AS users "
+            "FROM requests WHERE timestamp >= ? AND ticker != '' "
+            "GROUP BY ticker ORDER BY requests DESC LIMIT ?",
+            (since, limit),
+        )
+
+    def error_rates(self, days: int = 7, limit: int = 10) -> list:
+        since = (datetime.now() - timedelta(days=days)).isoformat(timespec="seconds")
+        return self._read(
+            "SELECT ticker, COUNT(*) AS requests, SUM(status = 'error') AS errors, "
+            "ROUND(AVG(status = 'error') * 100.0, 1) AS error_pct "
+            "FROM requests WHERE timestamp >= ? AND ticker != '' "
+            "GROUP BY ticker HAVING errors > 0 ORDER BY errors DESC LIMIT ?",
+            (since, limit),
+        )
+
+
+LOG = RequestLog()
+
+
+def append_error_log(user_id: int, ticker: str, amount: float, msg: str, stage_ms: dict = None):
+    LOG.log({
+        "user_id": user_id,
+        "ticker": ticker,
+        "amount": amount,
+        "status": "error",
+        "error_msg": msg,
+        "stage_ms": stage_ms,
+    })
@@ -1,128 +1,211 @@
+import os
+import time
 from datetime import datetime
-from io import BytesIO
 import numpy as np
 import pandas as pd
 
+from core import forecast_cache, forecast_store, metrics
+from core.backtest import walk_forward, pick_best
+from core.finish import finish_pipeline
 from core.data_loader import load_close_series, train_test_split_by_time
-from models.models_ml import fit_eval_ml, forecast_ml
-from models.models_stats import fit_eval_ets, forecast_ets
-from models.models_nn import fit_eval_nn, forecast_nn
+from core.tournament import run_tournament
+from models import registry
 from viz.plotting import build_plot
-from viz.recommender import make_signals_and_profit
-from models.models_stats import fit_eval_ets, forecast_ets, fit_eval_arima, forecast_arima
+from viz.recommender import make_signals_and_profit, signals_outcome
 
+# всё, от чего зависит прогноз (кроме самих данных); входит в ключ кэша
+PIPELINE_CONFIG = {
+    "horizon": 30,
+    "test_days": 60,
+    "models": ",".join(registry.MODELS),
+    # holdout — один сплит на последние test_days; walkforward — скользящие фолды
+    "selection": os.getenv("SELECTION_MODE", "holdout"),
+    "wf_folds": int(os.getenv("WF_FOLDS", "5")),
+    "wf_horizon": int(os.getenv("WF_HORIZON", "20")),
+    # сколько сценариев Монте-Карло для веера и распределения прибыли; 0 — выключено
+    "mc_paths": int(os.getenv("MC_PATHS", "1000")),
+}
 
-def run_pipeline(ticker: str, amount: float, user_id: int) -> dict:
-    # загрузка
-    s = load_close_series(ticker)
-    train, test = train_test_split_by_time(s, test_days=60)
-
-    # обучаем 3 модели
-    metrics = []
+BAND_Q = (5, 25, 50, 75, 95)  # квантили веера на графике
 
-    # ML
-    ml_model, ml_rmse, ml_mape = fit_eval_ml(train, test)
-    metrics.append(("ML(Ridge)", ml_rmse, ml_mape, ml_model))
 
-    # ETS
-    ets_model, ets_rmse, ets_mape = fit_eval_ets(train, test)
-    metrics.append(("ETS", ets_rmse, ets_mape, ets_model))
+def _select_holdout(s: pd.Series, ticker: str = None):
+    train, test = train_test_split_by_time(s, test_days=PIPELINE_CONFIG["test_days"])
 
-    # ARIMA
-    arima_model, arima_rmse, arima_mape = fit_eval_arima(train, test)
-    # имя модели возьмём из атрибута, если он есть
-    arima_name = getattr(arima_model, "_name_for_report", "ARIMA")
-    metrics.append((arima_name, arima_rmse, arima_mape, arima_model))
+    # кандидаты обучаются параллельно, каждый под своим бюджетом, всё — под общим дедлайном
+    cands = registry.enabled(PIPELINE_CONFIG["models"].split(","))
+    results, skipped = run_tournament(cands, train, test, key=ticker)
+    if not results:
+        raise RuntimeError("Ни одна модель не обучилась: " + "; ".join(f"{n}: {r}" for n, r in skipped))
 
     # выбор лучшей по RMSE
-    metrics_sorted = sorted(metrics, key=lambda x: x[1])
-    best_name, best_rmse, best_mape, best_model = metrics_sorted[0]
-
-    # прогноз на 30 дней
-    horizon = 30
-    hist = pd.concat([train, test])
-
-    if best_name.startswith("ML"):
-        y_pred = forecast_ml(hist, best_model, horizon)
-    elif best_name == "ETS":
-        y_pred = forecast_ets(hist, best_model, horizon)
-    elif best_name.startswith("ARIMA"):
-        y_pred = forecast_arima(hist, best_model, horizon)
+    best = min(results, key=lambda r: r["rmse"])
+    models = {r["kind"]: r["model"] for r in results}
+    # модель видела только train: доводим её до последнего бара (как walk-forward), иначе
+    # прогноз и сценарии ETS/ARIMA стартуют с конца train, за test_days до сегодняшней цены
+    model = best["model"]
+    with metrics.span("extend"):
+        try:
+            model = models[best["kind"]] = registry.get(best["kind"]).update(model, s, test)
+        except Exception:
+            metrics.incr("extend_error")
+    best = (best["label"], best["rmse"], best["mape"], model, best["kind"])
+    return best, s, models, skipped
+
+
+def _select_walkforward(s: pd.Series, ticker: str = None):
+    cands = registry.enabled(PIPELINE_CONFIG["models"].split(","))
+    with metrics.span("walk_forward"):
+        bt = walk_forward(s, folds=PIPELINE_CONFIG["wf_folds"], horizon=PIPELINE_CONFIG["wf_horizon"],
+                          key=ticker, candidates=cands)
+    models = {bt["kinds"][label]: m for label, m in bt["models"].items()}
+    # модели уже доведены до конца ряда
+    return pick_best(bt), s, models, bt["skipped"]
+
+
+def _simulate(kind: str, hist: pd.Series, model, horizon: int, n_paths: int):
+    """Сценарии лучшей модели (n_paths, horizon); None, если модель не умеет."""
+    cand = registry.get(kind)
+    if cand.simulate is None:
+        return None
+    try:
+        return cand.simulate(hist, model, horizon, n_paths)
+    except Exception:
+        metrics.incr("simulate_error")
+    return None
+
+
+def forecast_series(ticker: str, s: pd.Series, plot: bool = True, save: bool = True) -> dict:
+    """
+    Тяжёлая часть: обучение, выбор лучшей модели, прогноз и график. От суммы не зависит.
+    plot=False — без графика (plot_png=None), для пакетного режима;
+    save=False — график не копируется в examples/ (ночной предрасчёт).
+    """
+    if PIPELINE_CONFIG["selection"] == "walkforward":
+        best, hist, models, skipped = _select_walkforward(s, ticker)
     else:
-        y_pred = forecast_ets(hist, best_model, horizon)
+        best, hist, models, skipped = _select_holdout(s, ticker)
+    best_name, best_rmse, best_mape, best_model, best_kind = best
+    arima_model = models.get("ARIMA")
 
-    # изменение цены относительно текущей
-    last_price = float(s.iloc[-1])
-    change_pct = (y_pred[-1] - last_price) / last_price * 100.0
+    # прогноз на 30 дней
+    horizon = PIPELINE_CONFIG["horizon"]
+
+    with metrics.span("forecast"):
+        y_pred = registry.get(best_kind).forecast(hist, best_model, horizon)
+
+    # сценарии: веер квантилей и прибыль на одну акцию, если на каждом пути исполнить сигналы
+    # точечного прогноза (сумма только масштабирует); без сделок в прогнозе распределения нет
+    bands, profit_q, profit_prob = None, None, None
+    if PIPELINE_CONFIG["mc_paths"] > 0:
+        with metrics.span("simulate"):
+            paths = _simulate(best_kind, hist, best_model, horizon, PIPELINE_CONFIG["mc_paths"])
+            if paths is not None:
+                bands = np.percentile(paths, BAND_Q, axis=0)
+                per_share = signals_outcome(paths, y_pred, 1.0, 1.0)
+                if np.any(per_share):
+                    profit_q = np.percentile(per_share, (5, 50, 95))
+                    profit_prob = float(np.mean(per_share > 0))
 
     # график + сохранение в examples
-    hist_tail = s.iloc[-180:]
-    import os
-    os.makedirs("examples", exist_ok=True)
-    png_path = os.path.join("examples", f"{ticker}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png")
-    plot_bytes = build_plot(hist_tail, y_pred, save_path=png_path)
-
-    # рекомендации и условная прибыль
-    signals_df, est_profit, pairs = make_signals_and_profit(y_pred, amount, last_price)
-    signals_head = signals_df.head(8).copy()
-    pairs_head = pairs[:4]
-
-    # лог в csv
-    log_row = {
-        "user_id": user_id,
-        "timestamp": datetime.now().isoformat(timespec="seconds"),
-        "ticker": ticker,
-        "amount": amount,
-        "best_model": best_name,
-        "rmse": round(best_rmse, 6),
-        "mape": round(best_mape, 6),
-        "horizon": horizon,
-        "est_profit": round(float(est_profit), 6),
-        "status": "ok",
-        "error_msg": ""
-    }
-    _append_log(log_row)
+    plot_png = None
+    if plot:
+        hist_tail = s.iloc[-180:]
+        png_path = None
+        if save:
+            os.makedirs("examples", exist_ok=True)
+            png_path = os.path.join("examples", f"{ticker}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png")
+        with metrics.span("plot"):
+            plot_png = build_plot(hist_tail, y_pred, save_path=png_path, bands=bands).getvalue()
 
     return {
-        "plot_bytes": plot_bytes,
-        "change_pct": float(change_pct),
-        "pairs_head": pairs_head,
         "best_model": best_name,
         "rmse": float(best_rmse),
         "mape": float(best_mape),
-        "est_profit": float(est_profit),
-        "signals_head": signals_head,
+        "horizon": horizon,
+        "forecast": np.asarray(y_pred, dtype=float),
+        "last_price": float(s.iloc[-1]),
+        "plot_png": plot_png,
+        # кандидаты, снятые по таймауту/дедлайну или упавшие: [(имя, причина)]
+        "skipped": skipped,
+        "bands": bands,
+        "profit_q": profit_q,
+        "profit_prob": profit_prob,
+        # сколько порядков ARIMA прошло скрининг и сколько дошло до полного фита
+        "arima_screened": getattr(arima_model, "_arima_screened", 0),
+        "arima_fitted": getattr(arima_model, "_arima_fitted", 0),
     }
 
-def _append_log(row: dict):
-    import csv, os
-    path = "logs.csv"
-    file_exists = os.path.exists(path)
-    with open(path, "a", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=list(row.keys()))
-        if not file_exists:
-            writer.writeheader()
-        writer.writerow(row)
-
-def append_error_log(user_id: int, ticker: str, amount: float, msg: str):
-    import csv, os
-    path = "logs.csv"
-    file_exists = os.path.exists(path)
-    row = {
-        "user_id": user_id,
-        "timestamp": datetime.now().isoformat(timespec="seconds"),
-        "ticker": ticker,
-        "amount": amount,
-        "best_model": "",
-        "rmse": "",
-        "mape": "",
-        "horizon": "",
-        "est_profit": "",
-        "status": "error",
-        "error_msg": msg[:500],
-    }
-    with open(path, "a", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=list(row.keys()))
-        if not file_exists:
-            writer.writeheader()
-        writer.writerow(row)
+
+def warmup():
+    """
+    Прогрев процесса-воркера: импорт стека и первый вызов каждого горячего пути
+    (обучение и прогноз кандидатов, сценарии, сигналы, шаблон графика) на синтетике.
+    Кэши прогнозов, веса NN по тикерам, журнал и examples/ не трогает.
+    """
+    rng = np.random.default_rng(0)
+    idx = pd.bdate_range("2020-01-01", periods=300)
+    s = pd.Series(100.0 * np.exp(np.cumsum(rng.normal(0, 0.01, len(idx)))), index=idx, name="Close")
+    train, test = train_test_split_by_time(s, test_days=30)
+    y_pred = s.values[-5:]
+    for cand in registry.enabled(PIPELINE_CONFIG["models"].split(",")):
+        try:
+            model, _, _ = cand.fit(train, test, None)
+            y_pred = cand.forecast(s, model, 5)
+            if cand.simulate is not None:
+                cand.simulate(s, model, 5, 8)
+        except Exception:
+            pass
+    signals_outcome(np.tile(y_pred, (8, 1)), y_pred, 1.0, 1.0)
+    make_signals_and_profit(y_pred, 1.0, float(s.iloc[-1]))
+    build_plot(s.iloc[-180:], y_pred)
+
+
+def _load_forecast(ticker: str) -> dict:
+    # загрузка
+    with metrics.span("load"):
+        s = load_close_series(ticker)
+
+    # повторный запрос по тем же данным не переобучает модели
+    key = forecast_cache.make_key(ticker, s.index[-1], PIPELINE_CONFIG)
+    fc = forecast_cache.CACHE.get(key)
+    if fc is None:
+        metrics.incr("forecast_cache_miss")
+        # горячие тикеры посчитаны ночью (core.precompute) — годится, если бар и конфиг те же
+        with metrics.span("store_lookup"):
+            fc = forecast_store.get(ticker, s.index[-1], PIPELINE_CONFIG)
+        if fc is not None:
+            metrics.incr("forecast_store_hit")
+        else:
+            fc = forecast_series(ticker, s)
+            # CACHE у каждого воркера свой: через общее хранилище посчитанное увидят остальные
+            # воркеры пула и другие узлы (при общем FORECAST_STORE_DIR)
+            with metrics.span("store_put"):
+                try:
+                    forecast_store.put(ticker, s.index[-1], PIPELINE_CONFIG, fc)
+                except OSError:
+                    metrics.incr("forecast_store_error")
+        forecast_cache.CACHE.put(key, fc)
+    else:
+        metrics.incr("forecast_cache_hit")
+    return fc
+
+
+def run_pipeline(ticker: str, amount: float, user_id: int, fc: dict = None, share: bool = False) -> dict:
+    """
+    fc — готовый прогноз: загрузка и выбор модели пропускаются, считается только часть,
+    зависящая от суммы (склеенные запросы core.admission досчитывают её в боте, core.finish).
+    share=True — вернуть прогноз в result["fc"], чтобы раздать его ждущим.
+    """
+    # замеры стадий едут обратно вместе с результатом (timings/counters) и пишутся в лог
+    with metrics.collect() as timings:
+        t0 = time.perf_counter()
+        if fc is None:
+            fc = _load_forecast(ticker)
+        result = finish_pipeline(ticker, amount, user_id, fc, timings=timings, t0=t0)
+
+    result["timings"] = dict(timings.stages)
+    result["counters"] = dict(timings.counters)
+    if share:
+        result["fc"] = fc
+    return result
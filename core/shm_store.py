@@ -0,0 +1,194 @@
+# core/shm_store.py
+"""
+Общее для всех воркеров колоночное хранилище очищенных рядов Close.
+
+Данные — один файл float64, отображённый в память (np.memmap) во всех процессах:
+по умолчанию в /dev/shm (разделяемая память), иначе рядом с price_cache на диске.
+Ось дат общая и неявная — календарь B-дней от EPOCH, поэтому ряд — это только
+(позиция первого бара на оси, смещение и длина в файле данных). Описание рядов и
+meta из price_cache лежат в index.json.
+
+get() отдаёт pd.Series поверх read-only среза memmap: без копии и без чтения npz,
+страницы общие для всех процессов, так что память воркера не растёт с числом тикеров.
+Запись — под файловой блокировкой: новые ряды дописываются в конец файла, индекс
+подменяется атомарно, один раз на пачку (put_many: индекс переписывается целиком,
+поэтому ряды по одному при массовой загрузке — квадратичная работа писателю и
+читателям). Когда мусора от перезаписанных рядов больше половины, файл пересобирается
+в новое поколение (старый остаётся валидным у тех, кто его уже отобразил).
+Без fcntl (Windows) хранилище выключено и price_cache работает как раньше.
+"""
+import hashlib
+import json
+import os
+import threading
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# понедельник, нулевая точка оси B-дней; раньше любого бара у источников (Yahoo/Stooq — с 1960-х).
+# Ряд, начавшийся ещё раньше, в хранилище не кладётся и читается из .npz
+EPOCH = np.datetime64("1900-01-01", "D")
+COMPACT_MIN = 1 << 20  # не пересобираем файл меньше 1M значений (8 МБ)
+
+_local = {"pid": None, "dir": None, "mtime": None, "index": None, "gen": None, "map": None, "axis": None}
+_lock = threading.Lock()
+
+
+def store_dir() -> str:
+    from core import price_cache
+    env = os.getenv("SHM_STORE_DIR")
+    if env:
+        return env
+    if os.path.isdir("/dev/shm"):
+        # у каждого кэша котировок своё хранилище
+        tag = hashlib.sha1(os.path.abspath(price_cache.CACHE_DIR).encode()).hexdigest()[:10]
+        return os.path.join("/dev/shm", f"peroalxbot-{tag}")
+    return os.path.join(price_cache.CACHE_DIR, "store")
+
+
+def enabled() -> bool:
+    return fcntl is not None and os.getenv("SHM_STORE", "1") != "0"
+
+
+def _index_path(d: str) -> str:
+    return os.path.join(d, "index.json")
+
+
+def _data_path(d: str, gen: int) -> str:
+    return os.path.join(d, f"data.{gen}.f64")
+
+
+def _read_index(d: str) -> dict:
+    try:
+        with open(_index_path(d), encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = None
+    if index is not None and index.get("epoch") == str(EPOCH):
+        return index
+    # нет индекса или он от другой оси — начинаем новое поколение с пустым индексом
+    gen = index["gen"] + 1 if index and "gen" in index else 0
+    return {"gen": gen, "size": 0, "garbage": 0, "tickers": {}, "epoch": str(EPOCH)}
+
+
+def _bday(ts) -> int:
+    return int(np.busday_count(EPOCH, np.datetime64(pd.Timestamp(ts).date(), "D")))
+
+
+def _dates(start: int, n: int) -> pd.DatetimeIndex:
+    """Срез общей для процесса оси B-дней: у всех рядов индекс — представление одного массива."""
+    axis = _local.get("axis")
+    if axis is None or len(axis) < start + n:
+        days = np.busday_offset(EPOCH, np.arange(start + n + 2600), roll="forward")  # с запасом ~10 лет
+        axis = _local["axis"] = pd.DatetimeIndex(days.astype("datetime64[ns]"), freq="B")
+    return axis[start:start + n]
+
+
+def _state():
+    """Индекс и memmap этого процесса; перечитываются, только если index.json поменялся."""
+    d = store_dir()
+    try:
+        mtime = os.stat(_index_path(d)).st_mtime_ns
+    except OSError:
+        return None, None
+    with _lock:
+        st = _local
+        if st["pid"] != os.getpid() or st["dir"] != d or st["mtime"] != mtime:
+            index = _read_index(d)
+            mm = st["map"]
+            # файл растёт дописыванием — переотображаем, если индекс ушёл за край отображения
+            if st["pid"] != os.getpid() or st["gen"] != index["gen"] or mm is None or len(mm) < index["size"]:
+                mm = np.memmap(_data_path(d, index["gen"]), dtype=np.float64, mode="r") if index["size"] else None
+            st.update(pid=os.getpid(), dir=d, mtime=mtime, index=index, gen=index["gen"], map=mm)
+        return st["index"], st["map"]
+
+
+def get(ticker: str) -> Optional[Tuple[pd.Series, dict]]:
+    """(ряд-представление без копии, meta) или None. Массив только для чтения."""
+    if not enabled():
+        return None
+    index, mm = _state()
+    if index is None or mm is None:
+        return None
+    e = index["tickers"].get(ticker.upper())
+    if e is None:
+        return None
+    dates = _dates(e["start"], e["len"])
+    if e["start"] < 0 or len(dates) != e["len"] or e["off"] + e["len"] > len(mm):
+        return None  # запись не сходится с осью или файлом — пусть читается .npz
+    values = mm[e["off"]:e["off"] + e["len"]]
+    return pd.Series(values, index=dates, name="Close", copy=False), e["meta"]
+
+
+def put(ticker: str, s: pd.Series, meta: dict):
+    """Публикует ряд (B-дни подряд, как после price_cache.write) для всех процессов."""
+    put_many([(ticker, s, meta)])
+
+
+def put_many(items):
+    """Пачка (тикер, ряд, meta): одна блокировка, одно чтение и одна запись индекса."""
+    items = [(t.upper(), s, meta) for t, s, meta in items if not s.empty]
+    if not enabled() or not items:
+        return
+    d = store_dir()
+    os.makedirs(d, exist_ok=True)
+    with open(os.path.join(d, "lock"), "w") as lk:
+        fcntl.flock(lk, fcntl.LOCK_EX)
+        index = _read_index(d)
+        if not index["size"] and index["gen"]:
+            try:
+                os.remove(_data_path(d, index["gen"] - 1))  # осталось от индекса со старой осью
+            except OSError:
+                pass
+        path = _data_path(d, index["gen"])
+        mm = np.memmap(path, dtype=np.float64, mode="r") if index["size"] else None
+        with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+            # хвост после index["size"] — недописанное упавшим писателем, его затираем
+            f.seek(index["size"] * 8)
+            for key, s, meta in items:
+                values = np.ascontiguousarray(s.values, dtype=np.float64)
+                old = index["tickers"].get(key)
+                start = _bday(s.index[0])
+                if start < 0:
+                    continue  # раньше EPOCH — на оси не помещается
+                if (old is not None and old["start"] == start and old["len"] == len(values)
+                        and mm is not None and old["off"] + old["len"] <= len(mm)
+                        and np.array_equal(mm[old["off"]:old["off"] + old["len"]], values)):
+                    # ряд тот же (проверили кэш после закрытия) — обновляем только meta
+                    old["meta"] = meta
+                    continue
+                f.write(values.tobytes())
+                index["tickers"][key] = {"off": index["size"], "len": len(values), "start": start, "meta": meta}
+                index["size"] += len(values)
+                index["garbage"] += old["len"] if old is not None else 0
+        if index["garbage"] * 2 > index["size"] and index["size"] > COMPACT_MIN:
+            _compact(d, index)
+        _write_index(d, index)
+
+
+def _compact(d: str, index: dict):
+    old_gen = index["gen"]
+    src = np.memmap(_data_path(d, old_gen), dtype=np.float64, mode="r")
+    gen = old_gen + 1
+    off = 0
+    with open(_data_path(d, gen), "wb") as f:
+        for e in index["tickers"].values():
+            f.write(src[e["off"]:e["off"] + e["len"]].tobytes())
+            e["off"] = off
+            off += e["len"]
+    index.update(gen=gen, size=off, garbage=0)
+    # процессы, уже отобразившие старое поколение, дочитают его: на Linux файл живёт до munmap
+    os.remove(_data_path(d, old_gen))
+
+
+def _write_index(d: str, index: dict):
+    tmp = _index_path(d) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(json.dumps(index))  # dumps — C-кодировщик, json.dump на больших индексах в разы медленнее
+    os.replace(tmp, _index_path(d))
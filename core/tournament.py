@@ -0,0 +1,165 @@
+# core/tournament.py
+"""
+Турнир моделей под дедлайн. Каждый кандидат обучается в своём процессе,
+у каждого свой бюджет времени (Candidate.budget), у всего выбора — общий
+дедлайн SELECT_DEADLINE. Кандидат, вышедший за бюджет, снимается; по
+дедлайну берём лучших из уже закончивших, остальных снимаем. Снятые и
+упавшие возвращаются списком skipped — их показываем пользователю.
+"""
+import multiprocessing as mp
+import os
+import time
+from multiprocessing.connection import wait
+
+from core import metrics
+from models import registry
+
+SELECT_DEADLINE = float(os.getenv("SELECT_DEADLINE", "30"))
+# 0 — обучать кандидатов по очереди в этом же процессе (пакетный режим, отладка)
+PROCS = os.getenv("TOURNAMENT_PROCS", "1") != "0"
+# сколько кандидатов обучается одновременно (0 — все сразу); пул прогнозов ставит
+# ядра / воркеры, чтобы N воркеров × кандидаты не дрались за процессор
+MAX_PROCS = int(os.getenv("TOURNAMENT_MAX_PROCS", "0"))
+# не fork: родитель (воркер пула) мог уже загрузить TensorFlow, а форк процесса с TF может
+# зависнуть. forkserver форкает детей от чистого процесса, где предзагружен только реестр
+_START = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+
+
+def _context():
+    ctx = mp.get_context(_START)
+    if _START == "forkserver":
+        ctx.set_forkserver_preload(["models.registry"])
+    return ctx
+
+
+def limit_fanout(workers: int):
+    """Вызывается в инициализаторе пула: на один турнир — ядра, поделённые между воркерами."""
+    global MAX_PROCS
+    MAX_PROCS = max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def _child(conn, name: str, train, test, key):
+    # внутренний пул ARIMA не переживёт kill процесса кандидата — обучаем её в один поток,
+    # параллельность и так даёт сам турнир
+    import models.models_stats as ms
+    ms.ARIMA_JOBS = 1
+    # счётчики из процесса кандидата (тёплый старт и т.п.) едут обратно вместе с результатом
+    with metrics.collect() as c:
+        try:
+            msg = ("ok", registry.get(name).fit(train, test, key))
+        except Exception as e:
+            msg = ("error", f"{type(e).__name__}: {e}")
+    try:
+        conn.send(msg + (dict(c.stages), dict(c.counters)))
+    finally:
+        conn.close()
+
+
+def _entry(cand, payload, seconds: float) -> dict:
+    model, rmse, mape = payload
+    return {"kind": cand.name, "label": cand.label(model), "model": model,
+            "rmse": float(rmse), "mape": float(mape), "seconds": seconds}
+
+
+def _run_inline(cands, train, test, key, deadline: float):
+    t0 = time.perf_counter()
+    results, skipped = [], []
+    for c in cands:
+        if results and time.perf_counter() - t0 > deadline:
+            skipped.append((c.name, "дедлайн"))
+            continue
+        st = time.perf_counter()
+        try:
+            with metrics.span(f"fit_{c.name.lower()}"):
+                payload = c.fit(train, test, key)
+        except Exception as e:
+            metrics.incr("fit_error")
+            skipped.append((c.name, f"{type(e).__name__}: {e}"))
+            continue
+        c.keep(key, payload[0])
+        results.append(_entry(c, payload, time.perf_counter() - st))
+    return results, skipped
+
+
+def run_tournament(cands, train, test, key=None, deadline: float = None, procs: bool = None):
+    """
+    Возвращает (results, skipped): results — закончившие кандидаты
+    [{"kind", "label", "model", "rmse", "mape", "seconds"}], skipped — [(имя, причина)].
+    """
+    deadline = SELECT_DEADLINE if deadline is None else deadline
+    procs = PROCS if procs is None else procs
+    if not procs or len(cands) < 2:
+        return _run_inline(cands, train, test, key, deadline)
+
+    ctx = _context()
+    t0 = time.perf_counter()
+    running = {}  # conn -> (кандидат, процесс, время старта); бюджет считается от старта
+    waiting = list(cands)
+    slots = MAX_PROCS or len(cands)
+
+    def _launch():
+        while waiting and len(running) < slots:
+            c = waiting.pop(0)
+            r, w = ctx.Pipe(duplex=False)
+            p = ctx.Process(target=_child, args=(w, c.name, train, test, key),
+                            name=f"fit-{c.name}", daemon=True)
+            p.start()
+            w.close()
+            running[r] = (c, p, time.perf_counter())
+
+    _launch()
+    results, skipped = [], []
+
+    def _drop(conn, reason):
+        c, p, _ = running.pop(conn)
+        p.kill()
+        p.join()
+        conn.close()
+        skipped.append((c.name, reason))
+        metrics.incr("fit_timeout")
+
+    try:
+        while running or waiting:
+            now = time.perf_counter()
+            for conn, (c, _, st) in list(running.items()):
+                if now - st > c.budget:
+                    _drop(conn, "таймаут")
+            # общий дедлайн отсекает только если уже есть из чего выбрать
+            if results and now - t0 > deadline:
+                for conn in list(running):
+                    _drop(conn, "дедлайн")
+                skipped.extend((c.name, "дедлайн") for c in waiting)
+                waiting.clear()
+            _launch()
+            if not running:
+                break
+
+            limits = [st + c.budget for c, _, st in running.values()]
+            if results:
+                limits.append(t0 + deadline)
+            for conn in wait(list(running), timeout=max(0.0, min(limits) - now)):
+                c, p, st = running.pop(conn)
+                try:
+                    status, payload, stages, counters = conn.recv()
+                except EOFError:
+                    status, payload, stages, counters = "error", "процесс кандидата упал", {}, {}
+                p.join()
+                for k, v in stages.items():
+                    metrics.observe(k, v)
+                for k, v in counters.items():
+                    metrics.incr(k, v)
+                conn.close()
+                seconds = time.perf_counter() - st
+                if status == "ok":
+                    metrics.observe(f"fit_{c.name.lower()}", seconds)
+                    c.keep(key, payload[0])
+                    results.append(_entry(c, payload, seconds))
+                else:
+                    metrics.incr("fit_error")
+                    skipped.append((c.name, payload))
+    finally:
+        for conn, (_, p, _) in running.items():
+            p.kill()
+            p.join()
+            conn.close()
+    return results, skipped
@@ -0,0 +1,113 @@
+# core/worker.py
+"""
+Вычислительный воркер для раздельного режима (EXECUTOR=queue): берёт задачи из
+core.jobqueue, считает и кладёт результат обратно. Состояния между задачами не держит,
+кроме кэшей (котировки, прогнозы, параметры моделей), поэтому воркеров можно добавлять
+и убирать на ходу.
+
+    python -m core.worker                # WORKERS процессов (0 — по числу ядер)
+    python -m core.worker --procs 4 --db /shared/jobs.db
+
+Процесс, упавший посреди задачи, перезапускается; его задачу после истечения аренды
+берёт любой живой воркер.
+"""
+import argparse
+import importlib
+import multiprocessing as mp
+import os
+import signal
+import socket
+import threading
+import time
+
+from core.jobqueue import LEASE_SEC, QUEUE_DB, JobQueue
+
+
+def _resolve(name: str):
+    module, _, attr = name.partition(":")
+    fn = importlib.import_module(module)
+    for part in attr.split("."):
+        fn = getattr(fn, part)
+    return fn
+
+
+def _heartbeat(queue: JobQueue, job_id: int, worker: str, lease: float, stop: threading.Event):
+    while not stop.wait(lease / 3):
+        if not queue.heartbeat(job_id, worker, lease):
+            return  # аренду перехватили — досчитаем, но результат уже не наш
+
+
+def serve(db: str = None, name: str = None, warm: bool = True, lease: float = None, idle: float = 0.2,
+          max_jobs: int = 0, procs: int = None):
+    """
+    Цикл одного процесса-воркера. max_jobs > 0 — выйти после стольких задач (для замеров);
+    procs — сколько воркеров на этой машине, между ними делятся ядра под турниры моделей.
+    """
+    if procs:
+        from core import tournament
+        tournament.limit_fanout(procs)
+    if warm:
+        from core.executor import _warm_worker
+        _warm_worker()
+    name = name or f"{socket.gethostname()}:{os.getpid()}"
+    lease = lease or LEASE_SEC
+    queue = JobQueue(db)
+    done = 0
+    while not max_jobs or done < max_jobs:
+        job = queue.claim(name, lease)
+        if job is None:
+            time.sleep(idle)
+            continue
+        job_id, fn, args, kwargs, _attempt = job
+        stop = threading.Event()
+        beat = threading.Thread(target=_heartbeat, args=(queue, job_id, name, lease, stop), daemon=True)
+        beat.start()
+        try:
+            result = _resolve(fn)(*args, **kwargs)
+        except Exception as e:
+            queue.fail(job_id, name, e)
+        else:
+            queue.finish(job_id, name, result)
+        finally:
+            stop.set()
+            beat.join()
+        done += 1
+    queue.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Вычислительные воркеры очереди прогнозов")
+    ap.add_argument("--procs", type=int, default=int(os.getenv("WORKERS", "0")) or os.cpu_count() or 1)
+    ap.add_argument("--db", default=QUEUE_DB)
+    ap.add_argument("--no-warmup", action="store_true", help="не прогревать научный стек при старте")
+    args = ap.parse_args()
+
+    ctx = mp.get_context("spawn")
+
+    def spawn():
+        # не daemon: турнир моделей сам запускает дочерние процессы
+        p = ctx.Process(target=serve, kwargs={"db": args.db, "warm": not args.no_warmup, "procs": args.procs})
+        p.start()
+        return p
+
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    procs = [spawn() for _ in range(args.procs)]
+    print(f"Воркеров: {args.procs}, очередь: {args.db}")
+    try:
+        while not stopping.wait(1.0):
+            for i, p in enumerate(procs):
+                if not p.is_alive():
+                    print(f"воркер {p.pid} вышел с кодом {p.exitcode} — перезапускаю")
+                    procs[i] = spawn()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.join()
+
+
+if __name__ == "__main__":
+    main()
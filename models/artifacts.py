@@ -0,0 +1,121 @@
+# models/artifacts.py
+"""
+Хранилище параметров обученных моделей по тикеру: тёплый старт вместо обучения с нуля.
+
+Один JSON на (тикер, кандидат) в MODEL_ARTIFACT_DIR: параметры последнего фита
+(порядки и коэффициенты ARIMA, параметры сглаживания ETS, alpha Ridge), RMSE и
+длительность последнего полного поиска, номер версии и сколько времени уже
+сэкономили тёплые старты. Полный поиск повторяется раз в MODEL_FULL_SEARCH_DAYS
+дней и сразу, если ошибка тёплого фита уехала больше чем в MODEL_DRIFT_RATIO раз.
+Веса нейросети лежат рядом массивами (.npz): их дообучает тот воркер, к которому
+тикер попал, а не только тот, что учил сеть первым.
+"""
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import numpy as np
+
+from core import metrics
+
+ARTIFACT_DIR = os.getenv("MODEL_ARTIFACT_DIR", os.path.join(".cache", "models"))
+WARM_START = os.getenv("MODEL_WARM_START", "1") != "0"
+FULL_SEARCH_DAYS = float(os.getenv("MODEL_FULL_SEARCH_DAYS", "7"))
+DRIFT_RATIO = float(os.getenv("MODEL_DRIFT_RATIO", "1.5"))
+SCHEMA = 1  # меняется вместе с форматом params — старые файлы просто игнорируются
+
+
+def _path(key: str, kind: str, ext: str = "json") -> str:
+    return os.path.join(ARTIFACT_DIR, f"{key.upper()}.{kind}.{ext}")
+
+
+def load(key, kind: str) -> Optional[dict]:
+    if key is None:
+        return None
+    try:
+        with open(_path(key, kind), encoding="utf-8") as f:
+            rec = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return rec if rec.get("schema") == SCHEMA else None
+
+
+def save(key, kind: str, rec: dict):
+    if key is None:
+        return
+    os.makedirs(ARTIFACT_DIR, exist_ok=True)
+    path = _path(key, kind)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({**rec, "schema": SCHEMA}, f)
+    os.replace(tmp, path)
+
+
+def load_weights(key, kind: str) -> Optional[list]:
+    """Список массивов весов, сохранённых save_weights, или None."""
+    if key is None or not WARM_START:
+        return None
+    try:
+        with np.load(_path(key, kind, "npz"), allow_pickle=False) as z:
+            return [z[f"w{i}"] for i in range(len(z.files))]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def save_weights(key, kind: str, weights: list):
+    if key is None:
+        return
+    os.makedirs(ARTIFACT_DIR, exist_ok=True)
+    path = _path(key, kind, "npz")
+    tmp = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(tmp, **{f"w{i}": np.asarray(w, dtype=np.float64) for i, w in enumerate(weights)})
+    os.replace(tmp, path)
+
+
+def full_search_due(rec: dict, now: datetime = None) -> bool:
+    now = now or datetime.now(timezone.utc)
+    try:
+        return now - datetime.fromisoformat(rec["full_at"]) > timedelta(days=FULL_SEARCH_DAYS)
+    except (KeyError, ValueError):
+        return True
+
+
+def warm_fit(key, kind: str, train, test, full, warm, params):
+    """
+    full(train, test) -> (model, rmse, mape) — полный поиск;
+    warm(train, test, params) -> то же, от сохранённых параметров;
+    params(model) -> dict для следующего тёплого старта (JSON).
+    """
+    rec = load(key, kind) if WARM_START else None
+    now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    if rec is not None and not full_search_due(rec):
+        t0 = time.perf_counter()
+        try:
+            res = warm(train, test, rec["params"])
+        except Exception:
+            res = None
+        sec = time.perf_counter() - t0
+        if res is not None and res[1] <= rec["rmse"] * DRIFT_RATIO:
+            saved = max(0.0, rec["full_sec"] - sec)
+            metrics.incr("warm_start")
+            metrics.observe("warm_start_saved", saved)
+            save(key, kind, {
+                **rec, "params": params(res[0]), "version": rec["version"] + 1, "fitted_at": now,
+                "warm_fits": rec.get("warm_fits", 0) + 1, "saved_sec": rec.get("saved_sec", 0.0) + saved,
+            })
+            return res
+        # ошибка уехала (или тёплый фит не сошёлся) — параметрам больше не верим
+        metrics.incr("warm_start_drift")
+
+    t0 = time.perf_counter()
+    res = full(train, test)
+    sec = time.perf_counter() - t0
+    metrics.incr("full_search")
+    save(key, kind, {
+        "params": params(res[0]), "rmse": float(res[1]), "full_sec": sec, "full_at": now, "fitted_at": now,
+        "version": (rec or {}).get("version", 0) + 1,
+        "warm_fits": (rec or {}).get("warm_fits", 0), "saved_sec": (rec or {}).get("saved_sec", 0.0),
+    })
+    return res
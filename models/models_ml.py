@@ -4,7 +4,8 @@ from sklearn.linear_model import RidgeCV
 from sklearn.preprocessing import StandardScaler
 from sklearn.pipeline import Pipeline
 from sklearn.metrics import mean_squared_error
-from core.features import make_lag_features, last_window_for_recursive
+from core.features import MAX_LAG, build_feature_matrix, split_feature_matrix
+from models.recursive_ml import RecursiveRidge
 
 def _rmse(y_true, y_pred):
     y_true = np.asarray(y_true); y_pred = np.asarray(y_pred)
@@ -15,17 +16,17 @@ def _mape(y_true, y_pred):
     y_pred = np.asarray(y_pred)
     return float(np.mean(np.abs((y_true - y_pred) / y_true)) * 100.0)
 
-def fit_eval_ml(train: pd.Series, test: pd.Series):
-    X_tr, y_tr = make_lag_features(train)
-    # делаем признаки из train + части test, но таргет реальный test, с выравниванием по датам
+ALPHAS = (0.1, 1.0, 10.0)
+
+def fit_eval_ml(train: pd.Series, test: pd.Series, alphas=ALPHAS):
+    # признаки считаем один раз по train + test; строки теста — последние len(test)
+    # alphas=[alpha] — тёплый старт: вчерашняя alpha без перебора
     joined = pd.concat([train, test])
-    X_all, y_all = make_lag_features(joined)
-    X_te = X_all.loc[test.index]  # берем строки по датам теста
-    y_te = y_all.loc[test.index]
+    X_tr, y_tr, X_te, y_te = split_feature_matrix(joined, len(test))
 
     model = Pipeline([
         ("scaler", StandardScaler()),
-        ("ridge", RidgeCV(alphas=(0.1, 1.0, 10.0)))
+        ("ridge", RidgeCV(alphas=alphas))
     ])
     model.fit(X_tr, y_tr)
     pred = model.predict(X_te)
@@ -33,17 +34,40 @@ def fit_eval_ml(train: pd.Series, test: pd.Series):
     mape = _mape(y_te, pred)
     return model, rmse, mape
 
+def refit_ml(series: pd.Series, model):
+    """Переобучение на новом ряде с уже выбранной alpha: один Ridge вместо RidgeCV."""
+    X, y = build_feature_matrix(series.values)
+    alpha = model.named_steps["ridge"].alpha_
+    new = Pipeline([
+        ("scaler", StandardScaler()),
+        ("ridge", RidgeCV(alphas=[alpha]))
+    ])
+    new.fit(X, y)
+    return new
+
+def eval_ml(series: pd.Series, model, n_test: int):
+    """Ошибка одношагового прогноза на последних n_test точках ряда."""
+    _, _, X_te, y_te = split_feature_matrix(series, n_test)
+    pred = model.predict(X_te)
+    return _rmse(y_te, pred), _mape(y_te, pred)
+
 def forecast_ml(series: pd.Series, model, horizon: int = 30) -> np.ndarray:
-    s = series.copy()
-    max_lag = 30
-    window = last_window_for_recursive(s, max_lag)
-    y_pred = []
-    cur = s.copy()
-    for _ in range(horizon):
-        X_step, _ = make_lag_features(cur)
-        x_last = X_step.iloc[[-1]]  # последняя строка признаков
-        y_next = float(model.predict(x_last))
-        y_pred.append(y_next)
-        # добавим предсказание в конец ряда, чтобы построить лаги дальше
-        cur = pd.concat([cur, pd.Series([y_next], index=[cur.index[-1] + pd.tseries.offsets.BDay(1)])])
-    return np.array(y_pred)
+    # кольцевой буфер вместо пересборки DataFrame на каждом шаге
+    engine = RecursiveRidge(model)
+    return engine.forecast(series.values, horizon)
+
+RESID_WINDOW = 250  # сколько последних одношаговых остатков берём для бутстрепа
+
+def simulate_ml(series: pd.Series, model, horizon: int = 30, n_paths: int = 1000, rng=None) -> np.ndarray:
+    """
+    Сценарии Ridge: тот же рекурсивный прогноз, но к каждому шагу добавляется
+    остаток, вытянутый с возвращением из последних одношаговых ошибок модели.
+    Все n_paths путей считаются одним батчем, (n_paths, horizon).
+    """
+    engine = RecursiveRidge(model)
+    n_tail = max(1, min(RESID_WINDOW, len(series) - engine.size - MAX_LAG))
+    _, _, X, y = split_feature_matrix(series, n_tail)
+    resid = y - model.predict(X)
+    noise = np.random.default_rng(rng).choice(resid, size=(n_paths, horizon))
+    hist = np.broadcast_to(series.values[-engine.size:], (n_paths, engine.size))
+    return engine.forecast(hist, horizon, noise=noise)
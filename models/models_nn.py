@@ -1,7 +1,9 @@
 import numpy as np
 import pandas as pd
-from sklearn.neural_network import MLPRegressor
-from sklearn.metrics import mean_squared_error
+
+from core.features import lag_windows
+from models import nn_backend
+from models.nn_backend import WIN
 
 
 def _rmse(y_true, y_pred):
@@ -13,75 +15,46 @@ def _mape(y_true, y_pred):
     y_pred = np.asarray(y_pred)
     return float(np.mean(np.abs((y_true - y_pred) / y_true)) * 100.0)
 
-def _make_windows(s: pd.Series, win: int = 30):
-    arr = s.values.astype(float)
-    X, y = [], []
-    for i in range(win, len(arr)):
-        X.append(arr[i - win:i])
-        y.append(arr[i])
-    return np.array(X), np.array(y)
-
-def fit_eval_nn(train: pd.Series, test: pd.Series):
-    # LSTM если нет TF, используем MLP как fallback
-    try:
-        import tensorflow as tf  # noqa
-        from tensorflow.keras import Sequential
-        from tensorflow.keras.layers import LSTM, Dense
-        from tensorflow.keras.callbacks import EarlyStopping
-
-        win = 30
-        Xtr, ytr = _make_windows(train, win)
-        Xte, yte = _make_windows(pd.concat([train.iloc[-win:], test]), win)
-        # Xte последние len(test) выборок
-        Xte = Xte[-len(test):]
-
-        Xtr = Xtr.reshape((-1, win, 1))
-        Xte = Xte.reshape((-1, win, 1))
-
-        model = Sequential([
-            LSTM(32, input_shape=(win,1)),
-            Dense(1)
-        ])
-        model.compile(optimizer="adam", loss="mse")
-        es = EarlyStopping(monitor="val_loss", patience=3, restore_best_weights=True)
-        model.fit(Xtr, ytr, epochs=15, batch_size=32, validation_split=0.2, callbacks=[es], verbose=0)
-
-        pred = model.predict(Xte, verbose=0).reshape(-1)
-        rmse = _rmse(test.values, pred)
-        mape = _mape(test.values, pred)
-        return model, rmse, mape, "LSTM"
-    except Exception:
-        # Fallback: MLPRegressor
-        win = 30
-        Xtr, ytr = _make_windows(train, win)
-        Xte, yte = _make_windows(pd.concat([train.iloc[-win:], test]), win)
-        Xte = Xte[-len(test):]
-
-        mlp = MLPRegressor(hidden_layer_sizes=(64,64), random_state=42, max_iter=1000)
-        mlp.fit(Xtr, ytr)
-        pred = mlp.predict(Xte)
-        rmse = _rmse(test.values, pred)
-        mape = _mape(test.values, pred)
-        return mlp, rmse, mape, "NN(MLP-fallback)"
+def _make_windows(s: pd.Series, win: int = WIN):
+    return lag_windows(s.values, win)
+
+def _train_test_windows(train: pd.Series, test: pd.Series, win: int = WIN):
+    # окна строим один раз по train + test, тест — последние len(test) строк
+    X, y = lag_windows(np.concatenate([train.values, test.values]), win)
+    cut = len(y) - len(test)
+    return X[:cut], y[:cut], X[cut:], y[cut:]
+
+def fit_eval_nn(train: pd.Series, test: pd.Series, key=None):
+    # LSTM, если есть TF, иначе MLP; бэкенд выбирается один раз на процесс (models/nn_backend.py).
+    # key — тикер: если сеть для него уже обучалась, дообучаем её веса, а не учим с нуля
+    Xtr, ytr, Xte, yte = _train_test_windows(train, test)
+    model = nn_backend.train(Xtr, ytr, prev=nn_backend.cached(key))
+    nn_backend.remember(key, model)
+    pred = model.predict_windows(Xte)
+    return model, _rmse(yte, pred), _mape(yte, pred), model.name
+
+def refit_nn(series: pd.Series, model):
+    """Дообучение уже обученной сети на новом ряде (несколько эпох)."""
+    X, y = _make_windows(series)
+    return nn_backend.train(X, y, prev=model)
+
+def eval_nn(series: pd.Series, model, n_test: int):
+    """Ошибка одношагового прогноза на последних n_test точках ряда."""
+    X, y = _make_windows(series)
+    pred = model.predict_windows(X[-n_test:])
+    return _rmse(y[-n_test:], pred), _mape(y[-n_test:], pred)
 
 def forecast_nn(series: pd.Series, model, horizon: int = 30):
-    # работает и для LSTM, и для MLP оба принимают
-    win = 30
-    window = series.values.astype(float)[-win:].tolist()
-    preds = []
-    try:
-        # LSTM-ветка: нужен shape (1, win, 1)
-        import tensorflow as tf  # noqa
-        for _ in range(horizon):
-            x = np.array(window[-win:]).reshape((1, win, 1))
-            y_next = float(model.predict(x, verbose=0).reshape(-1)[0])
-            preds.append(y_next)
-            window.append(y_next)
-    except Exception:
-        # MLP ветка
-        for _ in range(horizon):
-            x = np.array(window[-win:]).reshape(1, -1)
-            y_next = float(model.predict(x)[0])
-            preds.append(y_next)
-            window.append(y_next)
-    return np.array(preds)
+    # прямой проход по весам на numpy, без Keras predict на каждом шаге
+    return model.forecast(series.values.astype(float), horizon)
+
+RESID_WINDOW = 250
+
+def simulate_nn(series: pd.Series, model, horizon: int = 30, n_paths: int = 1000, rng=None) -> np.ndarray:
+    """Сценарии сети: рекурсивный прогноз батчем с бутстрепом одношаговых остатков, (n_paths, horizon)."""
+    X, y = _make_windows(series)
+    n_tail = min(RESID_WINDOW, len(y))
+    resid = y[-n_tail:] - model.predict_windows(X[-n_tail:])
+    noise = np.random.default_rng(rng).choice(resid, size=(n_paths, horizon))
+    hist = np.broadcast_to(series.values[-WIN:].astype(float), (n_paths, WIN))
+    return model.forecast(hist, horizon, noise=noise)
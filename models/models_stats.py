@@ -1,6 +1,9 @@
+import os
 import warnings
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
 from statsmodels.tsa.holtwinters import ExponentialSmoothing
 from statsmodels.tsa.statespace.sarimax import SARIMAX
 
@@ -13,45 +16,176 @@ def _mape(y_true, y_pred):
     return float(np.mean(np.abs((y_true - y_pred) / y_true)) * 100.0)
 
 # ETS 
-def fit_eval_ets(train: pd.Series, test: pd.Series):
+ETS_PARAMS = ("smoothing_level", "smoothing_trend", "initial_level", "initial_trend")
+
+def fit_eval_ets(train: pd.Series, test: pd.Series, start_params=None):
+    # start_params — параметры вчерашнего фита (ETS_PARAMS): оптимизатор стартует с них без перебора сетки
     with warnings.catch_warnings():
         warnings.simplefilter("ignore")
-        fit = ExponentialSmoothing(
-            train, trend="add", seasonal=None, initialization_method="estimated"
-        ).fit(optimized=True)
+        model = ExponentialSmoothing(train, trend="add", seasonal=None, initialization_method="estimated")
+        if start_params is None:
+            fit = model.fit(optimized=True)
+        else:
+            fit = model.fit(optimized=True, start_params=np.asarray(start_params, dtype=float), use_brute=False)
     pred = fit.forecast(len(test))
     return fit, _rmse(test.values, pred.values), _mape(test.values, pred.values)
 
+def refit_ets(series: pd.Series, fit):
+    """Прогоняем фильтр по новому ряду с уже найденными параметрами — без оптимизации."""
+    p = fit.params
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return ExponentialSmoothing(
+            series, trend="add", seasonal=None, initialization_method="known",
+            initial_level=p["initial_level"], initial_trend=p["initial_trend"],
+        ).fit(smoothing_level=p["smoothing_level"], smoothing_trend=p["smoothing_trend"], optimized=False)
+
 def forecast_ets(series: pd.Series, fit, horizon: int = 30):
     return fit.forecast(horizon).values.astype(float)
 
+def simulate_ets(series: pd.Series, fit, horizon: int = 30, n_paths: int = 1000, rng=None) -> np.ndarray:
+    """n_paths сценариев из пространства состояний ETS одним вызовом, (n_paths, horizon)."""
+    sims = fit.simulate(horizon, anchor="end", repetitions=n_paths, error="add", random_state=rng)
+    return np.asarray(sims, dtype=float).reshape(horizon, n_paths).T
+
 # ARIMA 
-def fit_eval_arima(train: pd.Series, test: pd.Series):
+ARIMA_GRID = [(p, d, q) for p in (0, 1, 2) for d in (0, 1) for q in (0, 1, 2)]
+ARIMA_TOP_K = int(os.getenv("ARIMA_TOP_K", "3"))
+ARIMA_JOBS = int(os.getenv("ARIMA_JOBS", "0"))  # 0 — по числу ядер
+
+
+def _lagged(x: np.ndarray, k: int, start: int) -> np.ndarray:
+    # колонки x[t-1], ..., x[t-k] для t = start..len(x)-1
+    if k == 0:
+        return np.empty((len(x) - start, 0))
+    return sliding_window_view(x[:-1], k)[start - k:, ::-1]
+
+
+def _screen_order(y: np.ndarray, h: int, order, long_ar: int = 20) -> np.ndarray:
+    """
+    Грубая оценка ARMA по Ханнану–Риссанену (две регрессии МНК) и прогноз на h шагов.
+    Нужна только чтобы отсеять заведомо плохие порядки до полного MLE.
+    """
+    p, d, q = order
+    z = np.diff(y, n=d) if d else y
+    e = np.zeros_like(z)
+    m = min(long_ar, len(z) // 4) if q else 0
+    if q:
+        # 1) длинная AR даёт оценку инноваций
+        A = _lagged(z, m, m)
+        coef, *_ = np.linalg.lstsq(A, z[m:], rcond=None)
+        e[m:] = z[m:] - A @ coef
+    # 2) регрессия на лаги ряда и оценённых инноваций
+    start = max(p, q, m)
+    if p + q:
+        A = np.hstack([_lagged(z, p, start), _lagged(e, q, start)])
+        coef, *_ = np.linalg.lstsq(A, z[start:], rcond=None)
+    else:
+        coef = np.empty(0)
+    phi, theta = coef[:p], coef[p:]
+
+    # рекурсивный прогноз; окна хранятся от старых к новым, будущие инновации — нули
+    zs = list(z[len(z) - p:])
+    es = list(e[len(e) - q:])
+    out = np.empty(h)
+    for k in range(h):
+        val = float(np.dot(phi, zs[::-1])) + float(np.dot(theta, es[::-1]))
+        out[k] = val
+        zs = (zs + [val])[1:] if p else zs
+        es = (es + [0.0])[1:] if q else es
+    if d:
+        out = y[-1] + np.cumsum(out)
+    return out
+
+
+def _fit_sarimax(train: pd.Series, test: pd.Series, order, start_params=None):
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            model = SARIMAX(train, order=order,
+                            enforce_stationarity=False,
+                            enforce_invertibility=False)
+            fit = model.fit(disp=False, start_params=start_params)
+        pred = fit.forecast(len(test)).values
+        return order, fit, _rmse(test.values, pred), _mape(test.values, pred)
+    except Exception:
+        return None
+
+
+def fit_eval_arima(train: pd.Series, test: pd.Series, grid=None, top_k: int = None, jobs: int = None,
+                   start: dict = None):
+    """
+    Двухфазный выбор порядка: быстрый МНК-скрининг всей сетки на отложенной выборке,
+    затем полный SARIMAX только для top_k лучших, параллельно по ядрам.
+    start — {порядок: параметры} прошлого фита: скрининг пропускается, фитятся только
+    эти порядки, и MLE стартует с сохранённых коэффициентов.
+    У лучшей модели выставляются _arima_screened, _arima_fitted и _arima_candidates
+    ([(порядок, параметры, rmse)] всех сошедшихся — для следующего тёплого старта).
+    """
+    grid = ARIMA_GRID if grid is None else list(grid)
+    top_k = ARIMA_TOP_K if top_k is None else top_k
+    jobs = (jobs or ARIMA_JOBS) or os.cpu_count() or 1
+    y_tr, y_te = train.values.astype(float), test.values
+    h = len(test)
+
+    screened = []
+    if start:
+        candidates = list(start)
+    else:
+        for order in grid:
+            try:
+                pred = _screen_order(y_tr, h, order)
+            except Exception:
+                continue
+            if np.all(np.isfinite(pred)):
+                screened.append((_rmse(y_te, pred), order))
+        screened.sort(key=lambda x: x[0])
+        # если скрининг ничего не дал, не гадаем — фитим всю сетку
+        candidates = [o for _, o in screened[:top_k]] if screened else grid
+    starts = [(start or {}).get(o) for o in candidates]
+
+    jobs = min(jobs, len(candidates))
+    n = len(candidates)
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(_fit_sarimax, [train] * n, [test] * n, candidates, starts))
+    else:
+        results = [_fit_sarimax(train, test, o, sp) for o, sp in zip(candidates, starts)]
+
     best = None
-    y_te = test.values
-    for p in (0, 1, 2):
-        for d in (0, 1):
-            for q in (0, 1, 2):
-                try:
-                    with warnings.catch_warnings():
-                        warnings.simplefilter("ignore")
-                        model = SARIMAX(train, order=(p, d, q),
-                                        enforce_stationarity=False,
-                                        enforce_invertibility=False)
-                        fit = model.fit(disp=False)
-                    pred = fit.forecast(len(test)).values
-                    rmse = _rmse(y_te, pred)
-                    mape = _mape(y_te, pred)
-                    name = f"ARIMA({p},{d},{q})"
-                    if (best is None) or (rmse < best[2]):
-                        fit._name_for_report = name 
-                        best = (fit, rmse, mape)
-                except Exception:
-                    continue
+    fitted = []
+    for res in results:
+        if res is None:
+            continue
+        order, fit, rmse, mape = res
+        fitted.append((order, [float(x) for x in fit.params], rmse))
+        if (best is None) or (rmse < best[1]):
+            fit._name_for_report = "ARIMA({},{},{})".format(*order)
+            best = (fit, rmse, mape)
     if best is None:
         return fit_eval_ets(train, test)
+    best[0]._arima_screened = len(screened)
+    best[0]._arima_fitted = len(candidates)
+    best[0]._arima_candidates = fitted
     return best
 
+def extend_arima(fit, new_obs: pd.Series):
+    """Дописываем наблюдения в состояние фильтра, параметры остаются прежними."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        res = fit.append(new_obs, refit=False)
+    for attr in ("_name_for_report", "_arima_screened", "_arima_fitted", "_arima_candidates"):
+        if hasattr(fit, attr):
+            setattr(res, attr, getattr(fit, attr))
+    return res
+
 def forecast_arima(series: pd.Series, fit, horizon: int = 30):
     pred = fit.forecast(horizon)
     return pred.values.astype(float)
+
+def simulate_arima(series: pd.Series, fit, horizon: int = 30, n_paths: int = 1000, rng=None) -> np.ndarray:
+    """Сценарии из фильтра Калмана с конца выборки, (n_paths, horizon)."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        sims = fit.simulate(horizon, anchor="end", repetitions=n_paths, random_state=rng)
+    return np.asarray(sims, dtype=float).reshape(horizon, n_paths).T
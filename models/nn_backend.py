@@ -0,0 +1,217 @@
+# models/nn_backend.py
+"""
+Бэкенд нейросети, выбирается один раз на процесс: LSTM на TensorFlow, если он
+установлен, иначе MLP из sklearn. Обучение ограничено по эпохам и по времени,
+инференс — прямой проход на numpy по выгруженным весам (без model.predict),
+сразу батчем окон. Веса обученной сети держим по тикеру и в следующий раз
+дообучаем несколько эпох вместо обучения с нуля: в памяти процесса и на диске
+(models.artifacts), чтобы их видели все воркеры пула.
+"""
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+NN_BACKEND = os.getenv("NN_BACKEND", "auto").lower()  # auto|tf|mlp|off
+MAX_EPOCHS = int(os.getenv("NN_MAX_EPOCHS", "60"))
+FINETUNE_EPOCHS = int(os.getenv("NN_FINETUNE_EPOCHS", "5"))
+TIME_CAP = float(os.getenv("NN_TIME_CAP", "2.0"))  # секунд на одно обучение
+CACHE_SIZE = int(os.getenv("NN_CACHE_SIZE", "64"))  # тикеров с весами в памяти процесса
+
+WIN = 30
+PATIENCE = 5
+SCALE = 100.0  # окна нормируем на последнюю цену и переводим в проценты
+VAL_SHARE = 0.2
+
+_backend = None
+_lock = threading.Lock()
+_weights = OrderedDict()
+
+
+def _detect() -> str:
+    if NN_BACKEND == "off":
+        return ""
+    if NN_BACKEND in ("auto", "tf"):
+        try:
+            import tensorflow  # noqa: F401
+            return "tf"
+        except Exception:
+            pass
+    return "mlp"
+
+
+def backend():
+    """'tf', 'mlp' или None, если сеть выключена. TF импортируется один раз на процесс."""
+    global _backend
+    if _backend is None:
+        with _lock:
+            if _backend is None:
+                _backend = _detect()
+    return _backend or None
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+class NNModel:
+    """
+    Обученная сеть: веса в numpy и прямой проход батчем окон (n, WIN) -> (n,).
+    Пиклится целиком, поэтому спокойно едет между процессами и лежит в кэшах.
+    """
+
+    def __init__(self, kind: str, weights: list, est=None):
+        self.kind = kind  # "MLP" | "LSTM"
+        self.weights = weights
+        self.est = est  # sklearn-оценщик для дообучения MLP
+        self.name = f"NN({kind})"
+
+    def _mlp(self, z):
+        w = self.weights
+        for i in range(0, len(w) - 2, 2):
+            z = np.maximum(z @ w[i] + w[i + 1], 0.0)
+        return (z @ w[-2] + w[-1])[:, 0]
+
+    def _lstm(self, z):
+        # порядок гейтов как в Keras: input, forget, cell, output
+        kernel, rec, bias, dense_w, dense_b = self.weights
+        u = rec.shape[0]
+        h = np.zeros((z.shape[0], u))
+        c = np.zeros_like(h)
+        for t in range(z.shape[1]):
+            g = z[:, t:t + 1] @ kernel + h @ rec + bias
+            i, f = _sigmoid(g[:, :u]), _sigmoid(g[:, u:2 * u])
+            c = f * c + i * np.tanh(g[:, 2 * u:3 * u])
+            h = _sigmoid(g[:, 3 * u:]) * np.tanh(c)
+        return (h @ dense_w + dense_b)[:, 0]
+
+    def predict_windows(self, X: np.ndarray) -> np.ndarray:
+        X = np.asarray(X, dtype=float)
+        last = X[:, -1]
+        z = (X / last[:, None] - 1.0) * SCALE
+        out = self._lstm(z) if self.kind == "LSTM" else self._mlp(z)
+        return last * (1.0 + out / SCALE)
+
+    def forecast(self, histories, horizon: int = 30, noise=None) -> np.ndarray:
+        """Рекурсивный прогноз сразу для (n, T) историй; noise (n, horizon) — для сценариев."""
+        h = np.asarray(histories, dtype=float)
+        single = h.ndim == 1
+        if single:
+            h = h[None, :]
+        buf = np.array(h[:, -WIN:])
+        out = np.empty((h.shape[0], horizon))
+        for step in range(horizon):
+            y = self.predict_windows(buf)
+            if noise is not None:
+                y = y + noise[:, step]
+            out[:, step] = y
+            buf[:, :-1] = buf[:, 1:]
+            buf[:, -1] = y
+        return out[0] if single else out
+
+
+def _normalize(X: np.ndarray, y: np.ndarray):
+    last = X[:, -1]
+    return (X / last[:, None] - 1.0) * SCALE, (y / last - 1.0) * SCALE
+
+
+def _train_mlp(z, t, epochs: int, prev: NNModel, deadline: float) -> NNModel:
+    from sklearn.neural_network import MLPRegressor
+
+    cut = int(len(t) * (1 - VAL_SHARE))
+    if prev is not None and prev.est is not None:
+        est = copy.deepcopy(prev.est)
+    else:
+        est = MLPRegressor(hidden_layer_sizes=(64, 64), random_state=42, learning_rate_init=1e-3)
+        if prev is not None and prev.kind == "MLP":
+            # веса с диска без оценщика: один шаг создаёт слои и оптимизатор, дальше — сохранённые веса.
+            # Копируем на месте: оптимизатор держит ссылки на эти массивы
+            est.partial_fit(z[:cut], t[:cut])
+            for dst, src in zip(est.coefs_ + est.intercepts_, prev.weights[0::2] + prev.weights[1::2]):
+                dst[...] = src
+    best, best_loss, bad = None, np.inf, 0
+    for _ in range(epochs):
+        est.partial_fit(z[:cut], t[:cut])
+        loss = float(np.mean((est.predict(z[cut:]) - t[cut:]) ** 2))
+        if loss < best_loss:
+            best, best_loss, bad = ([w.copy() for w in est.coefs_], [b.copy() for b in est.intercepts_]), loss, 0
+        else:
+            bad += 1
+        if bad >= PATIENCE or time.perf_counter() > deadline:
+            break
+    est.coefs_, est.intercepts_ = best
+    weights = [a for pair in zip(est.coefs_, est.intercepts_) for a in pair]
+    return NNModel("MLP", weights, est)
+
+
+def _train_lstm(z, t, epochs: int, prev: NNModel, deadline: float) -> NNModel:
+    from tensorflow.keras import Input, Sequential
+    from tensorflow.keras.callbacks import Callback, EarlyStopping
+    from tensorflow.keras.layers import LSTM, Dense
+
+    class _Deadline(Callback):
+        def on_epoch_end(self, epoch, logs=None):
+            if time.perf_counter() > deadline:
+                self.model.stop_training = True
+
+    model = Sequential([Input((WIN, 1)), LSTM(32), Dense(1)])
+    model.compile(optimizer="adam", loss="mse")
+    if prev is not None and prev.kind == "LSTM":
+        model.set_weights(prev.weights)
+    es = EarlyStopping(monitor="val_loss", patience=PATIENCE, restore_best_weights=True)
+    model.fit(z[..., None], t, epochs=epochs, batch_size=32, validation_split=VAL_SHARE,
+              callbacks=[es, _Deadline()], verbose=0)
+    return NNModel("LSTM", [np.asarray(w, dtype=float) for w in model.get_weights()])
+
+
+def train(X: np.ndarray, y: np.ndarray, prev: NNModel = None) -> NNModel:
+    """
+    Обучение на окнах цен X (n, WIN) -> y (n,). С prev — дообучение его весов
+    FINETUNE_EPOCHS эпох, иначе до MAX_EPOCHS. В любом случае не дольше TIME_CAP секунд.
+    """
+    be = backend()
+    if be is None:
+        raise RuntimeError("нейросеть выключена (NN_BACKEND=off)")
+    z, t = _normalize(np.asarray(X, dtype=float), np.asarray(y, dtype=float))
+    epochs = FINETUNE_EPOCHS if prev is not None else MAX_EPOCHS
+    deadline = time.perf_counter() + TIME_CAP
+    if be == "tf":
+        return _train_lstm(z, t, epochs, prev, deadline)
+    return _train_mlp(z, t, epochs, prev, deadline)
+
+
+def _kind() -> str:
+    return "LSTM" if backend() == "tf" else "MLP"
+
+
+def cached(key):
+    """Веса, обученные для этого ключа (тикера) раньше: в этом процессе, иначе с диска."""
+    if key is None:
+        return None
+    with _lock:
+        model = _weights.get(key)
+        if model is not None:
+            _weights.move_to_end(key)
+            return model
+    from models import artifacts
+    kind = _kind()
+    weights = artifacts.load_weights(key, kind)
+    return None if weights is None else NNModel(kind, weights)
+
+
+def remember(key, model: NNModel):
+    if key is None:
+        return
+    with _lock:
+        _weights[key] = model
+        _weights.move_to_end(key)
+        while len(_weights) > CACHE_SIZE:
+            _weights.popitem(last=False)
+    from models import artifacts
+    try:
+        artifacts.save_weights(key, model.kind, model.weights)
+    except OSError:
+        pass  # не сохранили — следующий воркер обучит с нуля
@@ -0,0 +1,76 @@
+# models/recursive_ml.py
+"""
+Рекурсивный прогноз для пайплайна StandardScaler + Ridge без pandas.
+Держим кольцевой буфер последних 45 значений (30 лагов + окно 14 + 1),
+лаги берём индексами из буфера, скользящие mean/std обновляем инкрементально,
+scaler и коэффициенты применяем напрямую. Работает сразу с батчем рядов (n, T).
+"""
+import numpy as np
+
+from core.features import MAX_LAG, ROLL_WINDOWS
+
+
+class RecursiveRidge:
+    def __init__(self, model, max_lag: int = MAX_LAG, windows=ROLL_WINDOWS):
+        scaler = model.named_steps["scaler"]
+        ridge = model.named_steps["ridge"]
+        self.max_lag = max_lag
+        self.windows = tuple(windows)
+        self.size = max_lag + max(self.windows) + 1
+        self.mean = np.asarray(scaler.mean_, dtype=float)
+        self.scale = np.asarray(scaler.scale_, dtype=float)
+        self.coef = np.asarray(ridge.coef_, dtype=float).reshape(-1)
+        self.intercept = float(np.asarray(ridge.intercept_).reshape(-1)[0])
+        n_feat = max_lag + 2 * len(self.windows)
+        if self.coef.shape[0] != n_feat:
+            raise ValueError(f"ожидалось {n_feat} признаков, у модели {self.coef.shape[0]}")
+
+    def forecast(self, histories, horizon: int = 30, noise=None) -> np.ndarray:
+        """
+        histories: (n, T) или (T,) — история, T >= 45.
+        noise: (n, horizon) — добавка к каждому шагу (для сценариев), по умолчанию нули.
+        Возвращает (n, horizon) или (horizon,) для одномерного входа.
+        """
+        h = np.asarray(histories, dtype=float)
+        single = h.ndim == 1
+        if single:
+            h = h[None, :]
+        if h.shape[1] < self.size:
+            raise ValueError(f"нужно минимум {self.size} точек истории")
+
+        n, size, lag = h.shape[0], self.size, self.max_lag
+        buf = h[:, -size:].copy()  # кольцевой буфер пишется — историю вызывающего не трогаем
+        pos = 0  # самая старая ячейка; самая свежая — pos-1
+
+        # стартовые суммы и M2 по каждому окну
+        sums, m2 = [], []
+        for win in self.windows:
+            w = buf[:, -win:]
+            sums.append(w.sum(axis=1))
+            m2.append(((w - w.mean(axis=1, keepdims=True)) ** 2).sum(axis=1))
+
+        lag_offsets = np.arange(1, lag + 1)
+        X = np.empty((n, lag + 2 * len(self.windows)))
+        out = np.empty((n, horizon))
+        for step in range(horizon):
+            X[:, :lag] = buf[:, (pos - lag_offsets) % size]
+            for k, win in enumerate(self.windows):
+                X[:, lag + 2 * k] = sums[k] / win
+                X[:, lag + 2 * k + 1] = np.sqrt(np.maximum(m2[k], 0.0) / (win - 1))
+
+            y = ((X - self.mean) / self.scale) @ self.coef + self.intercept
+            if noise is not None:
+                y = y + noise[:, step]
+            out[:, step] = y
+
+            # сдвигаем окна: y входит, значение на лаге win выходит (формула Уэлфорда)
+            for k, win in enumerate(self.windows):
+                y_out = buf[:, (pos - win) % size]
+                mean_old = sums[k] / win
+                sums[k] = sums[k] + y - y_out
+                mean_new = sums[k] / win
+                m2[k] = m2[k] + (y - y_out) * (y - mean_new + y_out - mean_old)
+            buf[:, pos] = y
+            pos = (pos + 1) % size
+
+        return out[0] if single else out
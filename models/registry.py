@@ -0,0 +1,164 @@
+# models/registry.py
+"""
+Реестр моделей-кандидатов. Кандидат — имя и набор хуков:
+
+    fit(train, test, key) -> (model, rmse, mape)   обучение и ошибка на отложенной выборке
+    forecast(series, model, horizon) -> ndarray     точечный прогноз
+    simulate(series, model, horizon, n_paths)       сценарии (n_paths, horizon), необязательно
+    update(model, series, new_obs) -> model         довести модель до конца series (walk-forward)
+    evaluate(model, series, test) -> (rmse, mape)   ошибка на test от конца series, без обучения
+
+Выбор модели, прогноз и walk-forward ходят только через реестр: новая модель
+добавляется одним register(), без правок в core.selection.
+"""
+import os
+from collections import OrderedDict
+
+import pandas as pd
+
+# какие кандидаты участвуют и в каком порядке
+MODELS = [m.strip() for m in os.getenv("MODELS", "ML,ETS,ARIMA,NN").split(",") if m.strip()]
+
+# бюджет на обучение одного кандидата, сек; переопределяется MODEL_BUDGETS="ARIMA=20,NN=5"
+_BUDGETS = {"ML": 10.0, "ETS": 15.0, "ARIMA": 25.0, "NN": 15.0}
+for _item in os.getenv("MODEL_BUDGETS", "").split(","):
+    if "=" in _item:
+        _k, _v = _item.split("=", 1)
+        _BUDGETS[_k.strip()] = float(_v)
+
+
+class Candidate:
+    def __init__(self, name: str, fit, forecast, simulate=None, update=None, evaluate=None,
+                 label=None, keep=None, available=None, budget: float = None):
+        self.name = name
+        self.fit = fit
+        self.forecast = forecast
+        self.simulate = simulate
+        self.update = update
+        self.evaluate = evaluate
+        self._label = label
+        self._keep = keep
+        self._available = available
+        self.budget = budget if budget is not None else _BUDGETS.get(name, 10.0)
+
+    def label(self, model) -> str:
+        """Имя для отчёта, например ARIMA(1,1,0) или NN(MLP)."""
+        return self._label(model) if self._label else self.name
+
+    def keep(self, key, model):
+        """Вызывается в процессе, который будет прогнозировать, — чтобы сохранить веса и т.п."""
+        if self._keep:
+            self._keep(key, model)
+
+    def available(self) -> bool:
+        return self._available() if self._available else True
+
+
+_registry = OrderedDict()
+
+
+def register(candidate: Candidate) -> Candidate:
+    _registry[candidate.name] = candidate
+    return candidate
+
+
+def get(name: str) -> Candidate:
+    return _registry[name]
+
+
+def enabled(names=None) -> list:
+    """Кандидаты из MODELS (или names), которые зарегистрированы и доступны в этом процессе."""
+    out = []
+    for n in (MODELS if names is None else names):
+        c = _registry.get(n)
+        if c is not None and c.available():
+            out.append(c)
+    return out
+
+
+# встроенные кандидаты
+
+def _forecast_error(model, series, test):
+    from models.models_stats import _rmse, _mape
+    pred = model.forecast(len(test)).values
+    return _rmse(test.values, pred), _mape(test.values, pred)
+
+
+def _register_builtin():
+    from models import artifacts, nn_backend
+    from models.models_ml import fit_eval_ml, forecast_ml, simulate_ml, refit_ml, eval_ml
+    from models.models_nn import fit_eval_nn, forecast_nn, simulate_nn, refit_nn, eval_nn
+    from models.models_stats import (
+        ETS_PARAMS, fit_eval_ets, forecast_ets, simulate_ets, refit_ets,
+        fit_eval_arima, forecast_arima, simulate_arima, extend_arima,
+    )
+
+    def _arima(train, test, start=None):
+        model, rmse, mape = fit_eval_arima(train, test, start=start)
+        # ни один порядок не сошёлся — fit_eval_arima вернула ETS, а он и так в турнире
+        if not hasattr(model, "append"):
+            raise RuntimeError("ARIMA не сошлась")
+        return model, rmse, mape
+
+    # тёплый старт по тикеру (models/artifacts.py): вчерашние параметры вместо полного поиска
+    def _fit_arima(train, test, key):
+        return artifacts.warm_fit(
+            key, "ARIMA", train, test, full=_arima,
+            warm=lambda tr, te, p: _arima(tr, te, start={tuple(o): sp for o, sp, _ in p["orders"]}),
+            params=lambda m: {"orders": m._arima_candidates},
+        )
+
+    def _fit_ets(train, test, key):
+        return artifacts.warm_fit(
+            key, "ETS", train, test, full=fit_eval_ets,
+            warm=lambda tr, te, p: fit_eval_ets(tr, te, start_params=p["start"]),
+            params=lambda m: {"start": [float(m.params[k]) for k in ETS_PARAMS]},
+        )
+
+    def _fit_ml(train, test, key):
+        return artifacts.warm_fit(
+            key, "ML", train, test, full=fit_eval_ml,
+            warm=lambda tr, te, p: fit_eval_ml(tr, te, alphas=[p["alpha"]]),
+            params=lambda m: {"alpha": float(m.named_steps["ridge"].alpha_)},
+        )
+
+    register(Candidate(
+        "ML",
+        fit=_fit_ml,
+        forecast=forecast_ml,
+        simulate=simulate_ml,
+        update=lambda model, series, new_obs: refit_ml(series, model),
+        evaluate=lambda model, series, test: eval_ml(pd.concat([series, test]), model, len(test)),
+        label=lambda model: "ML(Ridge)",
+    ))
+    register(Candidate(
+        "ETS",
+        fit=_fit_ets,
+        forecast=forecast_ets,
+        simulate=simulate_ets,
+        update=lambda model, series, new_obs: refit_ets(series, model),
+        evaluate=_forecast_error,
+    ))
+    register(Candidate(
+        "ARIMA",
+        fit=_fit_arima,
+        forecast=forecast_arima,
+        simulate=simulate_arima,
+        update=lambda model, series, new_obs: extend_arima(model, new_obs),
+        evaluate=_forecast_error,
+        label=lambda model: getattr(model, "_name_for_report", "ARIMA"),
+    ))
+    register(Candidate(
+        "NN",
+        fit=lambda train, test, key: fit_eval_nn(train, test, key=key)[:3],
+        forecast=forecast_nn,
+        simulate=simulate_nn,
+        update=lambda model, series, new_obs: refit_nn(series, model),
+        evaluate=lambda model, series, test: eval_nn(pd.concat([series, test]), model, len(test)),
+        label=lambda model: model.name,
+        keep=nn_backend.remember,
+        available=lambda: nn_backend.backend() is not None,
+    ))
+
+
+_register_builtin()
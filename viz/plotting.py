@@ -1,27 +1,110 @@
+import os
+import threading
 from io import BytesIO
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
-import pandas as pd
+from typing import Optional, Tuple
+
+import matplotlib.dates as mdates
 import numpy as np
-from typing import Optional
-
-def build_plot(history: pd.Series, forecast: np.ndarray, save_path: Optional[str] = None) -> BytesIO:
-    fig, ax = plt.subplots(figsize=(9,4))
-    ax.plot(history.index, history.values, label="История")
-    future_idx = pd.date_range(start=history.index[-1], periods=len(forecast)+1, freq="B")[1:]
-    ax.plot(future_idx, forecast, linestyle="--", label="Прогноз 30д")
-    ax.axvline(history.index[-1], color="gray", alpha=0.6)
-    ax.set_title("Цена акции: история и прогноз")
-    ax.set_xlabel("Дата"); ax.set_ylabel("Цена")
-    ax.legend()
-    fig.tight_layout()
+import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from PIL import Image
+
+# размер (дюймы) и dpi картинки; для лёгких превью в Telegram можно уменьшить
+PLOT_DPI = int(os.getenv("PLOT_DPI", "150"))
+PLOT_SIZE = tuple(float(x) for x in os.getenv("PLOT_SIZE", "9x4").lower().split("x"))
+# zlib 1..9: 6 — как у savefig; 9 даёт на ~1 КиБ меньше, но кодирует вдвое дольше, 1 — файл больше исходного
+PNG_COMPRESS = int(os.getenv("PLOT_PNG_COMPRESS", "6"))
+
+_templates = {}
+_lock = threading.Lock()
+
+
+class _ChartTemplate:
+    """
+    Заготовка графика на объектном API (Figure + Agg), без глобального состояния pyplot.
+    Оси, подписи и легенда создаются один раз, на каждый вызов меняются только данные линий.
+    """
+
+    def __init__(self, size: Tuple[float, float], dpi: int):
+        self.fig = Figure(figsize=size, dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.fig)
+        self._layout_key = None
+        ax = self.ax = self.fig.add_subplot()
+        (self.hist_line,) = ax.plot([], [], label="История")
+        (self.fc_line,) = ax.plot([], [], linestyle="--", label="Прогноз 30д")
+        self.today = ax.axvline(0, color="gray", alpha=0.6)
+        self._fans = []
+        locator = mdates.AutoDateLocator()
+        ax.xaxis.set_major_locator(locator)
+        ax.xaxis.set_major_formatter(mdates.AutoDateFormatter(locator))
+        ax.set_title("Цена акции: история и прогноз")
+        ax.set_xlabel("Дата"); ax.set_ylabel("Цена")
+        ax.legend()
+
+    def render(self, history: pd.Series, forecast: np.ndarray, bands: Optional[np.ndarray] = None) -> bytes:
+        future_idx = pd.date_range(start=history.index[-1], periods=len(forecast) + 1, freq="B")[1:]
+        x_hist = mdates.date2num(history.index.to_numpy())
+        x_fc = mdates.date2num(future_idx.to_numpy())
+
+        self.hist_line.set_data(x_hist, history.values)
+        self.fc_line.set_data(x_fc, forecast)
+        self.today.set_xdata([x_hist[-1], x_hist[-1]])
+        # веер сценариев: заливки пересоздаём, линии и оси остаются
+        for fan in self._fans:
+            fan.remove()
+        self._fans = []
+        top = max(np.max(history.values), np.max(forecast))
+        self.ax.relim()
+        if bands is not None:
+            # bands: квантили по возрастанию (k, horizon); внешняя пара светлее внутренней
+            k = len(bands)
+            for i in range(k // 2):
+                self._fans.append(self.ax.fill_between(
+                    x_fc, bands[i], bands[k - 1 - i], color=self.fc_line.get_color(),
+                    alpha=0.12 * (i + 1), linewidth=0,
+                ))
+            self.ax.update_datalim(np.column_stack([x_fc[[0, -1, 0, -1]], [bands.min(), bands.min(), bands.max(), bands.max()]]))
+            top = max(top, np.max(bands))
+        self.ax.autoscale_view()
+        # поля зависят только от ширины подписей цены: пересчитываем раскладку,
+        # когда меняется число цифр, а не на каждом графике
+        key = len(f"{top:.0f}")
+        if key != self._layout_key:
+            self.fig.tight_layout()
+            self._layout_key = key
+
+        # одна отрисовка и одно PNG-кодирование; альфа-канал фону не нужен
+        self.canvas.draw()
+        buf = BytesIO()
+        Image.fromarray(np.asarray(self.canvas.buffer_rgba())).convert("RGB").save(
+            buf, format="png", compress_level=PNG_COMPRESS
+        )
+        return buf.getvalue()
+
+
+def _template(size: Tuple[float, float], dpi: int) -> _ChartTemplate:
+    tpl = _templates.get((size, dpi))
+    if tpl is None:
+        tpl = _templates[(size, dpi)] = _ChartTemplate(size, dpi)
+    return tpl
+
+
+def build_plot(history: pd.Series, forecast: np.ndarray, save_path: Optional[str] = None,
+               dpi: int = None, size: Tuple[float, float] = None, bands: Optional[np.ndarray] = None) -> BytesIO:
+    """bands — квантили сценариев (k, horizon) по возрастанию, рисуются веером вокруг прогноза."""
+    # один шаблон на процесс: рендер Agg держит GIL, своя копия на поток параллельности не даёт
+    # (bench.plotting: 4 потока медленнее одного), поэтому вызовы из потоков просто по очереди
+    with _lock:
+        tpl = _template(tuple(size or PLOT_SIZE), dpi or PLOT_DPI)
+        png = tpl.render(history, np.asarray(forecast, dtype=float),
+                         None if bands is None else np.asarray(bands, dtype=float))
 
+    # PNG кодируем один раз, в файл пишем те же байты
     if save_path:
-        fig.savefig(save_path, format="png", dpi=150)
+        with open(save_path, "wb") as f:
+            f.write(png)
 
-    buf = BytesIO()
-    fig.savefig(buf, format="png", dpi=150)
-    plt.close(fig)
+    buf = BytesIO(png)
     buf.seek(0)
     return buf
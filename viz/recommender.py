@@ -2,65 +2,89 @@ import numpy as np
 import pandas as pd
 from scipy.signal import find_peaks
 
+
+def extrema_masks(paths: np.ndarray):
+    """Локальные максимумы (SELL) и минимумы (BUY) сразу по всей матрице путей (n, h)."""
+    x = np.atleast_2d(paths)
+    peaks = np.zeros(x.shape, dtype=bool)
+    troughs = np.zeros(x.shape, dtype=bool)
+    mid, left, right = x[:, 1:-1], x[:, :-2], x[:, 2:]
+    peaks[:, 1:-1] = (mid > left) & (mid > right)
+    troughs[:, 1:-1] = (mid < left) & (mid < right)
+    return peaks, troughs
+
+
+def pair_trades(buy: np.ndarray, sell: np.ndarray):
+    """
+    Пары BUY -> SELL для всех путей без цикла по точкам: BUY на впадине, SELL на первом
+    пике строго позже, следующий BUY — первая впадина после этого SELL.
+    Возвращает маску открытых покупок и индекс ближайшего пика справа (h — пика нет).
+    """
+    n, h = buy.shape
+    idx = np.broadcast_to(np.arange(h), (n, h))
+
+    # ближайший пик строго справа
+    nxt = np.minimum.accumulate(np.where(sell, idx, h)[:, ::-1], axis=1)[:, ::-1]
+    nxt = np.concatenate([nxt[:, 1:], np.full((n, 1), h)], axis=1)
+
+    # впадина открывает сделку, только если предыдущий сигнал не BUY:
+    # несколько впадин подряд до пика — покупка по первой
+    sig = np.where(buy, 1, np.where(sell, 2, 0))
+    last = np.maximum.accumulate(np.where(sig > 0, idx, -1), axis=1)
+    prev = np.concatenate([np.full((n, 1), -1), last[:, :-1]], axis=1)
+    prev_sig = np.where(prev >= 0, np.take_along_axis(sig, np.maximum(prev, 0), axis=1), 0)
+
+    opened = buy & (prev_sig != 1) & (nxt < h)
+    return opened, nxt
+
+
+def _trade_profit(x: np.ndarray, opened: np.ndarray, nxt: np.ndarray) -> np.ndarray:
+    sell_price = np.take_along_axis(x, np.minimum(nxt, x.shape[1] - 1), axis=1)
+    return np.where(opened, sell_price - x, 0.0).sum(axis=1)
+
+
+def _point_signals(x: np.ndarray):
+    """BUY/SELL точечного прогноза (1, h); find_peaks, а не строгое сравнение: у прогноза бывают плато."""
+    sell = np.zeros((1, len(x)), dtype=bool)
+    buy = np.zeros((1, len(x)), dtype=bool)
+    sell[0, find_peaks(x)[0]] = True
+    buy[0, find_peaks(-x)[0]] = True
+    return buy, sell
+
+
+def signals_outcome(paths: np.ndarray, pred: np.ndarray, amount: float, current_price: float) -> np.ndarray:
+    """
+    Прибыль по сигналам точечного прогноза на каждом из n сценариев (n, h) -> (n,):
+    даты BUY/SELL берутся из pred, цены — из сценария. Это разброс вокруг той прибыли,
+    которую бот называет, и она бывает отрицательной.
+    """
+    x = np.atleast_2d(np.asarray(paths, dtype=float))
+    opened, nxt = pair_trades(*_point_signals(np.asarray(pred, dtype=float)))
+    return _trade_profit(x, np.broadcast_to(opened, x.shape), np.broadcast_to(nxt, x.shape)) * (amount / current_price)
+
+
 def make_signals_and_profit(pred: np.ndarray, amount: float, current_price: float):
     # ищем локальные минимумы как BUY и следующие за ними локальные максимумы как SELL.
     # рассчитываем профит по парной свинговой стратегии на количестве акций = amount/current_price.
     # создаем псевдо-индекс дат бизнес-днями от завтра
-    idx = pd.bdate_range(pd.Timestamp.today().normalize(), periods=len(pred), freq="B")
-    s = pd.Series(pred, index=idx)
-
-    # пики (SELL)
-    peaks, _ = find_peaks(s.values)
-    # впадины (BUY) 
-    troughs, _ = find_peaks(-s.values)
-
-    signals = []
-    for i in range(len(s)):
-        if i in troughs:
-            signals.append(("BUY", s.index[i], s.iloc[i]))
-        if i in peaks:
-            signals.append(("SELL", s.index[i], s.iloc[i]))
-
-    # сортируем по дате
-    signals.sort(key=lambda x: x[1])
-
-    # после BUY ищем первый SELL строго позже
-    shares = amount / current_price
-    profit = 0.0
-    i = 0
-    while i < len(signals):
-        if signals[i][0] == "BUY":
-            buy_price = signals[i][2]
-            # ищем следующий SELL
-            j = i + 1
-            while j < len(signals) and signals[j][0] != "SELL":
-                j += 1
-            if j < len(signals):
-                sell_price = signals[j][2]
-                profit += (sell_price - buy_price) * shares
-                i = j + 1
-            else:
-                break
-        else:
-            i += 1
-
-    df = pd.DataFrame([{"signal": s0, "date": d.strftime("%Y-%m-%d"), "price": float(p)} for s0, d, p in signals])
-    # соберём пары для краткой печати
-    pairs = []
-    i = 0
-    while i < len(signals):
-        if signals[i][0] == "BUY":
-            buy_d, buy_p = signals[i][1], signals[i][2]
-            j = i + 1
-            while j < len(signals) and signals[j][0] != "SELL":
-                j += 1
-            if j < len(signals):
-                sell_d, sell_p = signals[j][1], signals[j][2]
-                pairs.append((buy_d.strftime("%Y-%m-%d"), float(buy_p), sell_d.strftime("%Y-%m-%d"), float(sell_p)))
-                i = j + 1
-            else:
-                break
-        else:
-            i += 1
-
-    return df, float(profit), pairs
+    x = np.asarray(pred, dtype=float)
+    idx = pd.bdate_range(pd.Timestamp.today().normalize(), periods=len(x), freq="B")
+    dates = idx.strftime("%Y-%m-%d")
+
+    buy, sell = _point_signals(x)
+    opened, nxt = pair_trades(buy, sell)
+    profit = float(_trade_profit(x[None, :], opened, nxt)[0]) * (amount / current_price)
+
+    at = np.flatnonzero(buy[0] | sell[0])
+    df = pd.DataFrame({
+        "signal": np.where(buy[0, at], "BUY", "SELL"),
+        "date": dates[at],
+        "price": x[at],
+    }) if len(at) else pd.DataFrame()
+
+    # пары для краткой печати
+    b = np.flatnonzero(opened[0])
+    s_ = nxt[0, b]
+    pairs = [(dates[i], float(x[i]), dates[j], float(x[j])) for i, j in zip(b, s_)]
+
+    return df, profit, pairs